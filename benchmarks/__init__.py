@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准测试：生成合成的大型项目目录，分阶段计时并按阈值检查性能回归。
+
+    python -m benchmarks.run --files 20000 --node-modules 50000 --output results.json
+"""
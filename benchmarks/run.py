@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import logging
+import platform
+import tempfile
+
+from sync2llmtxt import (FilePatternMatcher, walk_code_files, IgnoreMatcher, GitignoreCache, AggregationModel,
+                         DirectoryTreeModel, OutputWriter, Project, ProjectConfig, generate_directory_structure)
+from sync2llmtxt.document import iter_document
+
+from .synthetic import TreeShape, generate_tree, BENCHMARK_PATTERNS, BENCHMARK_IGNORES
+
+RESULTS_FORMAT_VERSION = 1
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+# 与基线比较时，短于该时间的阶段按该时间计算，避免毫秒级的抖动被当成回归
+NOISE_FLOOR_SECONDS = 0.01
+
+# 按执行顺序排列的阶段
+PHASES = ('discovery', 'should_ignore', 'read', 'directory_structure', 'write', 'aggregate', 'watch_rebuild')
+
+
+def _timed(timings, phase, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings[phase] = time.perf_counter() - start
+    return result
+
+
+def _ignore_matcher(root_dir):
+    # Same rules as Project: IGNORE_PATTERNS plus the nested .gitignore files
+    return IgnoreMatcher(root_dir, BENCHMARK_IGNORES, gitignore_cache=GitignoreCache(root_dir))
+
+
+def run_pipeline(root_dir, work_dir, max_file_size_mb=1.0, read_workers=4):
+    """
+    对 root_dir 完整运行一次各个阶段并分别计时 (秒)
+
+    - discovery: walk_code_files 遍历 (按 IGNORE_PATTERNS 和 .gitignore 剪掉目录)
+    - should_ignore: 用新的忽略判断器 (空缓存) 对每个文件判断一次；文件发现中已包含这些判断，单独计时便于定位
+    - read: AggregationModel 首次读取全部文件
+    - directory_structure: 用新的忽略规则独立生成目录结构
+    - write: 把文档写入输出文件
+    - aggregate: Project 的一次完整聚合 (包括以上全部步骤)
+    - watch_rebuild: 修改一个文件后的增量重建 (监控模式下的单文件更新)
+
+    返回:
+        tuple: (各阶段耗时的 dict, 文档包含的文件数)
+    """
+    root_dir = os.path.normpath(os.path.abspath(root_dir))
+    timings = {}
+    max_file_size_warn = int(max_file_size_mb * 1024 * 1024)
+
+    should_ignore = _ignore_matcher(root_dir)
+    listings = {}
+    discovered = _timed(timings, 'discovery', lambda: sorted(
+        walk_code_files(root_dir, FilePatternMatcher(BENCHMARK_PATTERNS), should_ignore, listings)))
+    # walk_code_files already applied the ignore rules while recording listings
+    files = discovered
+    fresh_matcher = _ignore_matcher(root_dir)
+    _timed(timings, 'should_ignore', lambda: [p for p in discovered if fresh_matcher(p)])
+
+    model = AggregationModel(root_dir, max_file_size_warn, read_workers=read_workers)
+    try:
+        _timed(timings, 'read', model.sync, files)
+        # A fresh matcher so that the timing includes evaluating every directory again
+        _timed(timings, 'directory_structure', generate_directory_structure, root_dir, _ignore_matcher(root_dir))
+        tree = DirectoryTreeModel(root_dir, should_ignore)
+        tree.reload(listings)
+        chunks = iter_document(model, "Benchmark", root_dir, should_ignore_fn=should_ignore, directory_tree=tree)
+        _timed(timings, 'write', OutputWriter().write, os.path.join(work_dir, 'phases.txt'), chunks,
+               skip_unchanged=False)
+    finally:
+        if model.store is not None:
+            model.store.close()
+
+    config = ProjectConfig(root_dir, os.path.join(work_dir, 'project.txt'), BENCHMARK_PATTERNS, BENCHMARK_IGNORES,
+                           enable_monitoring=False, read_workers=read_workers, max_file_size_mb=max_file_size_mb)
+    project = Project(config)
+    try:
+        _timed(timings, 'aggregate', project.aggregate)
+        timings['watch_rebuild'] = _time_single_file_rebuild(project, files)
+    finally:
+        if project.model.store is not None:
+            project.model.store.close()
+    return timings, len(files)
+
+
+def _time_single_file_rebuild(project, files):
+    """修改排在中间的一个文本文件，计时增量重建，然后恢复文件内容"""
+    candidates = [p for p in files if p.endswith('.py') and os.path.getsize(p) < 64 * 1024]
+    if not candidates:
+        return 0.0
+    path = candidates[len(candidates) // 2]
+    with open(path, 'rb') as f:
+        original = f.read()
+    try:
+        with open(path, 'ab') as f:
+            f.write(b"# benchmark edit\n")
+        start = time.perf_counter()
+        project.rebuild_changed_paths([path])
+        return time.perf_counter() - start
+    finally:
+        with open(path, 'wb') as f:
+            f.write(original)
+
+
+def run_benchmarks(root_dir, repeat=3, max_file_size_mb=1.0, read_workers=4):
+    """
+    运行 repeat 次并取每个阶段的最小值 (第一次运行同时预热操作系统的页缓存)
+
+    返回:
+        dict: {'phases': {阶段: 秒}, 'us_per_file': {阶段: 微秒}, 'files': 文档包含的文件数}
+    """
+    best = {}
+    file_count = 0
+    for _ in range(max(1, repeat)):
+        work_dir = tempfile.mkdtemp(prefix='sync2llmtxt-bench-')
+        try:
+            timings, file_count = run_pipeline(root_dir, work_dir, max_file_size_mb, read_workers)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        for phase, seconds in timings.items():
+            best[phase] = min(seconds, best.get(phase, seconds))
+    per_file = max(1, file_count)
+    return {
+        'files': file_count,
+        'phases': {phase: round(best[phase], 6) for phase in PHASES},
+        'us_per_file': {phase: round(best[phase] * 1e6 / per_file, 3) for phase in PHASES},
+    }
+
+
+def check_thresholds(results, thresholds, baseline=None):
+    """
+    按阈值检查结果
+
+    thresholds 可包含:
+      - max_seconds: {阶段: 秒}，绝对上限
+      - max_us_per_file: {阶段: 微秒}，按文件数归一化的上限 (与目录大小无关)
+      - max_regression: 与 baseline 结果相比允许的最大倍数
+
+    返回:
+        list: 超出阈值的说明 (为空表示全部通过)
+    """
+    failures = []
+    phases = results['phases']
+    for phase, limit in thresholds.get('max_seconds', {}).items():
+        if phase in phases and phases[phase] > limit:
+            failures.append(f"{phase}: {phases[phase]:.3f}s > {limit}s")
+    for phase, limit in thresholds.get('max_us_per_file', {}).items():
+        value = results['us_per_file'].get(phase)
+        if value is not None and value > limit:
+            failures.append(f"{phase}: {value:.1f}us/file > {limit}us/file")
+    max_regression = thresholds.get('max_regression')
+    if baseline is not None and max_regression:
+        for phase, previous in baseline.get('phases', {}).items():
+            if phase not in phases:
+                continue
+            ratio = max(phases[phase], NOISE_FLOOR_SECONDS) / max(previous, NOISE_FLOOR_SECONDS)
+            if ratio > max_regression:
+                failures.append(f"{phase}: {ratio:.2f}x slower than baseline ({previous:.3f}s -> {phases[phase]:.3f}s)")
+    return failures
+
+
+def _load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='sync2llmtxt 性能基准测试')
+    parser.add_argument('--tree', help='合成目录的位置 (不存在时生成并保留，便于重复运行；默认使用临时目录)')
+    parser.add_argument('--files', type=int, default=5000, help='项目源文件数量')
+    parser.add_argument('--depth', type=int, default=4, help='目录深度')
+    parser.add_argument('--fanout', type=int, default=6, help='每层子目录数')
+    parser.add_argument('--node-modules', type=int, default=20000, help='node_modules 下的文件数量')
+    parser.add_argument('--gitignore-ratio', type=float, default=0.1, help='带有嵌套 .gitignore 的目录比例')
+    parser.add_argument('--binary-ratio', type=float, default=0.02, help='二进制文件比例')
+    parser.add_argument('--oversized-ratio', type=float, default=0.002, help='超过大小上限的文件比例')
+    parser.add_argument('--file-size', type=int, default=2048, help='文本文件的平均字节数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数 (每个阶段取最小值)')
+    parser.add_argument('--read-workers', type=int, default=4, help='读取文件的线程数')
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS, help='阈值文件 (JSON)')
+    parser.add_argument('--baseline', help='用于比较的上一次结果 (JSON)')
+    parser.add_argument('--max-regression', type=float, help='覆盖阈值文件中的 max_regression')
+    parser.add_argument('--output', help='结果输出路径 (JSON)，默认输出到标准输出')
+    args = parser.parse_args(argv)
+
+    # Per-file warnings for oversized and binary files would dominate the timings
+    logging.basicConfig(level=logging.ERROR, format='[%(levelname)-8s] %(message)s')
+    logging.getLogger('sync2llmtxt').setLevel(logging.ERROR)
+
+    shape = TreeShape(files=args.files, depth=args.depth, fanout=args.fanout, node_modules_files=args.node_modules,
+                      gitignore_ratio=args.gitignore_ratio, binary_ratio=args.binary_ratio,
+                      oversized_ratio=args.oversized_ratio, file_size=args.file_size, seed=args.seed)
+    temporary = None
+    root_dir = args.tree
+    if root_dir is None:
+        temporary = root_dir = tempfile.mkdtemp(prefix='sync2llmtxt-tree-')
+    try:
+        tree_counts = None
+        if not os.path.isdir(root_dir) or not os.listdir(root_dir):
+            start = time.perf_counter()
+            tree_counts = generate_tree(root_dir, shape)
+            print(f"已生成合成目录 {root_dir} ({time.perf_counter() - start:.1f}s): {tree_counts}", file=sys.stderr)
+        measured = run_benchmarks(root_dir, args.repeat, read_workers=args.read_workers)
+    finally:
+        if temporary is not None:
+            shutil.rmtree(temporary, ignore_errors=True)
+
+    thresholds = _load_json(args.thresholds) if args.thresholds else {}
+    if args.max_regression is not None:
+        thresholds['max_regression'] = args.max_regression
+    baseline = _load_json(args.baseline) if args.baseline else None
+    results = {
+        'version': RESULTS_FORMAT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'shape': shape.as_dict(),
+        'tree': tree_counts,
+        'repeat': args.repeat,
+    }
+    results.update(measured)
+    results['failures'] = check_thresholds(results, thresholds, baseline)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False) + '\n'
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    for failure in results['failures']:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if results['failures'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import random
+
+# 基准测试使用的文件类型和忽略模式 (node_modules 中的 .js 文件只有被忽略时才不会进入文档)
+BENCHMARK_PATTERNS = ['*.py', '*.js', '*.md', '*.dat']
+BENCHMARK_IGNORES = ['node_modules', '.git', '__pycache__']
+
+_WORDS = ('value', 'result', 'config', 'items', 'index', 'handler', 'payload', 'buffer', 'count', 'path')
+
+
+class TreeShape:
+    """
+    合成目录的形状
+
+    - files: 项目自身的源文件数量 (包括其中的二进制文件和超大文件)
+    - depth / fanout: 目录深度及每层子目录数，文件平均分配到最深一层的目录中
+    - node_modules_files: node_modules 下的文件数量 (被 IGNORE_PATTERNS 整体剪掉)
+    - gitignore_ratio: 带有 .gitignore 的目录比例，每个这样的目录还有一个被它忽略的 generated/ 子目录
+    - binary_ratio / oversized_ratio: 二进制文件和超过大小上限的文件所占比例
+    - file_size: 文本文件的大致字节数；oversized_size: 超大文件的字节数 (稀疏文件，不占用磁盘空间)
+    """
+
+    def __init__(self, files=1000, depth=4, fanout=6, node_modules_files=0, gitignore_ratio=0.1,
+                 binary_ratio=0.02, oversized_ratio=0.002, file_size=2048, oversized_size=2 * 1024 * 1024, seed=0):
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.node_modules_files = node_modules_files
+        self.gitignore_ratio = gitignore_ratio
+        self.binary_ratio = binary_ratio
+        self.oversized_ratio = oversized_ratio
+        self.file_size = file_size
+        self.oversized_size = oversized_size
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _leaf_dir(index, shape):
+    """第 index 个叶子目录的相对路径 (depth 层，每层 fanout 个目录)"""
+    parts = []
+    for _ in range(shape.depth):
+        parts.append(f"pkg{index % shape.fanout}")
+        index //= shape.fanout
+    return os.path.join(*parts) if parts else ''
+
+
+def _source_text(rng, number, size):
+    lines = [f'"""Synthetic module {number}."""', '']
+    length = sum(len(line) + 1 for line in lines)
+    while length < size:
+        name = rng.choice(_WORDS)
+        line = f"def {name}_{len(lines)}({rng.choice(_WORDS)}):\n    return {rng.choice(_WORDS)} + {rng.randint(0, 999)}\n"
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines) + '\n'
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def generate_tree(root_dir, shape):
+    """
+    在 root_dir 下按 shape 生成合成项目 (同一 seed 生成的目录完全相同)
+
+    返回:
+        dict: 各类文件的数量
+    """
+    rng = random.Random(shape.seed)
+    leaf_count = max(1, min(shape.fanout ** shape.depth, shape.files // 8 or 1))
+    counts = {'text': 0, 'binary': 0, 'oversized': 0, 'node_modules': 0, 'gitignore': 0, 'gitignored': 0}
+
+    for number in range(shape.files):
+        dir_path = os.path.join(root_dir, _leaf_dir(number % leaf_count, shape))
+        draw = rng.random()
+        if draw < shape.binary_ratio:
+            _write(os.path.join(dir_path, f"blob{number}.dat"), bytes(rng.getrandbits(8) for _ in range(256)) + b'\0')
+            counts['binary'] += 1
+        elif draw < shape.binary_ratio + shape.oversized_ratio:
+            path = os.path.join(dir_path, f"huge{number}.py")
+            _write(path, b'')
+            os.truncate(path, shape.oversized_size)
+            counts['oversized'] += 1
+        else:
+            size = max(64, int(rng.gauss(shape.file_size, shape.file_size / 4)))
+            _write(os.path.join(dir_path, f"module{number}.py"), _source_text(rng, number, size).encode('utf-8'))
+            counts['text'] += 1
+
+    for index in range(leaf_count):
+        if rng.random() >= shape.gitignore_ratio:
+            continue
+        dir_path = os.path.join(root_dir, _leaf_dir(index, shape))
+        _write(os.path.join(dir_path, '.gitignore'), b"generated/\n*.tmp\n")
+        for number in range(4):
+            _write(os.path.join(dir_path, 'generated', f"gen{number}.py"), b"GENERATED = True\n")
+        counts['gitignore'] += 1
+        counts['gitignored'] += 4
+
+    for number in range(shape.node_modules_files):
+        package = f"package{number // 20}"
+        _write(os.path.join(root_dir, 'node_modules', package, 'lib', f"file{number % 20}.js"),
+               f"module.exports = {number};\n".encode('utf-8'))
+        counts['node_modules'] += 1
+
+    _write(os.path.join(root_dir, 'README.md'), b"# Synthetic project\n")
+    counts['text'] += 1
+    return counts
@@ -1,7 +1,52 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from .sync2llmtxt import main
-from .directory_tree import generate_directory_structure
+import importlib
 
-__version__ = "0.1.0" 
\ No newline at end of file
+# Public name -> submodule. Loaded on first access (PEP 562) so that importing the package, or running
+# a one-shot aggregation through the entry point, doesn't import watchdog, yaml and the other submodules.
+_EXPORTS = {
+    'main': 'sync2llmtxt',
+    'generate_directory_structure': 'directory_tree',
+    'iter_directory_structure': 'directory_tree',
+    'DirectoryTreeModel': 'directory_tree',
+    'FilePatternMatcher': 'discovery',
+    'walk_code_files': 'discovery',
+    'IgnoreMatcher': 'ignore',
+    'GitignoreCache': 'ignore',
+    'AggregationModel': 'model',
+    'SegmentCache': 'cache',
+    'RebuildScheduler': 'scheduler',
+    'RebuildPool': 'scheduler',
+    'RebuildCancelled': 'scheduler',
+    'SegmentStore': 'store',
+    'OutputWriter': 'writer',
+    'write_atomic': 'writer',
+    'ShardedOutput': 'shards',
+    'write_jsonl': 'jsonl',
+    'Project': 'project',
+    'ProjectConfig': 'project',
+    'ProjectDaemon': 'daemon',
+    'Aggregator': 'aggregator',
+    'IgnoreAwareWatcher': 'watcher',
+    'CodeChangeHandler': 'watcher',
+    'PollingWatcher': 'poller',
+    'estimate_tokens': 'tokens',
+}
+
+__all__ = sorted(_EXPORTS)
+
+__version__ = "0.1.0"
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+
+from .project import Project, ProjectConfig
+from .document import (find_duplicates, pack_token_budget, iter_header, iter_file_list, iter_path_segments,
+                       iter_directory_section)
+from .sync2llmtxt import CODE_FILE_PATTERNS, IGNORE_PATTERNS
+
+SEGMENT_HEADER = 'header'
+SEGMENT_FILE = 'file'
+SEGMENT_TREE = 'tree'
+
+
+class Aggregator:
+    """
+    供其他程序在进程内使用的聚合接口。
+
+    由显式的配置构建，不读取也不修改 sync2llmtxt.py 的全局变量，也不写出任何文件：
+    iter_document() / iter_segments() 按生成顺序逐段产出文档内容，调用方可以直接
+    把上下文流式写入 HTTP 请求或分词器，无需临时文件，也无需再次读取。
+
+    不同实例之间没有共享状态，可以在多个线程中同时使用 (各自对应不同的根目录)；
+    同一个实例上的刷新和迭代由锁串行化，迭代期间持有该锁，直到迭代结束或生成器被关闭。
+    模型在多次迭代之间保留，未变化的文件只做一次 stat。
+    """
+
+    def __init__(self, config):
+        """
+        参数:
+            config (ProjectConfig): 项目配置 (output_path 等输出相关设置不会被使用)
+        """
+        self.project = Project(config)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_directory(cls, root_dir, code_file_patterns=None, ignore_patterns=None, **options):
+        """
+        用默认的文件类型和忽略模式 (sync2llmtxt.py 配置区的默认值) 为 root_dir 构建 Aggregator；
+        options 为 ProjectConfig 的其余关键字参数 (如 token_budget、max_file_size_mb、cache_dir)
+        """
+        options.setdefault('enable_monitoring', False)
+        config = ProjectConfig(root_dir, None,
+                               list(CODE_FILE_PATTERNS if code_file_patterns is None else code_file_patterns),
+                               list(IGNORE_PATTERNS if ignore_patterns is None else ignore_patterns), **options)
+        return cls(config)
+
+    @property
+    def root_dir(self):
+        return self.project.root_dir
+
+    def refresh(self, changed_paths=None, cancel_event=None):
+        """
+        按磁盘状态更新模型。给出 changed_paths 时只重新检查这些路径，否则重新遍历整个目录
+        (未变化的文件按 stat 签名复用，不会再次读取)
+
+        返回:
+            dict: 各类文件数量 (见 Project.refresh)
+        """
+        with self._lock:
+            project = self.project
+            if changed_paths is not None and project.configured:
+                for path in changed_paths:
+                    project.model.mark_changed(path)
+                return project.refresh(incremental=True, cancel_event=cancel_event)
+            return project.refresh(cancel_event=cancel_event)
+
+    def iter_segments(self, refresh=True, mode_text="Manual Run", cancel_event=None):
+        """
+        逐段产出 (类型, 相对路径, 文本)：
+
+        - ('header', None, 头部和文件列表)
+        - ('file', 相对路径, '--- File: ... ---' 片段)，按路径顺序每个有内容的文件一段 (重复文件为引用行)
+        - ('tree', None, 目录结构和文档结尾)
+
+        把所有文本依次拼接起来就是完整的文档。refresh 为 False 时使用上次刷新的结果。
+        cancel_event 被设置时抛出 RebuildCancelled。
+        """
+        with self._lock:
+            if refresh or not self.project.configured:
+                self.refresh(cancel_event=cancel_event)
+            project = self.project
+            model = project.model
+            token_budget = project.config.token_budget
+            duplicates = find_duplicates(model) if project.config.deduplicate else {}
+            omitted = pack_token_budget(model, token_budget, duplicates)
+            yield (SEGMENT_HEADER, None,
+                   ''.join(iter_header(mode_text, model, omitted, token_budget, duplicates))
+                   + ''.join(iter_file_list(model, omitted, duplicates=duplicates)))
+            for relative_path, segment in iter_path_segments(model, cancel_event, omitted, duplicates):
+                yield SEGMENT_FILE, relative_path, segment
+            yield (SEGMENT_TREE, None,
+                   ''.join(iter_directory_section(project.root_dir, project.should_ignore,
+                                                  directory_tree=project.tree)))
+
+    def iter_document(self, refresh=True, mode_text="Manual Run", cancel_event=None):
+        """逐段产出文档文本 (拼接结果与写入输出文件的文档相同)"""
+        for _, _, text in self.iter_segments(refresh, mode_text, cancel_event):
+            yield text
+
+    def close(self):
+        """把模型写回内容缓存 (如已配置)，并关闭片段存储；关闭后实例不能再使用"""
+        with self._lock:
+            project = self.project
+            if project.configured:
+                project.save_cache()
+            if project.model.store is not None:
+                project.model.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
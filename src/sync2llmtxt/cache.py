@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import logging
+
+from .model import FileSegment, STATUS_ERROR
+from .store import SegmentStore
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 3
+MANIFEST_NAME = 'manifest.json'
+# Files modified this close to the save time may change again within the same
+# mtime tick; leave them out so the next run re-reads them ("racily clean" entries).
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+class SegmentCache:
+    """
+    磁盘上的内容缓存，让重启和单次运行只读取变化过的文件。
+
+    目录中包含:
+        manifest.json: 每个文件的 (路径, size, mtime_ns, inode, 内容哈希, 状态, 列表条目, 片段偏移, 片段长度, token 数)
+        segments-<n>.txt: manifest 引用的片段存储文件，同时也是聚合模型运行期间使用的 SegmentStore
+
+    运行期间新渲染的片段只会追加到存储文件末尾，旧 manifest 中的偏移始终有效。
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = os.path.abspath(os.fspath(cache_dir))
+        self.manifest_path = os.path.join(self.cache_dir, MANIFEST_NAME)
+
+    def open_store(self):
+        """在缓存目录中创建一个新的片段存储文件"""
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+            # Keep the cache out of git and out of our own discovery walk
+            with open(os.path.join(self.cache_dir, '.gitignore'), 'w', encoding='utf-8') as f:
+                f.write('*\n')
+        return SegmentStore(os.path.join(self.cache_dir, f"segments-{time.time_ns()}.txt"))
+
+    def _read_manifest(self, model):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"无法读取内容缓存 '{self.cache_dir}': {e}")
+            return None
+        if (not isinstance(manifest, dict)
+                or manifest.get('version') != CACHE_FORMAT_VERSION
+                or manifest.get('root_dir') != model.root_dir
+                or manifest.get('max_file_size_warn') != model.max_file_size_warn):
+            logger.info(f"内容缓存 '{self.cache_dir}' 与当前配置不匹配，忽略。")
+            return None
+        return manifest
+
+    def load(self, model):
+        """
+        让 model 使用缓存目录中的片段存储，并恢复与 model 参数一致的条目
+
+        返回:
+            int: 恢复的条目数量
+        """
+        manifest = self._read_manifest(model)
+        restored = []
+        store = None
+        if manifest is not None:
+            try:
+                segments_path = os.path.join(self.cache_dir, os.path.basename(manifest['segments_file']))
+                if not os.path.isfile(segments_path):
+                    raise ValueError(f"missing {segments_path}")
+                store = SegmentStore(segments_path)
+                for relative_path, size, mtime_ns, inode, digest, status, list_entry, offset, length, tokens in manifest['files']:
+                    if offset + length > store.size:
+                        raise ValueError(f"segment of '{relative_path}' beyond end of store")
+                    location = (offset, length) if length else None
+                    restored.append(FileSegment(relative_path, (size, mtime_ns, inode), status, list_entry,
+                                                location, digest, tokens))
+            except (OSError, KeyError, TypeError, ValueError) as e:
+                logger.warning(f"内容缓存 '{self.cache_dir}' 已损坏，忽略: {e}")
+                if store is not None:
+                    store.close()
+                store = None
+                restored = []
+
+        try:
+            model.attach_store(store if store is not None else self.open_store(), restored)
+        except OSError as e:
+            logger.warning(f"无法创建内容缓存 '{self.cache_dir}': {e}")
+            return 0
+        if restored:
+            logger.info(f"从内容缓存恢复了 {len(restored)} 个文件条目。")
+        return len(restored)
+
+    def save(self, model):
+        """把 model 的当前条目写入 manifest (原子替换)，并清理不再被引用的存储文件"""
+        racy_after_ns = time.time_ns() - RACY_WINDOW_NS
+        try:
+            store = model.store
+            if store is None or store.path is None or os.path.dirname(store.path) != self.cache_dir:
+                model.compact(self.open_store())
+                store = model.store
+            store.flush()
+
+            files = []
+            for file_segment in model.iter_segments():
+                if file_segment.status == STATUS_ERROR or file_segment.mtime_ns >= racy_after_ns:
+                    continue
+                offset, length = file_segment.location if file_segment.location is not None else (0, 0)
+                files.append([file_segment.relative_path, file_segment.size, file_segment.mtime_ns, file_segment.ino,
+                              file_segment.digest, file_segment.status, file_segment.list_entry, offset, length,
+                              file_segment.tokens])
+            segments_name = os.path.basename(store.path)
+            manifest = {
+                'version': CACHE_FORMAT_VERSION,
+                'root_dir': model.root_dir,
+                'max_file_size_warn': model.max_file_size_warn,
+                'segments_file': segments_name,
+                'files': files,
+            }
+            manifest_tmp = self.manifest_path + '.tmp'
+            with open(manifest_tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(manifest_tmp, self.manifest_path)
+            logger.debug(f"内容缓存已写入 '{self.cache_dir}' ({len(files)} 个条目, 存储 {store.size} 字节)。")
+        except OSError as e:
+            logger.warning(f"写入内容缓存失败 '{self.cache_dir}': {e}")
+            return
+
+        # Drop segment files no longer referenced by the manifest
+        for name in os.listdir(self.cache_dir):
+            if name.startswith('segments-') and name != segments_name:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+
+from .project import Project
+from .scheduler import RebuildPool
+from .watcher import IgnoreAwareWatcher, CodeChangeHandler, create_observer
+from .poller import PollingWatcher
+from .writer import OutputWriter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REBUILD_WORKERS = 2
+# 所有项目合计的 watchdog watch 数量上限 (按项目平均分配)
+DEFAULT_TOTAL_WATCHES = 256
+
+
+def load_project_configs(entries, base_config):
+    """
+    把 YAML 中的 PROJECTS 列表转换为 ProjectConfig 列表；
+    每一项使用与单项目配置相同的键名，未给出的键沿用 base_config (顶层配置)
+
+    返回:
+        list: ProjectConfig 列表
+
+    异常:
+        ValueError: 某一项不是映射，或缺少 MONITORED_CODE_DIR / OUTPUT_DOCUMENT_PATH
+    """
+    configs = []
+    for index, entry in enumerate(entries or []):
+        if not isinstance(entry, dict):
+            raise ValueError(f"PROJECTS[{index}] 必须是映射")
+        for key in ('MONITORED_CODE_DIR', 'OUTPUT_DOCUMENT_PATH'):
+            if not entry.get(key):
+                raise ValueError(f"PROJECTS[{index}] 缺少 {key}")
+        configs.append(base_config.updated(entry))
+    return configs
+
+
+class ProjectDaemon:
+    """
+    在一个进程中监控多个项目的守护进程。
+
+    每个项目的状态保存在各自的 Project 实例中；所有项目共享一个 watchdog Observer、
+    一个容量固定的重建线程池 (RebuildPool) 和一个输出写入器，重建线程数只取决于 rebuild_workers。
+    监控的开销随项目数量增长：Linux 上每个项目占用一个 inotify 实例 (文件描述符) 和两个线程
+    (PrunedInotifyEmitter 及其读取线程)；其他平台上每个 watch 一个线程，watch 总数不超过 max_watches
+    (按项目平均分配)。配置了 POLL_INTERVAL 的项目改用各自的轮询线程。
+    """
+
+    def __init__(self, configs, rebuild_workers=DEFAULT_REBUILD_WORKERS, max_watches=DEFAULT_TOTAL_WATCHES):
+        self.output_writer = OutputWriter()
+        self.projects = [Project(config, self.output_writer) for config in configs]
+        self.pool = RebuildPool(rebuild_workers, name='sync2llmtxt-daemon')
+        self.max_watches = max_watches
+        self.observer = None
+        self.pollers = []
+        self._targets = []
+
+    def start(self):
+        """注册所有项目的监控，然后在线程池中完成各项目的首次完整聚合"""
+        monitored = [p for p in self.projects if p.config.enable_monitoring]
+        watched = [p for p in monitored if not p.config.poll_interval]
+        watches_per_project = max(1, self.max_watches // max(1, len(watched)))
+        if watched:
+            self.observer = create_observer()
+
+        for project in self.projects:
+            target = self.pool.register(project.rebuild_changed_paths, project.config.debounce_time)
+            self._targets.append(target)
+            if not project.config.enable_monitoring:
+                continue
+            if not os.path.isdir(project.root_dir):
+                logger.error(f"源目录 '{project.root_dir}' 无效，跳过监控。")
+                continue
+            handler = CodeChangeHandler(project, target)
+            if project.config.poll_interval:
+                self.pollers.append(PollingWatcher(handler, project.root_dir, project.should_ignore,
+                                                   project.config.poll_interval))
+            else:
+                IgnoreAwareWatcher(self.observer, handler, project.root_dir, project.should_ignore,
+                                   max_watches=watches_per_project).schedule()
+
+        self.pool.start()
+        if self.observer is not None:
+            self.observer.start()
+        for poller in self.pollers:
+            poller.start()
+        # The first rebuild of a project is a full aggregation (Project.configured is still False)
+        for target in self._targets:
+            target.submit()
+        logger.info(f"守护进程已启动: {len(self.projects)} 个项目 (监控 {len(monitored)} 个)，"
+                    f"重建线程 {self.pool.workers} 个，每个项目最多 {watches_per_project} 个 watch。")
+        return self
+
+    def stop(self):
+        """停止监控和重建线程，并把各项目的增量更新写回内容缓存"""
+        watchers = ([self.observer] if self.observer is not None else []) + self.pollers
+        for watcher in watchers:
+            watcher.stop()
+        for watcher in watchers:
+            watcher.join()
+        self.pool.stop()
+        for project in self.projects:
+            project.save_cache()
+        logger.info("守护进程已停止。")
@@ -2,98 +2,290 @@
 # -*- coding: utf-8 -*-
 
 import os
+import bisect
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
-def generate_directory_structure(root_dir, should_ignore_fn=None):
+_BRANCH = "├── "
+_LAST_BRANCH = "└── "
+_PIPE_INDENT = "│   "
+_SPACE_INDENT = "    "
+
+
+def scan_tree_entries(dir_path, should_ignore_fn=None, entries=None):
+    """
+    列出 dir_path 中未被忽略的条目，按名称排序
+
+    参数:
+        dir_path (str): 要列出的目录
+        should_ignore_fn (callable, optional): 接收路径并返回是否忽略
+        entries (list, optional): 已经 scandir 得到的 DirEntry 列表 (共享遍历时传入，避免再次列目录)
+
+    返回:
+        list: [(名称, 是否目录, 是否符号链接)]；目录判断与 os.path.isdir 一致 (跟随符号链接)
+
+    无法列出目录时抛出 OSError。
+    """
+    if entries is None:
+        with os.scandir(dir_path) as it:
+            entries = list(it)
+    listing = []
+    for entry in entries:
+        if should_ignore_fn is not None and should_ignore_fn(entry.path):
+            logger.debug(f"Skipping tree entry: '{entry.path}' (ignored by should_ignore)")
+            continue
+        try:
+            is_dir = entry.is_dir()
+            is_link = entry.is_symlink()
+        except OSError:
+            is_dir = is_link = False
+        listing.append((entry.name, is_dir, is_link))
+    listing.sort()
+    return listing
+
+
+def links_to_ancestor(link_path, parent_path):
+    """符号链接 link_path 是否指向 parent_path 或其祖先目录 (进入它会无限循环)"""
+    target = os.path.realpath(link_path)
+    parent = os.path.realpath(parent_path)
+    return parent == target or parent.startswith(target.rstrip(os.sep) + os.sep)
+
+
+def generate_directory_structure(root_dir, should_ignore_fn=None, listings=None):
     """
     生成目录结构的字符串表示，可选忽略特定路径
     
     参数:
         root_dir (str): 要生成结构的根目录
         should_ignore_fn (callable, optional): 一个函数，接收路径并返回布尔值决定是否忽略
+        listings (dict, optional): {目录路径: scan_tree_entries 的结果}，通常由文件发现的那次遍历填充
         
     返回:
         str: 目录结构的字符串表示
     """
-    structure_lines = []
+    try:
+        return "\n".join(iter_directory_structure(root_dir, should_ignore_fn, listings))
+    except OSError as e:
+        logger.error(f"FATAL: Cannot list root directory '{root_dir}' to generate tree structure: {e}")
+        return "*** Error generating directory structure ***" # Return an error message
+
+
+def iter_directory_structure(root_dir, should_ignore_fn=None, listings=None):
+    """
+    逐行产出目录结构 (generate_directory_structure 的生成器版本)
+
+    迭代实现，不受递归深度限制。listings 中已有的目录直接使用其条目，
+    其余目录 (如符号链接指向的目录) 才调用 os.scandir；指向祖先目录的符号链接不展开。
+    无法列出根目录时抛出 OSError；子目录无法列出时只记录警告并跳过。
+    """
+    root_dir = os.fspath(root_dir)
     # Start with the root directory name
-    structure_lines.append(os.path.basename(root_dir) + os.sep)
+    yield os.path.basename(root_dir) + os.sep
+
+    def list_entries(dir_path):
+        listing = listings.get(dir_path) if listings is not None else None
+        if listing is None:
+            listing = scan_tree_entries(dir_path, should_ignore_fn)
+        return listing
+
+    # Each frame: [directory path, entries, next index, prefix shared by all its lines]
+    stack = [[root_dir, list_entries(root_dir), 0, ""]]
+    while stack:
+        frame = stack[-1]
+        dir_path, entries, index, prefix = frame
+        if index == len(entries):
+            stack.pop()
+            continue
+        frame[2] = index + 1
+        name, is_dir, is_link = entries[index]
+        is_last_entry = index == len(entries) - 1
+        connector = _LAST_BRANCH if is_last_entry else _BRANCH
+        if not is_dir:
+            yield f"{prefix}{connector}{name}"
+            continue
 
-    def build_tree_recursive(current_dir, prefix, is_last_list):
+        yield f"{prefix}{connector}{name}{os.sep}" # Add a slash to directory names in the tree
+        child_path = os.path.join(dir_path, name)
+        if is_link and links_to_ancestor(child_path, dir_path):
+            logger.debug(f"Not expanding '{child_path}': symlink to an ancestor directory")
+            continue
         try:
-            entries = sorted(os.listdir(current_dir))
+            child_entries = list_entries(child_path)
         except OSError as e:
-            logger.warning(f"Cannot list directory '{current_dir}' for tree structure: {e}")
-            return # Stop traversing this branch
-
-        # Filter entries based on ignore function if provided
-        filtered_entries = []
-        for entry in entries:
-            full_path = os.path.join(current_dir, entry)
-            if should_ignore_fn is None or not should_ignore_fn(full_path):
-                filtered_entries.append(entry)
-            else:
-                logger.debug(f"Skipping tree entry: '{full_path}' (ignored by should_ignore)")
+            logger.warning(f"Cannot list directory '{child_path}' for tree structure: {e}")
+            continue # Stop traversing this branch
+        if child_entries:
+            stack.append([child_path, child_entries, 0, prefix + (_SPACE_INDENT if is_last_entry else _PIPE_INDENT)])
 
-        num_entries = len(filtered_entries)
-        for i, entry in enumerate(filtered_entries):
-            is_last_entry = (i == num_entries - 1)
-            full_path = os.path.join(current_dir, entry)
+class DirectoryNode:
+    """
+    目录结构模型中的一个目录
 
-            # Build the prefix string based on the is_last_list state
-            current_prefix_str = ""
-            for is_last_parent in is_last_list:
-                current_prefix_str += "    " if is_last_parent else "│   "
+    children 把子条目名称映射到 DirectoryNode (目录) 或 None (文件)，names 为排序后的名称；
+    lines 缓存该目录自身各条目的渲染行 (不含子目录内容)，prefix 是渲染 lines 时使用的缩进前缀。
+    """
+    __slots__ = ('children', 'names', 'lines', 'prefix')
 
-            connector = "└── " if is_last_entry else "├── "
+    def __init__(self):
+        self.children = {}
+        self.names = []
+        self.lines = None
+        self.prefix = None
 
-            display_name = entry
-            if os.path.isdir(full_path):
-                display_name += os.sep # Add a slash to directory names in the tree
 
-            structure_lines.append(f"{current_prefix_str}{connector}{display_name}")
+class DirectoryTreeModel:
+    """
+    常驻内存的目录结构模型 (监控模式使用)。
 
-            if os.path.isdir(full_path):
-                # Recursively call for subdirectories
-                # Pass updated prefix and append current entry's last status to the list
-                build_tree_recursive(full_path, prefix + ("    " if is_last_entry else "│   "), is_last_list + [is_last_entry])
+    完整遍历后通过 reload(listings) 重建；之后文件/目录的新建、删除和移动只通过
+    mark_changed 记录路径，渲染前按磁盘当前状态插入或移除对应节点，
+    只有条目发生变化的目录 (以及缩进前缀变化的子树) 才重新生成渲染行。
+    结构未变化时 render() 直接返回上次的结果，文件保存不产生任何开销。
+    """
 
-    # Start the recursive process for the children of the root directory
-    try:
-        root_entries = sorted(os.listdir(root_dir))
-        # Filter root entries using should_ignore_fn
-        filtered_root_entries = []
-        for entry in root_entries:
-            full_path = os.path.join(root_dir, entry)
-            if should_ignore_fn is None or not should_ignore_fn(full_path):
-                filtered_root_entries.append(entry)
+    def __init__(self, root_dir, should_ignore_fn=None):
+        self.root_dir = os.path.normpath(os.fspath(root_dir))
+        self.should_ignore_fn = should_ignore_fn
+        self.root = None
+        self._listings = None
+        self._text = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def reload(self, listings=None):
+        """丢弃当前模型，下次渲染时由 listings (缺失的目录从磁盘读取) 重新构建"""
+        self.root = None
+        self._listings = listings
+        self._text = None
+
+    def mark_changed(self, path):
+        """记录一个新建、删除或移动的路径，下次渲染时按磁盘状态更新"""
+        with self._lock:
+            self._pending.add(os.path.normpath(os.fspath(path)))
+
+    def _build(self, dir_path, listings=None):
+        """从 listings 或磁盘构建 dir_path 的子树 (迭代实现)；根目录无法列出时抛出 OSError"""
+        top = DirectoryNode()
+        stack = [(dir_path, top)]
+        while stack:
+            current_dir, node = stack.pop()
+            listing = listings.get(current_dir) if listings is not None else None
+            if listing is None:
+                try:
+                    listing = scan_tree_entries(current_dir, self.should_ignore_fn)
+                except OSError as e:
+                    if node is top:
+                        raise
+                    logger.warning(f"Cannot list directory '{current_dir}' for tree structure: {e}")
+                    continue
+            for name, is_dir, is_link in listing:
+                child = None
+                if is_dir:
+                    child = DirectoryNode()
+                    child_path = os.path.join(current_dir, name)
+                    if not (is_link and links_to_ancestor(child_path, current_dir)):
+                        stack.append((child_path, child))
+                node.children[name] = child
+            node.names = [name for name, _, _ in listing]
+        return top
+
+    def _refresh_entry(self, node, parent_path, name):
+        """按磁盘状态更新 node 中名为 name 的条目"""
+        path = os.path.join(parent_path, name)
+        exists = os.path.lexists(path) and not (self.should_ignore_fn is not None and self.should_ignore_fn(path))
+        if not exists:
+            if name not in node.children:
+                return
+            del node.children[name]
+            del node.names[bisect.bisect_left(node.names, name)]
+        else:
+            is_dir = os.path.isdir(path)
+            if name in node.children:
+                if (node.children[name] is not None) == is_dir:
+                    return # Still there; changes inside a directory arrive as their own events
             else:
-                logger.debug(f"Skipping root entry: '{full_path}' (ignored by should_ignore)")
-                
-        num_root_entries = len(filtered_root_entries)
+                bisect.insort(node.names, name)
+            child = None
+            if is_dir and os.path.islink(path) and links_to_ancestor(path, parent_path):
+                child = DirectoryNode()
+            elif is_dir:
+                try:
+                    child = self._build(path)
+                except OSError as e:
+                    logger.warning(f"Cannot list directory '{path}' for tree structure: {e}")
+                    child = DirectoryNode()
+            node.children[name] = child
+        node.lines = None
+        self._text = None
 
-        for i, entry in enumerate(filtered_root_entries):
-            is_last_entry = (i == num_root_entries - 1)
-            full_path = os.path.join(root_dir, entry)
+    def _apply_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        for path in sorted(pending):
+            relative_path = os.path.relpath(path, self.root_dir)
+            if relative_path == os.curdir or relative_path.startswith(os.pardir):
+                continue
+            node = self.root
+            parent_path = self.root_dir
+            parts = relative_path.split(os.sep)
+            # The first component missing from the model is rebuilt from disk with everything below it
+            for part in parts[:-1]:
+                child = node.children.get(part)
+                if child is None:
+                    break
+                node = child
+                parent_path = os.path.join(parent_path, part)
+            else:
+                part = parts[-1]
+            self._refresh_entry(node, parent_path, part)
 
-            connector = "└── " if is_last_entry else "├── "
-            display_name = entry
-            if os.path.isdir(full_path):
-                display_name += os.sep
+    def _render_lines(self, node, prefix):
+        last_index = len(node.names) - 1
+        lines = []
+        for index, name in enumerate(node.names):
+            connector = _LAST_BRANCH if index == last_index else _BRANCH
+            suffix = os.sep if node.children[name] is not None else ""
+            lines.append(f"\n{prefix}{connector}{name}{suffix}")
+        node.lines = lines
+        node.prefix = prefix
 
-            structure_lines.append(f"{connector}{display_name}")
+    def render(self):
+        """
+        返回完整的目录结构文本 (与 generate_directory_structure 的结果相同)
 
-            if os.path.isdir(full_path):
-                # Start recursive call for subdirectories, initial is_last_list contains only the status of this entry
-                build_tree_recursive(full_path, ("    " if is_last_entry else "│   "), [is_last_entry])
+        无法列出根目录时抛出 OSError。
+        """
+        if self.root is None:
+            self.root = self._build(self.root_dir, self._listings)
+            self._listings = None
+            self._text = None
+        self._apply_pending()
+        if self._text is not None:
+            return self._text
 
-    except OSError as e:
-        logger.error(f"FATAL: Cannot list root directory '{root_dir}' to generate tree structure: {e}")
-        return "*** Error generating directory structure ***" # Return an error message
+        parts = [os.path.basename(self.root_dir) + os.sep]
+        # Each frame: [node, prefix of its entries, next index]
+        stack = [[self.root, "", 0]]
+        while stack:
+            frame = stack[-1]
+            node, prefix, index = frame
+            if node.lines is None or node.prefix != prefix:
+                # Only directories whose entries or indentation changed are re-rendered
+                self._render_lines(node, prefix)
+            if index == len(node.names):
+                stack.pop()
+                continue
+            frame[2] = index + 1
+            parts.append(node.lines[index])
+            child = node.children[node.names[index]]
+            if child is not None and child.names:
+                is_last_entry = index == len(node.names) - 1
+                stack.append([child, prefix + (_SPACE_INDENT if is_last_entry else _PIPE_INDENT), 0])
+        self._text = "".join(parts)
+        return self._text
 
-    return "\n".join(structure_lines)
 
 if __name__ == "__main__":
     # Simple test
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import fnmatch
+import logging
+
+from .directory_tree import scan_tree_entries
+
+logger = logging.getLogger(__name__)
+
+_WILDCARD_CHARS = ('*', '?', '[')
+
+
+def _has_wildcard(pattern):
+    return any(c in pattern for c in _WILDCARD_CHARS)
+
+
+class FilePatternMatcher:
+    """
+    将 CODE_FILE_PATTERNS 预编译为一个文件名匹配器。
+
+    - 无通配符的模式 (如 'Makefile') 走集合查找
+    - 形如 '*.py' 的模式合并为一个 str.endswith 元组
+    - 其余模式合并为一个正则表达式
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.names = set()
+        suffixes = []
+        regexes = []
+        for pattern in self.patterns:
+            pattern = os.path.normcase(pattern)
+            if not _has_wildcard(pattern):
+                self.names.add(pattern)
+            elif pattern.startswith('*') and not _has_wildcard(pattern[1:]):
+                suffixes.append(pattern[1:])
+            else:
+                regexes.append(fnmatch.translate(pattern))
+        self.suffixes = tuple(suffixes)
+        self._regex_match = re.compile('|'.join(regexes)).match if regexes else None
+
+    def __call__(self, filename):
+        name = os.path.normcase(filename)
+        if name in self.names or name.endswith(self.suffixes):
+            return True
+        return self._regex_match is not None and self._regex_match(name) is not None
+
+
+def walk_code_files(root_dir, file_matcher, should_ignore_fn=None, listings=None, counters=None):
+    """
+    单次遍历 root_dir，产出文件名匹配 file_matcher 的文件路径
+
+    参数:
+        root_dir (str): 要遍历的根目录
+        file_matcher (callable): 接收文件名并返回是否匹配
+        should_ignore_fn (callable, optional): 接收目录路径，返回 True 时不进入该目录
+        listings (dict, optional): 传入时记录每个被遍历目录的 scan_tree_entries 结果，
+            供 iter_directory_structure 直接渲染目录结构。此时每个条目 (包括文件) 都已经过
+            should_ignore_fn 判断，被忽略的文件也不再产出，调用方无需逐个文件再判断一次
+        counters (dict, optional): 传入时在遍历完成后累加 dirs_visited / dirs_pruned / files_visited /
+            files_pruned (被忽略的文件，只在传入 listings 时判断) / files_matched
+
+    返回:
+        generator: 匹配文件的完整路径 (str)，顺序不保证
+    """
+    dirs_visited = dirs_pruned = files_visited = files_pruned = files_matched = 0
+    stack = [os.fspath(root_dir)]
+    while stack:
+        current_dir = stack.pop()
+        try:
+            with os.scandir(current_dir) as it:
+                entries = list(it)
+        except OSError as e:
+            logger.warning(f"Cannot scan directory '{current_dir}': {e}")
+            continue
+        dirs_visited += 1
+
+        kept_names = None
+        if listings is not None:
+            listing = scan_tree_entries(current_dir, should_ignore_fn, entries)
+            listings[current_dir] = listing
+            kept_names = {name for name, _, _ in listing}
+
+        for entry in entries:
+            try:
+                # Like Path.rglob, do not descend into symlinked directories
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if kept_names is not None:
+                    ignored = entry.name not in kept_names
+                else:
+                    ignored = should_ignore_fn is not None and should_ignore_fn(entry.path)
+                if ignored:
+                    logger.debug(f"Pruning ignored directory: '{entry.path}'")
+                    dirs_pruned += 1
+                    continue
+                stack.append(entry.path)
+                continue
+            files_visited += 1
+            if kept_names is not None and entry.name not in kept_names:
+                files_pruned += 1
+            elif file_matcher(entry.name):
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                files_matched += 1
+                yield entry.path
+
+    if counters is not None:
+        for name, value in (('dirs_visited', dirs_visited), ('dirs_pruned', dirs_pruned),
+                            ('files_visited', files_visited), ('files_pruned', files_pruned),
+                            ('files_matched', files_matched)):
+            counters[name] = counters.get(name, 0) + value
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+
+from .directory_tree import iter_directory_structure
+from .model import STATUS_EMPTY, STATUS_BINARY, STATUS_ERROR
+from .scheduler import RebuildCancelled
+
+logger = logging.getLogger(__name__)
+
+
+def find_duplicates(model):
+    """
+    按读取时计算的内容哈希找出内容相同的文件：按路径顺序第一个副本保留内容，
+    其后的副本在文档中只输出 '--- File: x (identical to y) ---' 引用 (只使用元数据，不读取片段)
+
+    返回:
+        dict: 重复文件的相对路径 -> 内容相同且排在最前的文件的相对路径
+    """
+    first_paths = {}
+    duplicates = {}
+    for file_segment in model.iter_segments():
+        if file_segment.location is None or file_segment.digest is None:
+            continue
+        original = first_paths.setdefault(file_segment.digest, file_segment.relative_path)
+        if original != file_segment.relative_path:
+            duplicates[file_segment.relative_path] = original
+    return duplicates
+
+
+def duplicate_reference(relative_path, original):
+    """重复文件在文档中代替内容片段的引用行"""
+    return f"\n--- File: {relative_path} (identical to {original}) ---\n"
+
+
+def pack_token_budget(model, token_budget, duplicates=None):
+    """
+    把有内容的文件按优先级装入 token_budget：最近修改的文件优先 (同一时间按路径)，
+    放得下就收入，放不下就跳过并继续尝试后面较小的文件。
+    重复文件 (见 find_duplicates) 不占用预算，随其引用的文件一起收入或省略。
+
+    返回:
+        set: 因超出预算而省略内容的相对路径；token_budget 为 None 时为空集合
+    """
+    if token_budget is None:
+        return set()
+    duplicates = duplicates or {}
+    candidates = [s for s in model.iter_segments() if s.location is not None and s.relative_path not in duplicates]
+    candidates.sort(key=lambda s: (-s.mtime_ns, s.relative_path))
+    remaining = token_budget
+    omitted = set()
+    for file_segment in candidates:
+        if file_segment.tokens <= remaining:
+            remaining -= file_segment.tokens
+        else:
+            omitted.add(file_segment.relative_path)
+    omitted.update(path for path, original in duplicates.items() if original in omitted)
+    return omitted
+
+
+def included_tokens(model, omitted=frozenset(), duplicates=None):
+    """文档中实际收入的文件内容的估算 token 总数 (不计 omitted 中的文件和重复文件)"""
+    duplicates = duplicates or {}
+    return sum(s.tokens for s in model.iter_segments()
+               if s.location is not None and s.relative_path not in omitted and s.relative_path not in duplicates)
+
+
+def iter_header(mode_text, model=None, omitted=frozenset(), token_budget=None, duplicates=None):
+    """产出文档头部；给出 model 时附上文件内容的估算 token 总数 (以及预算，重复文件不计)"""
+    # The timestamp must stay alone on the first line (OutputWriter ignores it when comparing)
+    yield f"--- Project Code Context ({mode_text} @ {time.strftime('%Y-%m-%d %H:%M:%S')}) ---\n\n"
+    if model is None or not model.order:
+        return
+    total_tokens = included_tokens(model, omitted, duplicates)
+    if token_budget is None:
+        yield f"Estimated Tokens (file contents): ~{total_tokens:,}\n\n"
+    else:
+        yield f"Estimated Tokens (file contents): ~{total_tokens:,} of {token_budget:,} budget\n\n"
+
+
+def iter_file_list(model, omitted=frozenset(), locations=None, duplicates=None):
+    """
+    产出 'Included Files' 列表 (只使用模型中的元数据，不读取片段)；
+    omitted 中的文件改列在 'Omitted To Fit Token Budget' 部分，duplicates 中的文件注明与哪个文件相同。
+    locations (相对路径 -> 分片文件名) 给出时改为注明内容所在的分片 (不含随编辑变化的 token 数)
+    """
+    duplicates = duplicates or {}
+    if not model.order:
+        yield "*** No matching code files found or all were ignored. ***\n"
+        return
+    included_count = sum(1 for s in model.iter_segments()
+                         if s.status != STATUS_ERROR and s.relative_path not in omitted)
+    yield f"Included Files ({included_count}):\n"
+    for file_segment in model.iter_segments():
+        if file_segment.relative_path in omitted:
+            continue
+        if file_segment.status == STATUS_EMPTY:
+            yield f"- {file_segment.relative_path} (Empty)\n"
+        elif file_segment.status == STATUS_BINARY:
+            yield f"- {file_segment.relative_path} (Binary)\n"
+        elif file_segment.location is not None and locations is not None:
+            yield f"- {file_segment.relative_path} -> {locations[file_segment.relative_path]}\n"
+        elif file_segment.relative_path in duplicates:
+            yield f"- {file_segment.relative_path} (identical to {duplicates[file_segment.relative_path]})\n"
+        elif file_segment.location is not None:
+            yield f"- {file_segment.relative_path} (~{file_segment.tokens:,} tokens)\n"
+        else:
+            yield f"- {file_segment.relative_path}\n"
+    if omitted:
+        omitted_segments = [s for s in model.iter_segments() if s.relative_path in omitted]
+        omitted_tokens = sum(s.tokens for s in omitted_segments if s.relative_path not in duplicates)
+        yield f"\nOmitted To Fit Token Budget ({len(omitted_segments)} files, ~{omitted_tokens:,} tokens):\n"
+        for file_segment in omitted_segments:
+            if file_segment.relative_path in duplicates:
+                yield f"- {file_segment.relative_path} (identical to {duplicates[file_segment.relative_path]})\n"
+            else:
+                yield f"- {file_segment.relative_path} (~{file_segment.tokens:,} tokens)\n"
+    yield "\n---\n\n"
+
+
+def iter_path_segments(model, cancel_event=None, omitted=frozenset(), duplicates=None):
+    """
+    按路径顺序逐个产出 (相对路径, '--- File: ... ---' 片段) (跳过 omitted 中的文件)；
+    duplicates 中的文件不读取片段，只产出引用行。cancel_event 被设置时抛出 RebuildCancelled
+    """
+    duplicates = duplicates or {}
+    for file_segment in model.iter_segments():
+        if cancel_event is not None and cancel_event.is_set():
+            raise RebuildCancelled()
+        if file_segment.relative_path in omitted:
+            continue
+        original = duplicates.get(file_segment.relative_path)
+        if original is not None:
+            yield file_segment.relative_path, duplicate_reference(file_segment.relative_path, original)
+            continue
+        segment = model.read_segment(file_segment)
+        if segment is not None:
+            yield file_segment.relative_path, segment
+
+
+def iter_file_segments(model, cancel_event=None, omitted=frozenset(), duplicates=None):
+    """按路径顺序逐个产出片段文本 (见 iter_path_segments)"""
+    for _, segment in iter_path_segments(model, cancel_event, omitted, duplicates):
+        yield segment
+
+
+def iter_directory_section(root_dir, should_ignore_fn=None, listings=None, directory_tree=None, separator=True):
+    """
+    产出目录结构部分以及文档结尾 (separator 为 False 时省略前面的分隔线)
+
+    给出 directory_tree (DirectoryTreeModel) 时使用其增量维护的结果，
+    否则按 listings (见 iter_directory_structure) 或磁盘生成。
+    """
+    logger.info("Generating directory structure...")
+    if separator:
+        yield "\n\n---\n\n" # Separator before structure
+    yield "--- Directory Structure (Ignoring Patterns) ---\n\n"
+    try:
+        if directory_tree is not None:
+            yield directory_tree.render()
+        else:
+            for index, line in enumerate(iter_directory_structure(root_dir, should_ignore_fn, listings)):
+                yield line if index == 0 else "\n" + line
+        logger.info("Directory structure generated and added.")
+    except Exception as e:
+        logger.error(f"Error generating directory structure: {e}")
+        yield "\n*** Failed to generate directory structure ***"
+    yield "\n\n--- End of Document ---"
+
+
+def iter_document(model, mode_text, root_dir, should_ignore_fn=None, cancel_event=None, listings=None,
+                  directory_tree=None, token_budget=None, deduplicate=False):
+    """
+    按顺序产出完整文档：头部、文件列表、文件片段、目录结构
+
+    任意时刻内存中只有一个文件的片段；cancel_event 被设置时抛出 RebuildCancelled。
+    给出 token_budget 时只收入按 pack_token_budget 装得下的文件内容；
+    deduplicate 为 True 时内容相同的文件只输出一次 (见 find_duplicates)。
+    """
+    duplicates = find_duplicates(model) if deduplicate else {}
+    omitted = pack_token_budget(model, token_budget, duplicates)
+    if omitted:
+        logger.info(f"Token budget {token_budget}: omitting the contents of {len(omitted)} files.")
+    if duplicates:
+        logger.info(f"Deduplicated {len(duplicates)} files with identical content.")
+    yield from iter_header(mode_text, model, omitted, token_budget, duplicates)
+    yield from iter_file_list(model, omitted, duplicates=duplicates)
+    yield from iter_file_segments(model, cancel_event, omitted, duplicates)
+    if cancel_event is not None and cancel_event.is_set():
+        raise RebuildCancelled()
+    yield from iter_directory_section(root_dir, should_ignore_fn, listings, directory_tree)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import stat
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+DISCOVERY_WALK = 'walk'
+DISCOVERY_GIT_INDEX = 'git-index'
+DISCOVERY_SOURCES = (DISCOVERY_WALK, DISCOVERY_GIT_INDEX)
+
+# ctime, mtime (seconds, nanoseconds), dev, ino, mode, uid, gid, size
+_ENTRY_STAT = struct.Struct('>10I')
+_FLAG_EXTENDED = 0x4000
+_FLAG_STAGE = 0x3000
+_NAME_MASK = 0x0fff
+_EXTENDED_SKIP_WORKTREE = 0x4000
+_MODE_GITLINK = 0o160000
+
+
+class IndexEntry:
+    """.git/index 中的一个条目：相对于仓库根目录的路径 ('/' 分隔)、模式以及缓存的 stat 数据"""
+    __slots__ = ('path', 'mode', 'size', 'mtime_ns', 'ino')
+
+    def __init__(self, path, mode, size, mtime_ns, ino):
+        self.path = path
+        self.mode = mode
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.ino = ino
+
+
+def find_git_dir(path):
+    """
+    从 path 向上查找 git 工作区
+
+    返回:
+        tuple | None: (工作区根目录, git 目录)；.git 是文件 (worktree / submodule) 时按其中的 gitdir 解析
+    """
+    current = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(current, '.git')
+        if os.path.isdir(dot_git):
+            return current, dot_git
+        if os.path.isfile(dot_git):
+            try:
+                with open(dot_git, 'r', encoding='utf-8') as f:
+                    line = f.readline().strip()
+            except OSError:
+                line = ''
+            if line.startswith('gitdir:'):
+                return current, os.path.normpath(os.path.join(current, line[len('gitdir:'):].strip()))
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def _hash_size(git_dir):
+    """对象哈希长度：SHA-1 为 20 字节，extensions.objectFormat = sha256 的仓库为 32 字节"""
+    try:
+        with open(os.path.join(git_dir, 'config'), 'r', encoding='utf-8') as f:
+            for line in f:
+                key, _, value = line.partition('=')
+                if key.strip().lower() == 'objectformat' and value.strip().lower() == 'sha256':
+                    return 32
+    except OSError:
+        pass
+    return 20
+
+
+def _read_varint(data, pos):
+    # git's offset varint (index v4 path prefix lengths)
+    byte = data[pos]
+    pos += 1
+    value = byte & 0x7f
+    while byte & 0x80:
+        byte = data[pos]
+        pos += 1
+        value = ((value + 1) << 7) | (byte & 0x7f)
+    return value, pos
+
+
+def read_git_index(index_path, hash_size=20):
+    """
+    解析 .git/index (版本 2、3、4)，不需要 git 命令
+
+    冲突条目 (stage 1-3) 只保留一次；skip-worktree (稀疏检出) 条目和稀疏索引中的目录条目不在工作区，被跳过。
+
+    返回:
+        list: 按路径排序的 IndexEntry 列表
+
+    异常:
+        OSError: 无法读取索引文件
+        ValueError: 不是受支持的索引文件
+    """
+    with open(index_path, 'rb') as f:
+        data = f.read()
+    if len(data) < 12 or data[:4] != b'DIRC':
+        raise ValueError(f"'{index_path}' 不是 git 索引文件")
+    version, count = struct.unpack_from('>II', data, 4)
+    if version not in (2, 3, 4):
+        raise ValueError(f"不支持的 git 索引版本 {version}")
+
+    entries = []
+    pos = 12
+    previous = b''
+    last_path = None
+    try:
+        for _ in range(count):
+            start = pos
+            (_, _, mtime_s, mtime_ns, _, ino, mode, _, _, size) = _ENTRY_STAT.unpack_from(data, pos)
+            pos += _ENTRY_STAT.size + hash_size
+            flags, = struct.unpack_from('>H', data, pos)
+            pos += 2
+            extended = 0
+            if flags & _FLAG_EXTENDED:
+                extended, = struct.unpack_from('>H', data, pos)
+                pos += 2
+            if version == 4:
+                strip, pos = _read_varint(data, pos)
+                end = data.index(b'\0', pos)
+                path = previous[:len(previous) - strip] + data[pos:end]
+                pos = end + 1
+                previous = path
+            else:
+                length = flags & _NAME_MASK
+                end = pos + length if length < _NAME_MASK else data.index(b'\0', pos)
+                path = data[pos:end]
+                # Entries are NUL-padded to a multiple of 8 bytes
+                pos = start + ((end - start + 8) & ~7)
+            if extended & _EXTENDED_SKIP_WORKTREE or stat.S_ISDIR(mode) or path == last_path:
+                continue
+            if flags & _FLAG_STAGE:
+                last_path = path
+            entries.append(IndexEntry(os.fsdecode(path), mode, size, mtime_s * 1000000000 + mtime_ns, ino))
+    except (struct.error, ValueError, IndexError):
+        raise ValueError(f"git 索引文件 '{index_path}' 已损坏或被截断")
+    return entries
+
+
+def git_index_files(root_dir, file_matcher, should_ignore_fn=None, listings=None, counters=None):
+    """
+    由 .git/index 列出 root_dir 下被跟踪的文件，代替 walk_code_files 遍历工作区
+
+    与传入 listings 的 walk_code_files 相同，产出的文件都已经过 should_ignore_fn 判断。传入 listings 时
+    由索引中的路径填充各目录的条目 (scan_tree_entries 的格式)，目录结构因此也只包含被跟踪的文件，无需列出任何目录。
+    已从工作区删除 (lstat 失败) 的条目既不产出也不列出。
+    索引中缓存的 stat 数据只在上次运行 git 命令时有效，文件是否变化仍由聚合模型的 stat 签名判断。
+    传入 counters 时累加与 walk_code_files 相同的计数 (目录按索引路径中出现的目录计算)。
+
+    返回:
+        list: 匹配文件的完整路径 (str)
+
+    异常:
+        ValueError: root_dir 不在 git 工作区中，或索引无法解析
+        OSError: 无法读取索引文件
+    """
+    root_dir = os.path.normpath(os.path.abspath(os.fspath(root_dir)))
+    found = find_git_dir(root_dir)
+    if found is None:
+        raise ValueError(f"'{root_dir}' 不在 git 工作区中")
+    worktree, git_dir = found
+    entries = read_git_index(os.path.join(git_dir, 'index'), _hash_size(git_dir))
+
+    prefix = os.path.relpath(root_dir, worktree).replace(os.sep, '/')
+    prefix = '' if prefix == '.' else prefix + '/'
+    files = []
+    ignored_dirs = {}
+    files_visited = files_pruned = 0
+
+    def dir_ignored(dir_path):
+        ignored = ignored_dirs.get(dir_path)
+        if ignored is None:
+            ignored = (should_ignore_fn is not None and dir_path != root_dir and should_ignore_fn(dir_path))
+            ignored_dirs[dir_path] = ignored
+        return ignored
+
+    for entry in entries:
+        if not entry.path.startswith(prefix):
+            continue
+        relative_path = entry.path[len(prefix):]
+        files_visited += 1
+        parts = relative_path.split('/')
+        parent = root_dir
+        dir_paths = []
+        pruned = False
+        for part in parts[:-1]:
+            parent = os.path.join(parent, part)
+            if dir_ignored(parent):
+                pruned = True
+                break
+            dir_paths.append(parent)
+        if pruned:
+            files_pruned += 1
+            continue
+        name = parts[-1]
+        file_path = os.path.join(parent, name)
+        is_gitlink = entry.mode == _MODE_GITLINK
+        if is_gitlink:
+            if dir_ignored(file_path):
+                continue
+        elif should_ignore_fn is not None and should_ignore_fn(file_path):
+            files_pruned += 1
+            continue
+        try:
+            # Tracked but deleted from the working tree (not yet staged): neither listed nor read
+            os.lstat(file_path)
+        except OSError:
+            continue
+        if listings is not None:
+            for dir_path in dir_paths:
+                dir_parent, dir_name = os.path.split(dir_path)
+                listings.setdefault(dir_parent, {})[dir_name] = (dir_name, True, False)
+            if is_gitlink:
+                # Submodules show up as (empty) directories
+                listings.setdefault(parent, {})[name] = (name, True, False)
+                listings.setdefault(file_path, {})
+            else:
+                listings.setdefault(parent, {})[name] = (name, False, stat.S_ISLNK(entry.mode))
+        if is_gitlink:
+            continue
+        if file_matcher(name) and (not stat.S_ISLNK(entry.mode) or os.path.isfile(file_path)):
+            files.append(file_path)
+
+    if listings is not None:
+        listings.setdefault(root_dir, {})
+        for dir_path, names in listings.items():
+            if isinstance(names, dict):
+                listings[dir_path] = sorted(names.values())
+    if counters is not None:
+        dirs_pruned = sum(1 for ignored in ignored_dirs.values() if ignored)
+        for name, value in (('dirs_visited', len(ignored_dirs) - dirs_pruned + 1), ('dirs_pruned', dirs_pruned),
+                            ('files_visited', files_visited), ('files_pruned', files_pruned),
+                            ('files_matched', len(files))):
+            counters[name] = counters.get(name, 0) + value
+    logger.debug(f"git 索引: {len(entries)} 个条目，{len(files)} 个匹配的文件。")
+    return files
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Marker key for "a pattern ends at this trie node"
+_TERMINAL = None
+# State of directories outside the monitored tree: (ignored, trie nodes, gitignore rules)
+_OUTSIDE_STATE = (False, (), ())
+
+
+class GitignoreCache:
+    """
+    按目录懒加载并缓存 .gitignore 规则。
+
+    根目录额外读取 .git/info/exclude。子目录的 .gitignore 只在遍历到该目录时才解析，
+    被忽略的目录永远不会被读取。
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = os.path.normpath(os.fspath(root_dir))
+        self.exclude_path = os.path.join(self.root_dir, '.git', 'info', 'exclude')
+        self._rules = {}
+
+    def get(self, dir_path):
+        """返回 dir_path 目录自身声明的 gitignore 规则 (按优先级从低到高排列的元组，可能为空)"""
+        rules = self._rules.get(dir_path)
+        if rules is not None:
+            return rules
+
+        # .git/info/exclude has lower precedence than the root .gitignore, so its rules come first
+        ignore_files = [os.path.join(dir_path, '.gitignore')]
+        if dir_path == self.root_dir:
+            ignore_files.insert(0, self.exclude_path)
+        loaded = []
+        for ignore_file in ignore_files:
+            # Most directories have no .gitignore: gitignore_parser is only imported once one does
+            if not os.path.exists(ignore_file):
+                continue
+            from gitignore_parser import rule_from_pattern
+            try:
+                with open(ignore_file) as f:
+                    lines = f.read().splitlines()
+                base_path = Path(os.path.abspath(dir_path))
+                for line_no, line in enumerate(lines, start=1):
+                    rule = rule_from_pattern(line, base_path=base_path, source=(ignore_file, line_no))
+                    if rule:
+                        loaded.append(rule)
+                logger.debug(f"Loaded ignore rules from '{ignore_file}'")
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.warning(f"解析 {ignore_file} 失败: {e}")
+        rules = tuple(loaded)
+        self._rules[dir_path] = rules
+        return rules
+
+    def invalidate(self, path):
+        """
+        丢弃 path 对应目录的缓存。
+
+        返回:
+            bool: path 是否为 .gitignore / .git/info/exclude 文件
+        """
+        normalized_path = os.path.normpath(os.fspath(path))
+        if os.path.basename(normalized_path) == '.gitignore':
+            dir_path = os.path.dirname(normalized_path)
+        elif normalized_path == self.exclude_path:
+            dir_path = self.root_dir
+        else:
+            return False
+        self._rules.pop(dir_path, None)
+        return True
+
+
+class IgnoreMatcher:
+    """
+    由 IGNORE_PATTERNS、可选的 gitignore 匹配函数以及可选的 GitignoreCache
+    (逐目录 .gitignore) 一次性构建的忽略判断器。
+
+    - 简单名称 (如 'node_modules') 走集合查找，匹配路径中的任一目录/文件名
+    - 后缀模式 (如 '*.log') 合并为一个 str.endswith 元组，只匹配文件名
+    - 含分隔符的模式 (如 'shared/generated') 放入前缀树，匹配连续的路径段
+
+    每个目录的判断结果都会被缓存：被忽略目录下的所有路径只需一次字典查找。
+    """
+
+    def __init__(self, root_dir, ignore_patterns, gitignore_matcher=None, gitignore_cache=None):
+        self.root_dir = os.path.normpath(os.fspath(root_dir))
+        self.ignore_patterns = ignore_patterns
+        self.gitignore_matcher = gitignore_matcher
+        self.gitignore_cache = gitignore_cache
+        self.names = set()
+        self.segment_trie = {}
+        suffixes = []
+        for pattern in ignore_patterns:
+            if pattern.startswith('*') and os.sep not in pattern:
+                suffixes.append(pattern[1:])
+            elif os.sep in pattern or '/' in pattern:
+                segments = [s for s in os.path.normpath(pattern).split(os.sep) if s]
+                if segments:
+                    node = self.segment_trie
+                    for segment in segments:
+                        node = node.setdefault(segment, {})
+                    node[_TERMINAL] = True
+            elif '*' not in pattern:
+                self.names.add(pattern)
+            # Other wildcard forms (e.g. 'foo*') were never supported by should_ignore
+        self.suffixes = tuple(suffixes)
+        # dir path -> (ignored, trie nodes reached by the path segments ending at this dir,
+        #              gitignore rules that apply to the dir's children, root .gitignore first)
+        self._dir_cache = {}
+
+    def clear_cache(self):
+        """清空目录判断缓存 (忽略规则来源变化时调用)"""
+        self._dir_cache = {}
+
+    def invalidate_gitignore(self, path):
+        """
+        若 path 是 .gitignore / .git/info/exclude 文件，丢弃相关缓存。
+
+        返回:
+            bool: 是否发生了失效 (调用方应完整重建)
+        """
+        if self.gitignore_cache is None or not self.gitignore_cache.invalidate(path):
+            return False
+        self.clear_cache()
+        return True
+
+    def _own_gitignores(self, dir_path, inherited):
+        if self.gitignore_cache is None:
+            return inherited
+        return inherited + self.gitignore_cache.get(dir_path)
+
+    def _evaluate(self, path, parent_state):
+        """在父目录状态的基础上判断 path，返回该路径的状态 (是否忽略, 前缀树节点)"""
+        if parent_state[0]:
+            return (True, (), ())
+        name = os.path.basename(path)
+        ignored = name in self.names or name.endswith(self.suffixes)
+        nodes = []
+        for node in parent_state[1] + (self.segment_trie,):
+            child = node.get(name)
+            if child is not None:
+                if _TERMINAL in child:
+                    ignored = True
+                nodes.append(child)
+        rules = parent_state[2]
+        if not ignored:
+            # Rules run from the root .gitignore down to the deepest one and the last match decides,
+            # so a nested '!pattern' can re-include a path an outer .gitignore excluded
+            for rule in reversed(rules):
+                if rule.match(path):
+                    ignored = not rule.negation
+                    break
+        ignored = ignored or self._gitignored(path)
+        return (ignored, tuple(nodes), rules)
+
+    def _gitignored(self, path):
+        if self.gitignore_matcher is None:
+            return False
+        try:
+            return bool(self.gitignore_matcher(path))
+        except ValueError:
+            # Path lies outside the directory the .gitignore applies to
+            return False
+
+    def _dir_state(self, dir_path):
+        state = self._dir_cache.get(dir_path)
+        if state is not None:
+            return state
+
+        # Walk up to the nearest cached ancestor, the monitored root or the filesystem root
+        pending = []
+        current = dir_path
+        while state is None:
+            parent = os.path.dirname(current)
+            if current == self.root_dir:
+                state = (False, (), self._own_gitignores(current, ()))
+                self._dir_cache[current] = state
+            elif parent == current:
+                state = _OUTSIDE_STATE
+                self._dir_cache[current] = state
+            else:
+                pending.append(current)
+                current = parent
+                state = self._dir_cache.get(current)
+
+        for path in reversed(pending):
+            state = self._evaluate(path, state)
+            if not state[0]:
+                # Nested .gitignore files are only read for directories we descend into
+                state = (False, state[1], self._own_gitignores(path, state[2]))
+            self._dir_cache[path] = state
+        return state
+
+    def is_dir_ignored(self, dir_path):
+        """判断目录是否被忽略 (结果会被缓存)"""
+        return self._dir_state(os.path.normpath(os.fspath(dir_path)))[0]
+
+    def __call__(self, path):
+        normalized_path = os.path.normpath(os.fspath(path))
+        # The monitored directory itself is never ignored
+        if normalized_path == self.root_dir:
+            return False
+        cached = self._dir_cache.get(normalized_path)
+        if cached is not None:
+            return cached[0]
+
+        parent_state = self._dir_state(os.path.dirname(normalized_path))
+        return self._evaluate(normalized_path, parent_state)[0]
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import threading
+
+from watchdog.observers.api import BaseObserver, DEFAULT_OBSERVER_TIMEOUT
+from watchdog.observers.inotify import InotifyFullEmitter
+from watchdog.observers.inotify_buffer import InotifyBuffer
+from watchdog.observers.inotify_c import Inotify, InotifyConstants, InotifyEvent, inotify_rm_watch
+from watchdog.utils import BaseThread
+from watchdog.utils.delayed_queue import DelayedQueue
+
+logger = logging.getLogger(__name__)
+
+
+class PrunedInotify(Inotify):
+    """
+    在一个 inotify 实例中为根目录下每个未被剪掉的目录各注册一个非递归 watch。
+
+    prune(路径) 为 True 的目录 (如 node_modules) 既不注册 watch 也不向下遍历；
+    extra_dirs 中的目录 (如 .git/info) 即使位于被剪掉的目录下也单独注册。
+    新建或移入的目录按同样的规则补上 watch，并像 watchdog 的递归模式一样为其中已有的内容补发创建事件。
+    路径均为 bytes。
+    """
+
+    def __init__(self, path, prune, extra_dirs=(), event_mask=None):
+        self._prune = prune
+        self._extra_dirs = tuple(extra_dirs)
+        self._removing = set()  # wds removed by us whose IN_IGNORED event hasn't been read yet
+        # Non-recursive for watchdog: read_events() must not walk new directories on its own
+        super().__init__(path, recursive=False, event_mask=event_mask)
+        self.rescan()
+
+    def _scan(self, top):
+        """返回 top 下未被剪掉的 ([目录], [文件])，目录按父目录在前的顺序排列 (不跟随符号链接)"""
+        dirs = []
+        files = []
+        stack = [top]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            dirs.append(dir_path)
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if not is_dir:
+                    files.append(entry.path)
+                elif not self._prune(entry.path):
+                    stack.append(entry.path)
+        return dirs, files
+
+    def _sync(self, top, simulate=False):
+        """
+        让 top 子树中的 watch 与当前的剪枝规则一致 (调用方持有 self._lock)
+
+        返回:
+            list: simulate 为 True 时为新目录中已有内容的模拟创建事件
+        """
+        if top != self._path and self._prune(top):
+            dirs, files = [], []
+        else:
+            dirs, files = self._scan(top)
+        if top == self._path:
+            dirs.extend(path for path in self._extra_dirs if os.path.isdir(path))
+        wanted = set(dirs)
+        prefix = top + os.sep.encode()
+        for path, wd in list(self._wd_for_path.items()):
+            if (path == top or path.startswith(prefix)) and path not in wanted and wd not in self._removing:
+                # watchdog drops the path from its maps once the IN_IGNORED event that follows is read
+                self._removing.add(wd)
+                inotify_rm_watch(self._inotify_fd, wd)
+        events = []
+        for path in dirs:
+            wd = self._wd_for_path.get(path)
+            if wd is not None and wd not in self._removing:
+                continue
+            try:
+                wd = self._add_watch(path, self._event_mask)
+            except OSError as e:
+                logger.debug(f"Cannot watch directory '{os.fsdecode(path)}': {e}")
+                continue
+            if simulate and path != top:
+                events.append(InotifyEvent(wd, InotifyConstants.IN_CREATE | InotifyConstants.IN_ISDIR, 0,
+                                           os.path.basename(path), path))
+        if simulate:
+            for path in files:
+                wd = self._wd_for_path.get(os.path.dirname(path))
+                if wd is not None:
+                    events.append(InotifyEvent(wd, InotifyConstants.IN_CREATE, 0, os.path.basename(path), path))
+        return events
+
+    def rescan(self, top=None):
+        """按当前的剪枝规则增删 top (默认为根目录) 子树中的 watch，例如忽略规则变化或目录被移出之后"""
+        with self._lock:
+            self._sync(self._path if top is None else top)
+        logger.debug(f"inotify watches: {len(self.watched_paths())} directories under '{os.fsdecode(self._path)}'")
+
+    def watched_paths(self):
+        """返回当前注册了 watch 的目录 (bytes)"""
+        with self._lock:
+            return {path for path, wd in self._wd_for_path.items() if wd not in self._removing}
+
+    def read_events(self, *args, **kwargs):
+        events = super().read_events(*args, **kwargs)
+        result = []
+        for event in events:
+            result.append(event)
+            if event.is_ignored:
+                with self._lock:
+                    self._removing.discard(event.wd)
+                continue
+            if not (event.is_directory and (event.is_create or event.is_moved_to)):
+                continue
+            with self._lock:
+                source = self.source_for_move(event) if event.is_moved_to else None
+                if source is not None:
+                    # watchdog only renamed the moved directory itself; carry its subdirectories along
+                    prefix = source + os.sep.encode()
+                    for path in [p for p in self._wd_for_path if p.startswith(prefix)]:
+                        wd = self._wd_for_path.pop(path)
+                        moved_path = event.src_path + path[len(source):]
+                        self._wd_for_path[moved_path] = wd
+                        self._path_for_wd[wd] = moved_path
+                # Moved-in directories get their content events from the emitter (generate_sub_created_events)
+                result.extend(self._sync(event.src_path, simulate=event.is_create))
+        return result
+
+
+class PrunedInotifyBuffer(InotifyBuffer):
+    """使用给定 Inotify 实例的 InotifyBuffer"""
+
+    def __init__(self, inotify):
+        BaseThread.__init__(self)
+        self._queue = DelayedQueue(self.delay)
+        self._inotify = inotify
+        self.start()
+
+
+class PrunedInotifyEmitter(InotifyFullEmitter):
+    """用 PrunedInotify 监控整个子树的 emitter (报告未配对的移动事件，同 generate_full_events=True)"""
+
+    def __init__(self, event_queue, watch, prune, extra_dirs=(), **kwargs):
+        super().__init__(event_queue, watch, **kwargs)
+        self._prune = prune
+        self._extra_dirs = tuple(os.fsencode(path) for path in extra_dirs)
+        self._pruned_inotify = None
+        self._pruned_lock = threading.Lock()
+
+    def on_thread_start(self):
+        prune = self._prune
+        pruned_inotify = None
+        try:
+            pruned_inotify = PrunedInotify(os.fsencode(self.watch.path), lambda path: prune(os.fsdecode(path)),
+                                           self._extra_dirs, self.get_event_mask_from_filter())
+            buffer = PrunedInotifyBuffer(pruned_inotify)
+        except OSError:
+            if pruned_inotify is not None:
+                pruned_inotify.close()
+            raise
+        except Exception as e:
+            # PrunedInotify relies on watchdog internals: if they differ, keep receiving events from a
+            # plain recursive watch (ignored directories included) rather than losing the emitter thread
+            if pruned_inotify is not None:
+                pruned_inotify.close()
+            logger.warning(f"无法跳过被忽略的目录 ({type(e).__name__}: {e})，改为递归监控整个 '{self.watch.path}'。")
+            super().on_thread_start()
+            return
+        with self._pruned_lock:
+            self._pruned_inotify = pruned_inotify
+        self._inotify = buffer
+
+    def on_thread_stop(self):
+        super().on_thread_stop()
+        with self._pruned_lock:
+            self._pruned_inotify = None
+
+    def rescan(self, top=None):
+        with self._pruned_lock:
+            # Not started yet: the watches are registered from scratch when it starts
+            if self._pruned_inotify is not None:
+                self._pruned_inotify.rescan(None if top is None else os.fsencode(top))
+
+    def watched_dirs(self):
+        with self._pruned_lock:
+            if self._pruned_inotify is None:
+                return set()
+            return {os.fsdecode(path) for path in self._pruned_inotify.watched_paths()}
+
+
+class PrunedInotifyObserver(BaseObserver):
+    """
+    inotify Observer：schedule_pruned() 注册的目录只占用一个 inotify 实例和一个线程，
+    其中被忽略的目录不注册任何 watch；schedule() 注册的普通 watch 与 generate_full_events=True 的 InotifyObserver 相同。
+    """
+
+    def __init__(self, timeout=DEFAULT_OBSERVER_TIMEOUT):
+        super().__init__(self._create_emitter, timeout=timeout)
+        self._pruned = {}  # watch path -> (prune, extra_dirs)
+
+    def _create_emitter(self, event_queue, watch, **kwargs):
+        pruned = self._pruned.get(watch.path)
+        if pruned is None or not watch.is_recursive:
+            return InotifyFullEmitter(event_queue, watch, **kwargs)
+        return PrunedInotifyEmitter(event_queue, watch, pruned[0], pruned[1], **kwargs)
+
+    def schedule_pruned(self, event_handler, path, prune, extra_dirs=()):
+        """递归监控 path，跳过 prune(目录) 为 True 的目录；extra_dirs 中的目录总是单独监控"""
+        self._pruned[path] = (prune, tuple(extra_dirs))
+        return self.schedule(event_handler, path, recursive=True)
+
+    def rescan(self, watch, top=None):
+        """忽略规则变化或目录被移出后，按当前规则更新 watch 覆盖的 (top 子树中的) 目录"""
+        emitter = self._emitter_for_watch.get(watch)
+        if isinstance(emitter, PrunedInotifyEmitter):
+            emitter.rescan(top)
+
+    def watched_dirs(self, watch):
+        """返回 watch 当前实际注册了 inotify watch 的目录"""
+        emitter = self._emitter_for_watch.get(watch)
+        return emitter.watched_dirs() if isinstance(emitter, PrunedInotifyEmitter) else set()
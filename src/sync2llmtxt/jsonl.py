@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import zlib
+import logging
+
+from .document import find_duplicates, pack_token_budget
+from .model import STATUS_EMPTY, STATUS_ERROR
+from .scheduler import RebuildCancelled
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ('text', 'jsonl')
+COMPRESSIONS = ('gzip', 'zstd')
+INDEX_FORMAT_VERSION = 1
+
+
+def index_path_for(output_path):
+    """output.jsonl -> output.jsonl.index.json"""
+    return output_path + '.index.json'
+
+
+def make_compressor(compression):
+    """
+    返回把一条记录压缩成独立帧的函数 (None 表示不压缩)
+
+    每条记录单独成帧：gzip 成员和 zstd 帧都可以直接拼接，整个文件仍可用 zcat / zstdcat 解压，
+    同时按索引中的 (offset, length) 切出的一段也能单独解压。
+    """
+    if not compression:
+        return None
+    if compression == 'gzip':
+        def compress(data):
+            # wbits=31 writes a gzip member with a zero mtime, so identical input gives identical bytes
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            return compressor.compress(data) + compressor.flush()
+        return compress
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd 压缩需要安装 'zstandard' 库 (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=3).compress
+    raise ValueError(f"unknown compression '{compression}'")
+
+
+def _iter_records(model, omitted, duplicates, cancel_event):
+    """按路径顺序产出 (相对路径, 记录的 JSON 行 bytes)"""
+    for file_segment in model.iter_segments():
+        if cancel_event is not None and cancel_event.is_set():
+            raise RebuildCancelled()
+        if file_segment.status == STATUS_ERROR or file_segment.relative_path in omitted:
+            continue
+        # Binary and oversized files carry no content
+        content = '' if file_segment.status == STATUS_EMPTY else None
+        identical_to = duplicates.get(file_segment.relative_path)
+        # Duplicates carry no content, only the path of the first file with the same content
+        segment = model.read_segment(file_segment) if identical_to is None else None
+        if segment is not None:
+            # Strip the '--- File: ... ---' header and the trailing newline added by the text format
+            header = f"\n--- File: {file_segment.relative_path} ---\n\n"
+            content = segment[len(header):-1]
+        record = {
+            'path': file_segment.relative_path,
+            'status': file_segment.status,
+            'size': file_segment.size,
+            'mtime_ns': file_segment.mtime_ns,
+            'sha1': file_segment.digest,
+            'tokens': file_segment.tokens,
+            'identical_to': identical_to,
+            'content': content,
+        }
+        yield file_segment.relative_path, json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def write_jsonl(output_writer, output_path, model, compression=None, token_budget=None, cancel_event=None,
+                deduplicate=False):
+    """
+    以 JSONL 格式写出每个文件一条记录 (path, status, size, mtime_ns, sha1, tokens, identical_to, content)，
+    并写出索引文件 <output_path>.index.json: {路径: [offset, length]}，
+    使用者可以 mmap 输出文件直接切出单个文件的记录，无需解析其余部分。
+    deduplicate 为 True 时重复文件的 content 为 null，identical_to 给出内容相同的文件。
+
+    先写数据文件再写索引；索引中的 size 可用于确认两者属于同一次写入。
+
+    返回:
+        tuple: (记录数, 数据文件是否被替换)
+    """
+    compress = make_compressor(compression)
+    duplicates = find_duplicates(model) if deduplicate else {}
+    omitted = pack_token_budget(model, token_budget, duplicates)
+    offsets = {}
+
+    def iter_chunks():
+        offset = 0
+        for relative_path, line in _iter_records(model, omitted, duplicates, cancel_event):
+            if compress is not None:
+                line = compress(line)
+            offsets[relative_path] = [offset, len(line)]
+            offset += len(line)
+            yield line
+
+    size, replaced = output_writer.write_bytes(output_path, iter_chunks())
+    index = {
+        'version': INDEX_FORMAT_VERSION,
+        'data_file': os.path.basename(output_path),
+        'compression': compression or None,
+        'size': size,
+        'files': offsets,
+    }
+    index_bytes = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    output_writer.write_bytes(index_path_for(output_path), [index_bytes])
+    return len(offsets), replaced
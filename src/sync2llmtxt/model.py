@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import stat
+import bisect
+import mmap
+import codecs
+import hashlib
+import logging
+import threading
+from collections import deque
+from contextlib import closing
+from itertools import islice
+
+from .scheduler import RebuildCancelled
+from .store import SegmentStore
+from .tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 存储文件中的废弃字节超过该值且超过有效字节时才压缩
+COMPACT_MIN_DEAD_BYTES = 4 * 1024 * 1024
+
+# 判断文本/二进制及编码时读取的文件头大小
+SNIFF_BYTES = 8192
+# 超过该大小的文件通过 mmap 读取，避免整块复制到 Python bytes 中
+MMAP_THRESHOLD = 256 * 1024
+# 校验 UTF-8 时每次解码的字节数 (临时字符串的大小不随文件大小增长)
+UTF8_CHECK_CHUNK = 1024 * 1024
+
+# 文件在文档中的状态
+STATUS_INCLUDED = 'included'
+STATUS_EMPTY = 'empty'
+STATUS_TOO_LARGE = 'too_large'
+STATUS_BINARY = 'binary'
+STATUS_ERROR = 'error'
+
+# (BOM, 编码, 解码时跳过的字节数)；UTF-32 必须排在 UTF-16 之前，两者的 LE BOM 前缀相同
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le', 4),
+    (codecs.BOM_UTF32_BE, 'utf-32-be', 4),
+    (codecs.BOM_UTF8, 'utf-8', 0),  # kept in the content, as text-mode 'utf-8' reads always did
+    (codecs.BOM_UTF16_LE, 'utf-16-le', 2),
+    (codecs.BOM_UTF16_BE, 'utf-16-be', 2),
+)
+
+
+def stat_signature(st):
+    """文件内容缓存使用的 stat 签名"""
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class FileSegment:
+    """
+    单个文件的记录：同一次 stat 得到的大小、mtime_ns 和 inode，文件列表中的条目，
+    以及 '--- File: ... ---' 片段在 SegmentStore 中的位置 (offset, length) 和估算的 token 数；
+    没有内容的文件 location 为 None。stat 字段直接存为槽位，不再另外保存签名元组
+    """
+    __slots__ = ('relative_path', 'size', 'mtime_ns', 'ino', 'status', 'list_entry', 'location', 'digest', 'tokens')
+
+    def __init__(self, relative_path, signature, status, list_entry, location=None, digest=None, tokens=0):
+        self.relative_path = relative_path
+        self.size, self.mtime_ns, self.ino = signature
+        self.status = status
+        self.list_entry = list_entry
+        self.location = location
+        self.digest = digest
+        self.tokens = tokens
+
+    @property
+    def signature(self):
+        """stat 签名 (size, mtime_ns, inode)，与 stat_signature 的结果比较"""
+        return (self.size, self.mtime_ns, self.ino)
+
+    def matches(self, st):
+        """st 与记录的 stat 签名是否相同 (不创建元组)"""
+        return self.size == st.st_size and self.mtime_ns == st.st_mtime_ns and self.ino == st.st_ino
+
+
+def sniff_encoding(head):
+    """
+    根据文件头判断文件类型和编码
+
+    返回:
+        tuple: (编码, BOM 长度)；判断为二进制文件时返回 (None, 0)
+    """
+    for bom, encoding, bom_length in _BOMS:
+        if head.startswith(bom):
+            return encoding, bom_length
+    # Same heuristic as git: text files never contain NUL bytes
+    if b'\0' in head:
+        return None, 0
+    return 'utf-8', 0
+
+
+def is_utf8(buffer):
+    """按 UTF8_CHECK_CHUNK 大小的分片增量校验 buffer 是否为合法 UTF-8 (不整体解码)"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    # Slices of a memoryview don't copy (and work on mmap objects)
+    with memoryview(buffer) as view:
+        try:
+            for start in range(0, len(view), UTF8_CHECK_CHUNK):
+                decoder.decode(view[start:start + UTF8_CHECK_CHUNK])
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return False
+    return True
+
+
+def decode_text(buffer, encoding, bom_length=0):
+    """
+    把文件内容转换为 UTF-8 字节，结果与文本模式读取一致：换行统一为 '\\n'，无法解码的字节被丢弃
+
+    内容本身就是合法 UTF-8 且不含 '\\r' 时原样返回 buffer (逐片校验，不解码整个文件)。
+    """
+    if encoding == 'utf-8' and buffer.find(b'\r') < 0 and is_utf8(buffer):
+        return buffer
+    content = str(buffer[bom_length:], encoding, 'ignore')
+    return content.replace('\r\n', '\n').replace('\r', '\n').encode('utf-8')
+
+
+def _render_text(relative_path, signature, buffer, encoding, bom_length):
+    data = decode_text(buffer, encoding, bom_length)
+    # The joined segment is the one copy of the content (mmap'd files are hashed in place)
+    digest = hashlib.sha1(data).hexdigest()
+    segment = b"".join((f"\n--- File: {relative_path} ---\n\n".encode('utf-8'), data, b"\n"))
+    return FileSegment(relative_path, signature, STATUS_INCLUDED, relative_path, None, digest,
+                       estimate_tokens(segment)), segment
+
+
+def read_file(file_path, relative_path, st, max_file_size_warn):
+    """
+    读取单个文件并生成其 FileSegment (不写入存储，可在工作线程中调用)
+
+    先只读取文件头判断文本/二进制及编码，二进制文件不再读取其余内容；
+    超过 MMAP_THRESHOLD 的文件通过 mmap 读取。
+
+    参数:
+        file_path (str): 文件完整路径
+        relative_path (str): 相对于监控目录的路径
+        st (os.stat_result): 文件的 stat 结果
+        max_file_size_warn (int): 超过该大小 (字节) 的文件跳过内容
+
+    返回:
+        tuple: (FileSegment, 片段字节)；没有内容时片段字节为 None
+    """
+    signature = stat_signature(st)
+    file_size = st.st_size
+    if file_size > max_file_size_warn:
+        logger.warning(f"跳过大文件: '{relative_path}' (大小: {file_size / (1024*1024):.2f} MB > {max_file_size_warn / (1024*1024):.2f} MB)")
+        return FileSegment(relative_path, signature, STATUS_TOO_LARGE,
+                           relative_path + f" (Too Large: {file_size / (1024*1024):.2f} MB)"), None
+    if file_size == 0:
+        logger.info(f"文件 '{relative_path}' 为空，跳过内容。")
+        return FileSegment(relative_path, signature, STATUS_EMPTY, relative_path + " (Empty)"), None
+    try:
+        with open(file_path, 'rb') as f:
+            if file_size > MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    encoding, bom_length = sniff_encoding(buffer[:SNIFF_BYTES])
+                    if encoding is not None:
+                        return _render_text(relative_path, signature, buffer, encoding, bom_length)
+            else:
+                head = f.read(SNIFF_BYTES)
+                encoding, bom_length = sniff_encoding(head)
+                if encoding is not None:
+                    return _render_text(relative_path, signature, head + f.read(), encoding, bom_length)
+    except Exception as read_err:
+        logger.error(f"无法读取文件 '{file_path}': {read_err}")
+        return FileSegment(relative_path, signature, STATUS_ERROR,
+                           relative_path + f" (Read Error: {read_err})"), None
+    logger.info(f"文件 '{relative_path}' 是二进制文件，跳过内容。")
+    return FileSegment(relative_path, signature, STATUS_BINARY, relative_path + " (Binary)"), None
+
+
+def bytes_read(file_segment):
+    """read_file 为生成 file_segment 读取的字节数 (二进制文件只读取文件头，超大和空文件不读取)"""
+    if file_segment.status == STATUS_INCLUDED:
+        return file_segment.size
+    if file_segment.status == STATUS_BINARY:
+        return min(file_segment.size, SNIFF_BYTES)
+    return 0
+
+
+def render_file(file_path, relative_path, st, max_file_size_warn, store):
+    """
+    读取并渲染单个文件，片段写入 store
+
+    参数:
+        file_path (str): 文件完整路径
+        relative_path (str): 相对于监控目录的路径
+        st (os.stat_result): 文件的 stat 结果
+        max_file_size_warn (int): 超过该大小 (字节) 的文件跳过内容
+        store (SegmentStore): 片段存储
+
+    返回:
+        FileSegment: 渲染结果
+    """
+    file_segment, segment = read_file(file_path, relative_path, st, max_file_size_warn)
+    if segment is not None:
+        file_segment.location = store.append(segment)
+    return file_segment
+
+
+class AggregationModel:
+    """
+    常驻内存的项目聚合模型。
+
+    按相对路径保存每个文件的元数据及其 stat 签名 (size, mtime_ns, inode)，
+    渲染好的片段存放在 SegmentStore 中。完整同步时只重新读取签名变化的文件；
+    监控模式下事件只标记变化的路径，重建时仅刷新这些路径，
+    文档由存储中的片段按路径顺序拼接而成。
+
+    read_workers > 1 时文件的 stat/读取/解码在线程池中并行进行，
+    写入存储和更新模型仍按路径顺序在调用线程上完成，结果与顺序读取逐字节相同。
+    """
+
+    def __init__(self, root_dir, max_file_size_warn=1*1024*1024, since_timestamp=None, store=None, read_workers=1):
+        self.root_dir = os.path.normpath(os.fspath(root_dir))
+        self._root_prefix = os.path.join(self.root_dir, '')
+        self.max_file_size_warn = max_file_size_warn
+        self.since_timestamp = since_timestamp
+        self.store = store
+        self.read_workers = read_workers  # threads used to stat/read files during sync
+        self.live_bytes = 0  # bytes in the store still referenced by segments
+        self.segments = {}   # relative path -> FileSegment
+        self.order = []      # relative paths, sorted
+        self.populated = False
+        self._pending = set()
+        self._stale_count = 0
+        self._lock = threading.Lock()
+
+    def configure(self, max_file_size_warn, since_timestamp):
+        """更新过滤参数；参数变化时丢弃依赖它们的缓存结果"""
+        if (max_file_size_warn, since_timestamp) == (self.max_file_size_warn, self.since_timestamp):
+            return
+        self.max_file_size_warn = max_file_size_warn
+        self.since_timestamp = since_timestamp
+        self.segments.clear()
+        self.order = []
+        self.live_bytes = 0
+        self.populated = False
+
+    def get_store(self):
+        """返回片段存储，尚未设置时创建匿名临时存储"""
+        if self.store is None:
+            self.store = SegmentStore()
+        return self.store
+
+    def attach_store(self, store, file_segments=()):
+        """
+        切换到 store，并用其中已有的片段 (来自持久化缓存) 预填充模型。
+        恢复的条目在下次 sync 时仍会逐个校验签名。
+        """
+        # The old segments are dropped below: release the old file whether anonymous or cache-backed
+        if self.store is not None and self.store is not store:
+            self.store.close()
+        self.store = store
+        self.segments = {}
+        self.live_bytes = 0
+        for file_segment in file_segments:
+            self.segments[file_segment.relative_path] = file_segment
+            if file_segment.location is not None:
+                self.live_bytes += file_segment.location[1]
+        self.order = sorted(self.segments)
+
+    def read_segment(self, file_segment):
+        """读取文件片段文本，没有内容时返回 None"""
+        if file_segment.location is None:
+            return None
+        return self.store.read(*file_segment.location).decode('utf-8')
+
+    def needs_compaction(self):
+        if self.store is None:
+            return False
+        dead_bytes = self.store.size - self.live_bytes
+        return dead_bytes > COMPACT_MIN_DEAD_BYTES and dead_bytes > self.live_bytes
+
+    def compact(self, target_store=None):
+        """把仍被引用的片段复制到 target_store (默认新的匿名存储) 并切换过去"""
+        source = self.get_store()
+        target = target_store if target_store is not None else SegmentStore()
+        for file_segment in self.segments.values():
+            if file_segment.location is not None:
+                file_segment.location = target.append(source.read(*file_segment.location))
+        logger.debug(f"Compacted segment store: {source.size} -> {target.size} bytes")
+        # Every live segment now lives in target: release the old file whether anonymous or cache-backed
+        source.close()
+        self.store = target
+        self.live_bytes = target.size
+
+    def mark_changed(self, path):
+        """记录一个发生变化 (新建/修改/删除) 的文件路径，下次重建时刷新"""
+        with self._lock:
+            self._pending.add(os.path.normpath(os.fspath(path)))
+
+    def mark_stale(self):
+        """要求下次重建时重新遍历整个目录 (目录事件、忽略规则变化等)"""
+        with self._lock:
+            self.populated = False
+            self._stale_count += 1
+
+    def _take_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        return pending
+
+    def _remove(self, relative_path):
+        file_segment = self.segments.pop(relative_path, None)
+        if file_segment is not None:
+            if file_segment.location is not None:
+                self.live_bytes -= file_segment.location[1]
+            index = bisect.bisect_left(self.order, relative_path)
+            del self.order[index]
+            return True
+        return False
+
+    def _relative_path(self, file_path):
+        # Discovered paths are built by joining onto root_dir, so a prefix slice replaces os.path.relpath
+        if file_path.startswith(self._root_prefix):
+            return file_path[len(self._root_prefix):]
+        return os.path.relpath(file_path, self.root_dir)
+
+    def _probe(self, file_path):
+        """
+        stat 单个文件，签名变化时读取其内容。不修改模型，可在工作线程中调用。
+
+        返回:
+            tuple: (相对路径, 结果)；结果为 'missing'、'old'、'unchanged' 或 read_file 的返回值
+        """
+        relative_path = self._relative_path(file_path)
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return relative_path, 'missing'
+        if not stat.S_ISREG(st.st_mode):
+            return relative_path, 'missing'
+        if self.since_timestamp is not None and st.st_mtime < self.since_timestamp:
+            logger.debug(f"文件 '{file_path}' 修改时间早于 since-days，跳过。")
+            return relative_path, 'old'
+        cached = self.segments.get(relative_path)
+        if cached is not None and cached.status != STATUS_ERROR and cached.matches(st):
+            return relative_path, 'unchanged'
+        return relative_path, read_file(file_path, relative_path, st, self.max_file_size_warn)
+
+    def _apply(self, relative_path, probed):
+        """把 _probe 的结果写入模型 (只在调用 sync/apply_pending 的线程上执行)"""
+        if probed == 'missing':
+            return 'removed' if self._remove(relative_path) else 'skipped'
+        if probed == 'old':
+            self._remove(relative_path)
+            return 'skipped'
+        if probed == 'unchanged':
+            return 'unchanged'
+        file_segment, segment = probed
+        cached = self.segments.get(relative_path)
+        if cached is None:
+            bisect.insort(self.order, relative_path)
+        elif cached.location is not None:
+            self.live_bytes -= cached.location[1]
+        if segment is not None:
+            file_segment.location = self.get_store().append(segment)
+            self.live_bytes += file_segment.location[1]
+        self.segments[relative_path] = file_segment
+        return 'read'
+
+    def refresh_file(self, file_path):
+        """
+        按当前磁盘状态刷新单个文件
+
+        返回:
+            str: 'read' (重新读取)、'unchanged'、'removed' 或 'skipped'
+        """
+        return self._apply(*self._probe(file_path))
+
+    def _iter_probed(self, file_paths):
+        """
+        按输入顺序产出 (file_path, 相对路径, 结果)。
+
+        read_workers > 1 时由线程池提前 stat/读取后面的文件 (最多领先 read_workers * 4 个)，
+        结果仍按输入顺序交给调用方，因此存储中的片段顺序与顺序读取时完全相同。
+        """
+        if self.read_workers <= 1 or len(file_paths) <= 1:
+            for file_path in file_paths:
+                yield (file_path,) + self._probe(file_path)
+            return
+
+        # Imported here: sequential reads (and the import of the package) don't need concurrent.futures
+        from concurrent.futures import ThreadPoolExecutor
+        window = self.read_workers * 4
+        executor = ThreadPoolExecutor(max_workers=self.read_workers, thread_name_prefix='sync2llmtxt-read')
+        futures = deque()
+        try:
+            paths = iter(file_paths)
+            for file_path in islice(paths, window):
+                futures.append((file_path, executor.submit(self._probe, file_path)))
+            while futures:
+                file_path, future = futures.popleft()
+                for next_path in islice(paths, 1):
+                    futures.append((next_path, executor.submit(self._probe, next_path)))
+                yield (file_path,) + future.result()
+        finally:
+            # Abandoned (cancelled) runs must not leave reads queued behind them
+            for _, future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def sync(self, file_paths, cancel_event=None):
+        """
+        以完整的文件列表同步模型：刷新列表中的文件，移除不再存在的条目
+
+        返回:
+            dict: 各刷新结果的计数，以及重新读取的字节数 (bytes_read)
+
+        cancel_event 被设置时抛出 RebuildCancelled，模型保持未同步状态。
+        """
+        with self._lock:
+            self._pending.clear()
+            self.populated = False
+            stale_count = self._stale_count
+        counts = {'read': 0, 'unchanged': 0, 'removed': 0, 'skipped': 0, 'bytes_read': 0}
+        seen = set()
+        file_paths = list(file_paths)
+        with closing(self._iter_probed(file_paths)) as probed:
+            for file_path, relative_path, result in probed:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RebuildCancelled()
+                outcome = self._apply(relative_path, result)
+                counts[outcome] += 1
+                if outcome == 'read':
+                    counts['bytes_read'] += bytes_read(result[0])
+                seen.add(relative_path)
+        for relative_path in [p for p in self.order if p not in seen]:
+            self._remove(relative_path)
+            counts['removed'] += 1
+        with self._lock:
+            # A mark_stale() that arrived while we were walking wins
+            self.populated = self._stale_count == stale_count
+        return counts
+
+    def apply_pending(self, cancel_event=None):
+        """
+        只刷新通过 mark_changed 记录的路径，返回各刷新结果的计数 (与 sync 相同)
+
+        cancel_event 被设置时把尚未处理的路径放回待处理集合并抛出 RebuildCancelled。
+        """
+        counts = {'read': 0, 'unchanged': 0, 'removed': 0, 'skipped': 0, 'bytes_read': 0}
+        pending = sorted(self._take_pending())
+        with closing(self._iter_probed(pending)) as probed:
+            for index, (file_path, relative_path, result) in enumerate(probed):
+                if cancel_event is not None and cancel_event.is_set():
+                    with self._lock:
+                        self._pending.update(pending[index:])
+                    raise RebuildCancelled()
+                outcome = self._apply(relative_path, result)
+                counts[outcome] += 1
+                if outcome == 'read':
+                    counts['bytes_read'] += bytes_read(result[0])
+        return counts
+
+    def iter_segments(self):
+        """按路径顺序产出所有 FileSegment"""
+        segments = self.segments
+        for relative_path in self.order:
+            yield segments[relative_path]
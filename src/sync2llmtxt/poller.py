@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import logging
+import threading
+from watchdog.events import (
+    DirCreatedEvent, DirDeletedEvent, FileCreatedEvent, FileDeletedEvent, FileModifiedEvent,
+)
+
+from .model import stat_signature
+
+logger = logging.getLogger(__name__)
+
+# 每个目录最多经过这么多次轮询就完整校验一次其中的文件 (捕获不改变目录 mtime 的原地写入)
+DEFAULT_VERIFY_TICKS = 30
+# 目录在扫描时刚被修改过，同一 mtime 刻度内可能还会变化：下次轮询时再扫描一遍
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+class PollingWatcher:
+    """
+    基于 stat 快照的轮询监控，用于收不到 inotify 事件的 NFS、SMB、FUSE 挂载目录。
+
+    快照只记录未被忽略的目录：目录的 mtime_ns 以及其中每个条目的 stat 签名。
+    每次轮询对每个目录只做一次 stat，mtime 未变化的目录不再列出和 stat 其中的文件；
+    另外每次轮询按顺序完整校验 1/verify_ticks 的目录，以发现原地写入 (目录 mtime 不变) 的文件。
+    检测到的差异以 watchdog 事件的形式交给 handler，接口 (start/stop/join) 与 Observer 相同。
+    """
+
+    def __init__(self, handler, root_dir, should_ignore_fn=None, interval=1.0, verify_ticks=DEFAULT_VERIFY_TICKS):
+        self.handler = handler
+        self.root_dir = os.path.normpath(os.fspath(root_dir))
+        self.should_ignore_fn = should_ignore_fn
+        self.interval = max(0.1, float(interval))
+        self.verify_ticks = max(1, int(verify_ticks))
+        self.exclude_path = os.path.join(self.root_dir, '.git', 'info', 'exclude')
+        self._dirs = {}  # dir path -> (mtime_ns or None, {name: file signature, or None for directories})
+        self._exclude_signature = None
+        self._verify_cursor = 0
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sync2llmtxt-poll', daemon=True)
+
+    def _ignored(self, path):
+        return self.should_ignore_fn is not None and self.should_ignore_fn(path)
+
+    def _file_signature(self, path):
+        try:
+            return stat_signature(os.stat(path))
+        except OSError:
+            return None
+
+    def _scan_dir(self, dir_path):
+        """
+        列出 dir_path 并 stat 其中的文件
+
+        返回:
+            tuple | None: (mtime_ns, {名称: 签名或 None})；目录无法读取时返回 None
+        """
+        try:
+            # Take the mtime before listing: anything changing during the scan bumps it again
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+            entries = {}
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if self._ignored(entry.path):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            entries[entry.name] = None
+                        else:
+                            entries[entry.name] = stat_signature(entry.stat())
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.debug(f"Cannot poll directory '{dir_path}': {e}")
+            return None
+        if time.time_ns() - mtime_ns < RACY_WINDOW_NS:
+            mtime_ns = None
+        return mtime_ns, entries
+
+    def _add_subtree(self, top):
+        stack = [top]
+        while stack:
+            dir_path = stack.pop()
+            scanned = self._scan_dir(dir_path)
+            if scanned is None:
+                continue
+            self._dirs[dir_path] = scanned
+            stack.extend(os.path.join(dir_path, name) for name, signature in scanned[1].items() if signature is None)
+
+    def _remove_subtree(self, top):
+        prefix = top + os.sep
+        for dir_path in [p for p in self._dirs if p == top or p.startswith(prefix)]:
+            del self._dirs[dir_path]
+
+    def snapshot(self):
+        """(重新) 建立完整快照，不产生事件"""
+        self._dirs = {}
+        self._add_subtree(self.root_dir)
+        self._exclude_signature = self._file_signature(self.exclude_path)
+        logger.info(f"轮询快照已建立: {len(self._dirs)} 个目录。")
+
+    def _diff(self, dir_path, old_entries, new_entries, events):
+        for name, signature in new_entries.items():
+            path = os.path.join(dir_path, name)
+            previous = old_entries.get(name, False)
+            if previous is not False and (previous is None) == (signature is None):
+                if signature is not None and signature != previous:
+                    events.append(FileModifiedEvent(path))
+                continue
+            if previous is not False:
+                # Replaced by an entry of the other type
+                events.append(DirDeletedEvent(path) if previous is None else FileDeletedEvent(path))
+                if previous is None:
+                    self._remove_subtree(path)
+            if signature is None:
+                events.append(DirCreatedEvent(path))
+                self._add_subtree(path)
+            else:
+                events.append(FileCreatedEvent(path))
+        for name, previous in old_entries.items():
+            if name not in new_entries:
+                path = os.path.join(dir_path, name)
+                if previous is None:
+                    events.append(DirDeletedEvent(path))
+                    self._remove_subtree(path)
+                else:
+                    events.append(FileDeletedEvent(path))
+
+    def poll(self):
+        """
+        执行一次轮询，把检测到的变化分发给 handler
+
+        返回:
+            int: 分发的事件数量
+        """
+        dir_paths = list(self._dirs)
+        verify_count = -(-len(dir_paths) // self.verify_ticks)
+        start = self._verify_cursor if self._verify_cursor < len(dir_paths) else 0
+        verify = set(dir_paths[start:start + verify_count])
+        self._verify_cursor = start + verify_count
+
+        events = []
+        rescanned = 0
+        for dir_path in dir_paths:
+            state = self._dirs.get(dir_path)
+            if state is None:
+                continue # Removed together with its parent earlier in this poll
+            if dir_path not in verify:
+                try:
+                    mtime_ns = os.stat(dir_path).st_mtime_ns
+                except OSError:
+                    continue # The parent's rescan reports the deletion
+                if mtime_ns == state[0]:
+                    continue
+            scanned = self._scan_dir(dir_path)
+            if scanned is None:
+                continue
+            rescanned += 1
+            self._dirs[dir_path] = scanned
+            self._diff(dir_path, state[1], scanned[1], events)
+
+        # .git is ignored, so .git/info/exclude is checked on its own
+        exclude_signature = self._file_signature(self.exclude_path)
+        if exclude_signature != self._exclude_signature:
+            self._exclude_signature = exclude_signature
+            events.append(FileModifiedEvent(self.exclude_path))
+        logger.debug(f"Poll: {len(dir_paths)} directories checked, {rescanned} rescanned, {len(events)} events.")
+
+        for event in events:
+            self.handler.dispatch(event)
+        # Ignore rules changed: entries may have become (un)ignored anywhere
+        if any(os.path.basename(e.src_path) == '.gitignore' or e.src_path == self.exclude_path for e in events):
+            self.snapshot()
+        return len(events)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"轮询目录变化失败: {e}", exc_info=True)
+
+    def start(self):
+        """建立初始快照并启动轮询线程"""
+        self.snapshot()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+
+    def join(self, timeout=None):
+        if self._thread.is_alive():
+            self._thread.join(timeout)
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+import logging
+
+from .discovery import FilePatternMatcher, walk_code_files
+from .gitindex import git_index_files, DISCOVERY_SOURCES, DISCOVERY_GIT_INDEX
+from .ignore import IgnoreMatcher, GitignoreCache
+from .model import AggregationModel, STATUS_BINARY, STATUS_ERROR
+from .cache import SegmentCache
+from .scheduler import RebuildCancelled
+from .document import iter_document, find_duplicates, pack_token_budget, included_tokens
+from .directory_tree import DirectoryTreeModel
+from .writer import OutputWriter
+from .shards import ShardedOutput, SHARD_MODES
+from .jsonl import write_jsonl, make_compressor, OUTPUT_FORMATS
+from .stats import RunStats, ProjectStats, STATS_FORMATS
+
+logger = logging.getLogger(__name__)
+
+# Files written next to the output document: the jsonl index and the stats exports
+_SIDECAR_SUFFIXES = ('.index.json', '.stats.json', '.prom')
+
+
+def output_file_matcher(output_path):
+    """
+    返回判断路径是否为输出文档或其附属文件的函数
+
+    附属文件包括 jsonl 索引 (<输出>.index.json)、统计文件 (<输出>.stats.json / <输出>.prom)、
+    分片 (output.000.txt ...) 以及写入时的临时文件 (.<文件名>.xxxxxxxx.tmp)。输出位于监控目录中时，
+    这些文件不能被聚合，它们的变化也不能触发重建 (否则每次写出都会引起下一次重建)。
+    output_path 为 None 时 (Aggregator 不写入文件) 没有任何输出文件。
+    """
+    if output_path is None:
+        return lambda path: False
+    output_dir, name = os.path.split(os.path.abspath(output_path))
+    prefix = os.path.join(output_dir, '')
+    stem, ext = os.path.splitext(name)
+    names = (re.escape(name) + '(?:' + '|'.join(map(re.escape, _SIDECAR_SUFFIXES)) + ')?'
+             + '|' + re.escape(stem) + r'\.\d{3,}' + re.escape(ext))
+    match = re.compile(rf'(?:{names})|\.(?:{names})\.\w+\.tmp').fullmatch
+    starts = (stem, '.' + stem)
+
+    def is_output_file(path):
+        if not path.startswith(prefix):
+            return False
+        rest = path[len(prefix):]
+        return rest.startswith(starts) and os.sep not in rest and match(rest) is not None
+    return is_output_file
+
+
+class ProjectConfig:
+    """
+    单个项目的配置。属性与 sync2llmtxt.py 配置区的全局变量一一对应，
+    YAML 中使用相同的键名 (见 KEYS)。
+    """
+
+    # YAML key -> attribute
+    KEYS = {
+        'MONITORED_CODE_DIR': 'root_dir',
+        'OUTPUT_DOCUMENT_PATH': 'output_path',
+        'CODE_FILE_PATTERNS': 'code_file_patterns',
+        'IGNORE_PATTERNS': 'ignore_patterns',
+        'ENABLE_AUTOMATIC_MONITORING': 'enable_monitoring',
+        'DEBOUNCE_TIME': 'debounce_time',
+        'CACHE_DIR': 'cache_dir',
+        'READ_WORKERS': 'read_workers',
+        'POLL_INTERVAL': 'poll_interval',
+        'TOKEN_BUDGET': 'token_budget',
+        'SHARD_BY': 'shard_by',
+        'SHARD_SIZE_MB': 'shard_size_mb',
+        'OUTPUT_FORMAT': 'output_format',
+        'OUTPUT_COMPRESSION': 'output_compression',
+        'MAX_FILE_SIZE_MB': 'max_file_size_mb',
+        'SINCE_DAYS': 'since_days',
+        'DISCOVERY_SOURCE': 'source',
+        'INCLUDE_UNTRACKED': 'include_untracked',
+        'DEDUPLICATE_FILES': 'deduplicate',
+        'STATS_FORMAT': 'stats_format',
+    }
+
+    def __init__(self, root_dir, output_path, code_file_patterns, ignore_patterns, enable_monitoring=True,
+                 debounce_time=2.0, cache_dir=None, read_workers=4, poll_interval=None, token_budget=None,
+                 shard_by=None, shard_size_mb=1.0, output_format='text', output_compression=None,
+                 max_file_size_mb=1.0, since_days=None, source='walk', include_untracked=False,
+                 deduplicate=True, stats_format=None):
+        self.root_dir = root_dir
+        self.output_path = output_path
+        self.code_file_patterns = code_file_patterns
+        self.ignore_patterns = ignore_patterns
+        self.enable_monitoring = enable_monitoring
+        self.debounce_time = debounce_time
+        self.cache_dir = cache_dir
+        self.read_workers = read_workers
+        self.poll_interval = poll_interval
+        self.token_budget = token_budget
+        self.shard_by = shard_by
+        self.shard_size_mb = shard_size_mb
+        self.output_format = output_format
+        self.output_compression = output_compression
+        self.max_file_size_mb = max_file_size_mb
+        self.since_days = since_days
+        self.source = source
+        self.include_untracked = include_untracked
+        self.deduplicate = deduplicate
+        self.stats_format = stats_format
+
+    def updated(self, mapping):
+        """返回用 mapping (YAML 键名) 覆盖后的新配置，未知的键会被忽略并记录警告"""
+        values = {attribute: getattr(self, attribute) for attribute in self.KEYS.values()}
+        for key, value in mapping.items():
+            attribute = self.KEYS.get(key)
+            if attribute is None:
+                logger.warning(f"未知的项目配置项 '{key}'，已忽略。")
+                continue
+            values[attribute] = value
+        return ProjectConfig(**values)
+
+    @property
+    def max_file_size_warn(self):
+        return int(self.max_file_size_mb * 1024 * 1024)
+
+    @property
+    def since_timestamp(self):
+        return None if self.since_days is None else time.time() - self.since_days * 86400
+
+    def validate(self):
+        """
+        检查输出相关配置
+
+        异常:
+            ValueError: 文件来源、分片方式、输出格式、压缩方式或统计格式无效，或组合不受支持
+        """
+        if self.source not in DISCOVERY_SOURCES:
+            raise ValueError(f"无效的文件来源 '{self.source}'，可选: {', '.join(DISCOVERY_SOURCES)}")
+        if self.shard_by and self.shard_by not in SHARD_MODES:
+            raise ValueError(f"无效的分片方式 '{self.shard_by}'，可选: {', '.join(SHARD_MODES)}")
+        if self.stats_format and self.stats_format not in STATS_FORMATS:
+            raise ValueError(f"无效的统计格式 '{self.stats_format}'，可选: {', '.join(STATS_FORMATS)}")
+        if self.output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"无效的输出格式 '{self.output_format}'，可选: {', '.join(OUTPUT_FORMATS)}")
+        if self.output_format == 'jsonl':
+            if self.shard_by:
+                raise ValueError("jsonl 输出自带偏移索引，不能与分片输出同时使用。")
+            try:
+                make_compressor(self.output_compression)
+            except RuntimeError as e:
+                raise ValueError(f"无法使用压缩方式 '{self.output_compression}': {e}")
+
+    def source_key(self):
+        """决定项目内部状态 (模型、忽略规则、缓存) 的配置；其余配置可以直接替换"""
+        return (os.path.normpath(os.path.abspath(self.root_dir)), list(self.code_file_patterns),
+                list(self.ignore_patterns), self.cache_dir and os.path.abspath(self.cache_dir))
+
+
+class Project:
+    """
+    一个被聚合的项目：配置以及跨多次重建复用的全部状态
+    (文件匹配器、忽略规则、聚合模型、目录结构模型、内容缓存、输出写入器)。
+
+    各个项目互不共享可变状态，多个 Project 可以由同一个进程中的不同线程分别重建；
+    同一个 Project 的重建需要串行执行 (RebuildPool 保证这一点)。
+    """
+
+    def __init__(self, config, output_writer=None, gitignore_matcher=None, gitignore_cache=None):
+        self.config = config
+        self.root_dir = os.path.normpath(os.path.abspath(config.root_dir))
+        self.file_matcher = FilePatternMatcher(config.code_file_patterns)
+        self.gitignore_cache = gitignore_cache if gitignore_cache is not None else GitignoreCache(self.root_dir)
+        self.ignore_matcher = IgnoreMatcher(self.root_dir, config.ignore_patterns, gitignore_matcher,
+                                            self.gitignore_cache)
+        self.model = AggregationModel(self.root_dir, config.max_file_size_warn, config.since_timestamp,
+                                      read_workers=max(1, int(config.read_workers)))
+        self.tree = DirectoryTreeModel(self.root_dir, self.should_ignore)
+        self.segment_cache = SegmentCache(config.cache_dir) if config.cache_dir else None
+        self.output_writer = output_writer if output_writer is not None else OutputWriter()
+        self.sharded_output = ShardedOutput(self.output_writer)
+        # Set by the first full aggregation; later rebuilds keep its filter parameters
+        self.configured = False
+        # Timings and counters of the aggregations, exported next to the output when stats_format is set
+        self.stats = ProjectStats()
+        # stats.Profiler recording every aggregation (--profile), None when not profiling
+        self.profiler = None
+        # time.monotonic() of the earliest file event not yet covered by a rebuild
+        self._first_event_time = None
+        # (config.output_path, output_file_matcher); rebuilt when the output path is replaced
+        self._output_files = None
+
+    @property
+    def output_path(self):
+        return os.path.abspath(self.config.output_path)
+
+    def should_ignore(self, path):
+        """检查路径是否应该被忽略 (用于文件内容聚合和目录结构生成)；输出文档及其附属文件总是被忽略"""
+        output_files = self._output_files
+        if output_files is None or output_files[0] != self.config.output_path:
+            output_files = self._output_files = (self.config.output_path,
+                                                 output_file_matcher(self.config.output_path))
+        return output_files[1](path) or self.ignore_matcher(path)
+
+    def refresh(self, max_file_size_warn=None, since_timestamp=None, incremental=False, cancel_event=None,
+                stats=None):
+        """
+        按磁盘状态更新聚合模型和目录结构模型 (不写入任何输出)
+
+        incremental=True 时沿用模型已有的过滤参数，只刷新通过 mark_changed 记录的路径；
+        模型尚未建立或已过期时退回完整遍历。
+        max_file_size_warn / since_timestamp 为 None 时使用项目配置。
+        给出 stats (RunStats) 时把各阶段的耗时和计数记录到其中。
+
+        返回:
+            dict: 各类文件数量 (read / unchanged / removed，完整遍历时还有 skipped)
+        """
+        config = self.config
+        model = self.model
+        model.read_workers = max(1, int(config.read_workers))
+        segment_cache = self.segment_cache
+        stats = stats if stats is not None else RunStats()
+        if not incremental:
+            model.configure(config.max_file_size_warn if max_file_size_warn is None else max_file_size_warn,
+                            config.since_timestamp if since_timestamp is None else since_timestamp)
+            if segment_cache is not None and not model.segments:
+                with stats.phase('cache'):
+                    stats.add('cache_entries_loaded', segment_cache.load(model))
+            self.configured = True
+
+        stats.incremental = incremental and model.populated
+        if stats.incremental:
+            with stats.phase('read'):
+                counts = model.apply_pending(cancel_event)
+            logger.info(f"增量更新完成。重新读取: {counts['read']}, 未变化: {counts['unchanged']}, 移除: {counts['removed']}.")
+        else:
+            # 单次遍历源目录，进入子目录前先剪掉被忽略的目录；
+            # 顺便记录各目录的条目，目录结构模型直接由它们重建，无需再次遍历。
+            # 记录条目时每个路径已判断过一次忽略规则，产出的文件无需再判断
+            tree_listings = {}
+            should_ignore = self.should_ignore
+            if config.stats_format:
+                # Timing every call costs a little, so should_ignore is only broken out when stats are exported
+                should_ignore = stats.timed('should_ignore', should_ignore)
+            with stats.phase('discover'):
+                unique_files = sorted(self._discover(tree_listings, should_ignore, stats.counters))
+            self.tree.reload(tree_listings)
+            logger.info(f"找到 {len(unique_files)} 个唯一文件路径。开始处理文件内容...")
+            with stats.phase('read'):
+                counts = model.sync(unique_files, cancel_event)
+            logger.info(f"文件内容处理完成。重新读取: {counts['read']}, 未变化 (使用缓存): {counts['unchanged']}, 按修改时间跳过: {counts['skipped']}, 移除: {counts['removed']}.")
+            if segment_cache is not None and (counts['read'] or counts['removed']):
+                with stats.phase('cache'):
+                    segment_cache.save(model)
+        stats.add('files_read', counts['read'])
+        stats.add('cache_hits', counts['unchanged'])
+        stats.add('files_removed', counts['removed'])
+        stats.add('files_skipped', counts['skipped'])
+        stats.add('bytes_read', counts['bytes_read'])
+
+        if model.needs_compaction():
+            with stats.phase('compact'):
+                model.compact(segment_cache.open_store() if segment_cache is not None else None)
+        return counts
+
+    def _discover(self, tree_listings, should_ignore=None, counters=None):
+        """
+        列出候选文件，并把各目录的条目记录到 tree_listings (counters 见 walk_code_files)
+
+        DISCOVERY_SOURCE 为 'git-index' 时从 .git/index 读取被跟踪的文件，不遍历工作区；
+        INCLUDE_UNTRACKED 时再遍历一次工作区，合并未被忽略的未跟踪文件 (目录结构也按工作区生成)。
+        不在 git 工作区中或索引无法解析时退回遍历。
+        """
+        should_ignore = should_ignore if should_ignore is not None else self.should_ignore
+        if self.config.source == DISCOVERY_GIT_INDEX:
+            include_untracked = self.config.include_untracked
+            try:
+                # With untracked files the walk covers the whole worktree and provides the counters
+                tracked = git_index_files(self.root_dir, self.file_matcher, should_ignore,
+                                          None if include_untracked else tree_listings,
+                                          None if include_untracked else counters)
+            except (OSError, ValueError) as e:
+                logger.warning(f"无法从 git 索引列出文件 ({e})，改为遍历目录。")
+            else:
+                if not include_untracked:
+                    return tracked
+                untracked = walk_code_files(self.root_dir, self.file_matcher, should_ignore_fn=should_ignore,
+                                            listings=tree_listings, counters=counters)
+                return set(tracked).union(untracked)
+        return walk_code_files(self.root_dir, self.file_matcher, should_ignore_fn=should_ignore,
+                               listings=tree_listings, counters=counters)
+
+    def aggregate(self, is_manual_run=False, max_file_size_warn=None, since_timestamp=None, incremental=False,
+                  cancel_event=None):
+        """
+        聚合项目中匹配的文件内容到输出文档，并添加目录结构
+
+        先用 refresh() 更新模型 (参数含义相同)，再按配置的输出方式写出。
+        cancel_event 被设置时在写入前放弃本次重建 (抛出 RebuildCancelled)。
+        各阶段的耗时和计数记录在 self.stats 中；配置了 stats_format 时写出到输出文件旁。
+        """
+        event_time, self._first_event_time = self._first_event_time, None
+        stats = RunStats()
+        try:
+            if self.profiler is not None:
+                self.profiler.run(self._aggregate, stats, is_manual_run, max_file_size_warn, since_timestamp,
+                                  incremental, cancel_event)
+            else:
+                self._aggregate(stats, is_manual_run, max_file_size_warn, since_timestamp, incremental, cancel_event)
+        except RebuildCancelled:
+            # The events are still pending: the rebuild that replaces this one covers them
+            if event_time is not None:
+                pending = self._first_event_time
+                self._first_event_time = event_time if pending is None else min(event_time, pending)
+            raise
+        if event_time is not None:
+            stats.event_latency = time.monotonic() - event_time
+        self.stats.record(stats)
+        summary = stats.as_dict()
+        logger.info(f"聚合耗时 {summary['seconds']:.3f} 秒 ("
+                    + ", ".join(f"{name} {seconds:.3f}" for name, seconds in stats.ordered_phases())
+                    + (f")，事件到输出 {stats.event_latency:.3f} 秒。" if stats.event_latency is not None else ")。"))
+        if self.config.stats_format:
+            try:
+                self.stats.export(self.output_path, self.config.stats_format)
+            except OSError as e:
+                logger.error(f"写入统计文件失败: {e}")
+
+    def note_event(self):
+        """记录一个需要重建的文件事件的时间 (用于统计事件到输出的延迟)，只保留尚未重建的最早一个"""
+        if self._first_event_time is None:
+            self._first_event_time = time.monotonic()
+
+    def _aggregate(self, stats, is_manual_run, max_file_size_warn, since_timestamp, incremental, cancel_event):
+        config = self.config
+        output_path = self.output_path
+        logger.info(f"开始聚合代码到 {output_path}...")
+        self.refresh(max_file_size_warn, since_timestamp, incremental, cancel_event, stats)
+        model = self.model
+        tree = self.tree
+
+        # 只统计元数据；片段在写入时才逐个从存储中读出
+        content_count = 0
+        error_count = 0
+        binary_count = 0
+        total_size_bytes = 0
+        for file_segment in model.iter_segments():
+            if file_segment.status == STATUS_ERROR:
+                error_count += 1
+            elif file_segment.status == STATUS_BINARY:
+                binary_count += 1
+            elif file_segment.location is not None:
+                content_count += 1
+                total_size_bytes += file_segment.size
+        if error_count:
+            logger.info(f"读取错误: {error_count}.")
+        if binary_count:
+            logger.info(f"跳过二进制文件: {binary_count}.")
+        if not model.order:
+            logger.warning("未找到任何可包含的文件。")
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise RebuildCancelled()
+
+        if config.output_format != 'jsonl':
+            # The tree model caches the rendered text, so writing the document below reuses it
+            with stats.phase('directory_structure'):
+                try:
+                    tree.render()
+                except Exception:
+                    pass # Reported when the document is written
+        stats.add('files_included', content_count)
+
+        # --- 流式写入文件 (头部 / 文件列表 / 代码内容 / 目录结构) ---
+        mode_text = "Manual Run" if is_manual_run or not config.enable_monitoring else "Auto Update"
+        # Same figure as the document header: duplicates and files over the token budget are left out
+        duplicates = find_duplicates(model) if config.deduplicate else {}
+        total_tokens = included_tokens(model, pack_token_budget(model, config.token_budget, duplicates), duplicates)
+        logger.info(f"准备写入文档，包含 {content_count} 个文件的内容，总源文件大小约 {total_size_bytes / (1024):.2f} KB，估算 {total_tokens} tokens。")
+        bytes_before = self.output_writer.bytes_written_in_thread()
+        try:
+            with stats.phase('write'):
+                self._write_output(model, tree, mode_text, cancel_event)
+        finally:
+            stats.add('bytes_written', self.output_writer.bytes_written_in_thread() - bytes_before)
+
+    def _write_output(self, model, tree, mode_text, cancel_event):
+        """按配置的输出方式写出文档，然后检查输出文件"""
+        config = self.config
+        output_path = self.output_path
+        write_successful = False
+        try:
+            output_dir = os.path.dirname(output_path)
+            if not os.path.exists(output_dir):
+                 logger.info(f"输出目录不存在，尝试创建: {output_dir}")
+                 os.makedirs(output_dir)
+            if config.output_format == 'jsonl':
+                record_count, replaced = write_jsonl(self.output_writer, output_path, model, config.output_compression,
+                                                     token_budget=config.token_budget, cancel_event=cancel_event,
+                                                     deduplicate=config.deduplicate)
+                write_successful = True
+                if not replaced:
+                    logger.info(f"JSONL 内容与 {output_path} 相同，保留现有文件。")
+                    return
+                logger.info(f"已写入 {record_count} 条 JSONL 记录及索引 {output_path}.index.json。")
+            elif config.shard_by:
+                rewritten, shard_count, replaced = self.sharded_output.write(
+                    output_path, model, mode_text, self.root_dir, should_ignore_fn=self.should_ignore,
+                    cancel_event=cancel_event, directory_tree=tree, token_budget=config.token_budget,
+                    shard_by=config.shard_by, shard_size=int(config.shard_size_mb * 1024 * 1024),
+                    deduplicate=config.deduplicate)
+                write_successful = True
+                logger.info(f"分片输出完成：重写 {rewritten}/{shard_count} 个分片，索引{'已更新' if replaced else '未变化'}。")
+                if not replaced and not rewritten:
+                    return
+            else:
+                logger.info(f"尝试写入文件到: {output_path}")
+                chunks = iter_document(model, mode_text, self.root_dir, should_ignore_fn=self.should_ignore,
+                                       cancel_event=cancel_event, directory_tree=tree, token_budget=config.token_budget,
+                                       deduplicate=config.deduplicate)
+                chars_written, replaced = self.output_writer.write(output_path, chunks)
+                write_successful = True
+                if not replaced:
+                    logger.info(f"文档内容与 {output_path} 相同 (不计时间戳)，保留现有文件。")
+                    return
+                logger.info(f"文件写入操作调用完成 (报告写入 {chars_written} 个字符)。")
+            logger.info(f"代码和目录结构已聚合更新到 {output_path}")
+        except RebuildCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"写入输出文件时发生异常 {output_path}: {e}")
+
+        # --- 写入后立即检查文件 ---
+        # os.replace has completed by now, so a plain stat is enough (no need to wait)
+        logger.debug("POST-WRITE CHECK: 验证输出文件...")
+        try:
+            final_size = os.stat(output_path).st_size
+            logger.debug(f"POST-WRITE CHECK: File '{output_path}' EXISTS. Size: {final_size} bytes.")
+        except FileNotFoundError:
+            logger.error(f"POST-WRITE CHECK: File '{output_path}' 在写入操作后未能找到！")
+            if write_successful:
+                 logger.error("POST-WRITE CHECK: 这表明脚本认为写入成功，但文件系统没有文件。检查路径、权限或可能的外部干扰。")
+        except Exception as e:
+            logger.error(f"POST-WRITE CHECK: 检查文件时发生错误: {e}")
+
+    def rebuild_changed_paths(self, changed_paths, cancel_event=None):
+        """
+        调度器回调：把一批变化的文件路径交给聚合模型，然后增量重建文档；
+        项目还没有完整聚合过 (例如守护进程启动时) 则按项目配置完整聚合一次
+        """
+        for path in changed_paths:
+            self.model.mark_changed(path)
+        self.aggregate(is_manual_run=False, incremental=self.configured, cancel_event=cancel_event)
+
+    def classify_path(self, normalized_path, is_directory, event_type='modified'):
+        """
+        判断事件路径对聚合文档的影响
+
+        返回:
+            str | None: 'changed' (只需刷新该文件)、'stale' (需要重新遍历) 或 None (无关)
+        """
+        logger.debug(f"Event received: Path='{normalized_path}', IsDir={is_directory}")
+
+        # .gitignore / .git/info/exclude 变化：丢弃对应的缓存规则并完整重建。
+        # 被忽略目录中的 .gitignore (如 npm install 写入 node_modules 的) 从不生效，不触发重建
+        if ((normalized_path == self.gitignore_cache.exclude_path
+             or not self.should_ignore(os.path.dirname(normalized_path)))
+                and self.ignore_matcher.invalidate_gitignore(normalized_path)):
+             logger.info(f"Ignore rules changed: '{normalized_path}'. Scheduling full rebuild...")
+             return 'stale'
+
+        # Use should_ignore to filter out ignored files/paths BEFORE checking file patterns
+        if self.should_ignore(normalized_path):
+             logger.debug(f"Ignoring event for path based on ignore patterns: '{normalized_path}'")
+             return None
+
+        # 新建/删除/移动会改变目录结构 (包括非代码文件)，渲染前按磁盘状态更新对应节点
+        if event_type != 'modified':
+             self.tree.mark_changed(normalized_path)
+
+        # Directory created/deleted/moved: the file set changed in bulk, rescan the tree
+        if is_directory:
+             logger.debug(f"Directory event for '{normalized_path}'. Scheduling full rescan...")
+             return 'stale'
+
+        filename = os.path.basename(normalized_path)
+        if self.file_matcher(filename):
+             logger.debug(f"Relevant event detected for '{normalized_path}'. Scheduling rebuild...")
+             return 'changed'
+        logger.debug(f"Event path '{normalized_path}' does not match code file patterns.")
+        return None
+
+    def save_cache(self):
+        """把监控期间只保存在内存中的增量更新写回内容缓存 (未配置缓存时什么也不做)"""
+        if self.segment_cache is not None:
+            self.segment_cache.save(self.model)
+
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RebuildCancelled(Exception):
+    """正在进行的重建因为新的事件到来而被取消"""
+
+
+class _RebuildTarget:
+    """RebuildPool 中一个项目的防抖状态"""
+
+    def __init__(self, pool, rebuild_fn, debounce_time, max_delay):
+        self.pool = pool
+        self.rebuild_fn = rebuild_fn
+        self.debounce_time = max(0.0, float(debounce_time))
+        self.max_delay = max_delay if max_delay is not None else max(self.debounce_time * 10, 1.0)
+        self.changed = set()
+        self.dirty = False
+        self.running = False
+        self.first_event = None
+        self.last_event = None
+        self.cancel_event = None
+
+    def deadline(self):
+        return min(self.last_event + self.debounce_time, self.first_event + self.max_delay)
+
+    def submit(self, paths=()):
+        """登记一批变化的路径 (可以为空，仅请求一次重建)"""
+        self.pool.submit(self, paths)
+
+
+class RebuildPool:
+    """
+    由多个项目共享的尾沿防抖重建线程池 (监控模式和多项目守护进程使用)。
+
+    - 每个项目通过 register() 得到一个目标，submit() 只收集路径，不做任何 I/O，
+      不会阻塞 observer 的分发线程
+    - 某个项目最后一个事件之后再等待 debounce_time 秒，由空闲的工作线程执行一次重建；
+      同一项目的重建不会并行执行，线程数与项目数量无关
+    - 重建进行中该项目又有新事件到来时，通过 cancel_event 通知重建尽快放弃，随后用新的一批路径重新开始
+    - 持续不断的事件 (如 git checkout) 最多推迟重建 max_delay 秒，此时触发的重建不会再被取消
+    """
+
+    def __init__(self, workers=1, name='sync2llmtxt-rebuild'):
+        self._cond = threading.Condition()
+        self._targets = []
+        self._stopped = False
+        self.workers = max(1, int(workers))
+        self._threads = [threading.Thread(target=self._run, name=name if self.workers == 1 else f"{name}-{i}",
+                                          daemon=True)
+                         for i in range(self.workers)]
+
+    def register(self, rebuild_fn, debounce_time, max_delay=None):
+        """
+        参数:
+            rebuild_fn (callable): rebuild_fn(changed_paths, cancel_event)，在工作线程上调用
+            debounce_time (float): 最后一个事件之后等待的秒数
+            max_delay (float, optional): 第一个事件之后最多等待的秒数，默认 debounce_time 的 10 倍
+
+        返回:
+            具有 submit(paths) 方法的重建目标
+        """
+        target = _RebuildTarget(self, rebuild_fn, debounce_time, max_delay)
+        with self._cond:
+            self._targets.append(target)
+        return target
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def submit(self, target, paths=()):
+        now = time.monotonic()
+        with self._cond:
+            target.changed.update(paths)
+            if not target.dirty:
+                target.dirty = True
+                target.first_event = now
+            target.last_event = now
+            if target.cancel_event is not None:
+                target.cancel_event.set()
+            self._cond.notify_all()
+
+    def _next_due(self):
+        """返回 (最早到期的空闲目标, 距到期的秒数)，没有待处理的目标时返回 (None, None)"""
+        due = None
+        due_deadline = None
+        for target in self._targets:
+            if target.dirty and not target.running:
+                deadline = target.deadline()
+                if due is None or deadline < due_deadline:
+                    due, due_deadline = target, deadline
+        if due is None:
+            return None, None
+        return due, due_deadline - time.monotonic()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    target, remaining = self._next_due()
+                    if target is not None and remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopped:
+                    return
+                forced = time.monotonic() >= target.first_event + target.max_delay
+                changed_paths, target.changed = target.changed, set()
+                target.dirty = False
+                target.running = True
+                # A rebuild forced by max_delay runs to completion so storms cannot starve output
+                cancel_event = threading.Event()
+                target.cancel_event = None if forced else cancel_event
+
+            try:
+                target.rebuild_fn(changed_paths, cancel_event)
+            except RebuildCancelled:
+                logger.debug("Rebuild cancelled by newer events; restarting after debounce.")
+            except Exception as e:
+                logger.error(f"后台重建失败: {e}", exc_info=True)
+            finally:
+                with self._cond:
+                    target.running = False
+                    target.cancel_event = None
+                    # The target may have become due again while it was running
+                    self._cond.notify_all()
+
+    def stop(self, timeout=None):
+        """停止工作线程；正在进行的重建会被要求取消"""
+        with self._cond:
+            self._stopped = True
+            for target in self._targets:
+                if target.cancel_event is not None:
+                    target.cancel_event.set()
+            self._cond.notify_all()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join(timeout)
+
+
+class RebuildScheduler:
+    """
+    单个项目的尾沿防抖重建调度器：只有一个工作线程、一个目标的 RebuildPool。
+
+    - 事件路径被收集到一个集合中，submit() 本身不做任何 I/O，不会阻塞 observer 的分发线程
+    - 最后一个事件之后再等待 debounce_time 秒，在后台工作线程上执行一次重建
+    - 重建进行中又有新事件到来时，通过 cancel_event 通知重建尽快放弃，随后用新的一批路径重新开始
+    - 持续不断的事件 (如 git checkout) 最多推迟重建 max_delay 秒，此时触发的重建不会再被取消
+    """
+
+    def __init__(self, rebuild_fn, debounce_time, max_delay=None, name='sync2llmtxt-rebuild'):
+        """
+        参数:
+            rebuild_fn (callable): rebuild_fn(changed_paths, cancel_event)，在工作线程上调用
+            debounce_time (float): 最后一个事件之后等待的秒数
+            max_delay (float, optional): 第一个事件之后最多等待的秒数，默认 debounce_time 的 10 倍
+        """
+        self._pool = RebuildPool(1, name)
+        self._target = self._pool.register(rebuild_fn, debounce_time, max_delay)
+        self.rebuild_fn = rebuild_fn
+        self.debounce_time = self._target.debounce_time
+        self.max_delay = self._target.max_delay
+
+    def start(self):
+        self._pool.start()
+        return self
+
+    def submit(self, paths=()):
+        """登记一批变化的路径 (可以为空，仅请求一次重建)"""
+        self._target.submit(paths)
+
+    def stop(self, timeout=None):
+        """停止工作线程；正在进行的重建会被要求取消"""
+        self._pool.stop(timeout)
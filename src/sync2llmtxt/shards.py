@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+import zlib
+import hashlib
+import logging
+
+from .document import (find_duplicates, duplicate_reference, pack_token_budget, iter_header, iter_file_list,
+                       iter_directory_section)
+from .scheduler import RebuildCancelled
+
+logger = logging.getLogger(__name__)
+
+SHARD_BY_SIZE = 'size'
+SHARD_BY_DIRECTORY = 'dir'
+SHARD_MODES = (SHARD_BY_SIZE, SHARD_BY_DIRECTORY)
+DEFAULT_SHARD_SIZE = 1024 * 1024
+# A path selects a shard boundary with probability 1/BOUNDARY_MODULUS once the shard is half full
+BOUNDARY_MODULUS = 8
+
+
+def shard_path(output_path, index):
+    """output.txt -> output.000.txt"""
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}.{index:03d}{ext}"
+
+
+def _is_boundary(relative_path):
+    return zlib.crc32(relative_path.encode('utf-8')) % BOUNDARY_MODULUS == 0
+
+
+def plan_shards(model, shard_by=SHARD_BY_SIZE, shard_size=DEFAULT_SHARD_SIZE, omitted=frozenset(), duplicates=None):
+    """
+    把有内容的文件 (按路径顺序) 分配到分片
+
+    - 'dir': 每个顶层目录一个分片，根目录下的文件合为一个分片
+    - 'size': 分片达到 shard_size 的一半后，在由路径哈希选中的文件前切分，超过 2 倍时强制切分。
+      边界只取决于路径而不是累计偏移，某个文件变大或变小只会移动所在分片附近的边界，
+      后面的分片保持不变 (与 rsync 的内容定义分块相同的思路)；重复文件只按引用行的长度计算
+
+    返回:
+        list: 每个分片的 FileSegment 列表
+    """
+    duplicates = duplicates or {}
+    shards = []
+    if shard_by == SHARD_BY_DIRECTORY:
+        groups = {}
+        for file_segment in model.iter_segments():
+            if file_segment.location is None or file_segment.relative_path in omitted:
+                continue
+            # Relative paths are built with os.sep ('\\' on Windows)
+            head, sep, _ = file_segment.relative_path.partition(os.sep)
+            groups.setdefault(head if sep else '', []).append(file_segment)
+        return [groups[key] for key in sorted(groups)]
+
+    current = []
+    current_size = 0
+    for file_segment in model.iter_segments():
+        if file_segment.location is None or file_segment.relative_path in omitted:
+            continue
+        original = duplicates.get(file_segment.relative_path)
+        if original is not None:
+            length = len(duplicate_reference(file_segment.relative_path, original))
+        else:
+            length = file_segment.location[1]
+        if current and ((current_size >= shard_size // 2 and _is_boundary(file_segment.relative_path))
+                        or current_size + length > shard_size * 2):
+            shards.append(current)
+            current = []
+            current_size = 0
+        current.append(file_segment)
+        current_size += length
+    if current:
+        shards.append(current)
+    return shards
+
+
+def _shard_key(members, duplicates):
+    digest = hashlib.sha256()
+    for file_segment in members:
+        # A duplicate's text depends on which file it refers to, not on its own content
+        original = duplicates.get(file_segment.relative_path, '')
+        digest.update(f"{file_segment.relative_path}\0{file_segment.digest or file_segment.signature}\0{original}\0"
+                      .encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ShardedOutput:
+    """
+    分片输出：output_path 本身是索引 (头部、分片列表、带分片位置的文件列表、目录结构)，
+    文件内容写入 output.000.txt、output.001.txt……索引只包含随文件增删变化的信息，
+    修改文件内容不会改变索引。
+
+    每个分片记住其成员 (路径, 内容哈希) 的摘要；摘要未变且文件未被他人改动时
+    不读取片段直接跳过，其余分片交给 OutputWriter (内容相同时同样不替换文件)。
+    编辑一个文件因此只会重写一个分片 (以及文件列表变化时的索引)。
+    """
+
+    def __init__(self, output_writer):
+        self.output_writer = output_writer
+        self._shard_keys = {}  # shard path -> (members key, size, mtime_ns)
+
+    def _unchanged(self, path, key):
+        last = self._shard_keys.get(path)
+        if last is None or last[0] != key:
+            return False
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return last[1:] == (st.st_size, st.st_mtime_ns)
+
+    def _remember(self, path, key):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        self._shard_keys[path] = (key, st.st_size, st.st_mtime_ns)
+
+    def _iter_shard(self, model, mode_text, number, members, cancel_event, duplicates):
+        yield f"--- Project Code Context, Shard {number:03d} ({mode_text} @ {time.strftime('%Y-%m-%d %H:%M:%S')}) ---\n"
+        for file_segment in members:
+            if cancel_event is not None and cancel_event.is_set():
+                raise RebuildCancelled()
+            original = duplicates.get(file_segment.relative_path)
+            if original is not None:
+                yield duplicate_reference(file_segment.relative_path, original)
+            else:
+                yield model.read_segment(file_segment)
+
+    def _remove_stale_shards(self, output_path, shard_count):
+        output_dir = os.path.dirname(output_path) or '.'
+        stem, ext = os.path.splitext(os.path.basename(output_path))
+        pattern = re.compile(re.escape(stem) + r'\.(\d{3,})' + re.escape(ext) + '$')
+        for name in os.listdir(output_dir):
+            match = pattern.match(name)
+            if match and int(match.group(1)) >= shard_count:
+                path = os.path.join(output_dir, name)
+                try:
+                    os.remove(path)
+                    self._shard_keys.pop(path, None)
+                    logger.info(f"已删除多余的分片 {path}")
+                except OSError as e:
+                    logger.warning(f"无法删除多余的分片 {path}: {e}")
+
+    def write(self, output_path, model, mode_text, root_dir, should_ignore_fn=None, cancel_event=None,
+              directory_tree=None, token_budget=None, shard_by=SHARD_BY_SIZE, shard_size=DEFAULT_SHARD_SIZE,
+              deduplicate=False):
+        """
+        写出全部分片和索引，然后删除编号超出范围的旧分片
+
+        返回:
+            tuple: (重写的分片数, 分片总数, 索引是否被替换)
+        """
+        duplicates = find_duplicates(model) if deduplicate else {}
+        omitted = pack_token_budget(model, token_budget, duplicates)
+        shards = plan_shards(model, shard_by, shard_size, omitted, duplicates)
+        locations = {}
+        rewritten = 0
+        for number, members in enumerate(shards):
+            path = shard_path(output_path, number)
+            name = os.path.basename(path)
+            for file_segment in members:
+                locations[file_segment.relative_path] = name
+            key = _shard_key(members, duplicates)
+            if self._unchanged(path, key):
+                continue
+            chunks = self._iter_shard(model, mode_text, number, members, cancel_event, duplicates)
+            _, replaced = self.output_writer.write(path, chunks)
+            self._remember(path, key)
+            if replaced:
+                rewritten += 1
+                logger.debug(f"Shard {name} rewritten ({len(members)} files).")
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise RebuildCancelled()
+        chunks = self._iter_index(model, mode_text, root_dir, should_ignore_fn, directory_tree, omitted, shards,
+                                  locations, output_path)
+        _, index_replaced = self.output_writer.write(output_path, chunks)
+        self._remove_stale_shards(output_path, len(shards))
+        return rewritten, len(shards), index_replaced
+
+    def _iter_index(self, model, mode_text, root_dir, should_ignore_fn, directory_tree, omitted, shards, locations,
+                    output_path):
+        yield from iter_header(mode_text)
+        yield f"Shards ({len(shards)}):\n"
+        for number, members in enumerate(shards):
+            yield (f"- {os.path.basename(shard_path(output_path, number))}: {len(members)} files "
+                   f"({members[0].relative_path} .. {members[-1].relative_path})\n")
+        yield "\n"
+        yield from iter_file_list(model, omitted, locations)
+        yield from iter_directory_section(root_dir, should_ignore_fn, directory_tree=directory_tree, separator=False)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from .writer import write_atomic
+
+logger = logging.getLogger(__name__)
+
+STATS_JSON = 'json'
+STATS_PROMETHEUS = 'prometheus'
+STATS_FORMATS = (STATS_JSON, STATS_PROMETHEUS)
+STATS_FORMAT_VERSION = 1
+
+# 按执行顺序排列的阶段 (导出时按此顺序列出)
+PHASES = ('discover', 'should_ignore', 'read', 'cache', 'compact', 'directory_structure', 'write')
+
+_METRIC_PREFIX = 'sync2llmtxt'
+
+
+def stats_path_for(output_path, stats_format):
+    """统计文件的位置：输出文件旁的 <输出路径>.stats.json 或 <输出路径>.prom (node_exporter textfile 格式)"""
+    return output_path + ('.prom' if stats_format == STATS_PROMETHEUS else '.stats.json')
+
+
+class RunStats:
+    """
+    一次聚合 (完整遍历或增量重建) 的分阶段耗时 (秒) 和计数
+
+    阶段: discover (遍历目录或读取 git 索引)、should_ignore (包含在 discover 之内，只在导出统计时单独计时)、
+    read (stat 并读取变化的文件)、cache (内容缓存的加载和保存)、compact (压缩片段存储)、
+    directory_structure (渲染目录结构)、write (生成并写出文档)。
+    计数包括遍历的目录/文件及被剪掉的数量、读取和写入的字节数、缓存命中 (签名未变化，未重新读取的文件) 等；
+    监控模式下 event_latency 为本次重建覆盖的最早一个事件到输出写完的时间。
+    """
+
+    def __init__(self, incremental=False):
+        self.incremental = incremental
+        self.started = time.time()
+        self.phases = {}
+        self.counters = {}
+        self.event_latency = None
+
+    @contextmanager
+    def phase(self, name):
+        """累加 with 块的耗时到 name 阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def timed(self, name, fn):
+        """返回包装后的 fn，每次调用的耗时累加到 name 阶段"""
+        phases = self.phases
+        perf_counter = time.perf_counter
+
+        def timed_fn(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                phases[name] = phases.get(name, 0.0) + perf_counter() - start
+        return timed_fn
+
+    def add(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def ordered_phases(self):
+        """按 PHASES 的顺序返回 (阶段, 秒) 列表"""
+        return sorted(self.phases.items(), key=lambda item: (PHASES.index(item[0]) if item[0] in PHASES else len(PHASES)))
+
+    def as_dict(self):
+        return {
+            'mode': 'incremental' if self.incremental else 'full',
+            'started': round(self.started, 3),
+            'seconds': round(sum(seconds for name, seconds in self.phases.items() if name != 'should_ignore'), 6),
+            'phases': {name: round(seconds, 6) for name, seconds in self.ordered_phases()},
+            'counters': dict(self.counters),
+            'event_latency_seconds': None if self.event_latency is None else round(self.event_latency, 6),
+        }
+
+
+class ProjectStats:
+    """一个项目的统计：最近一次运行及启动以来的累计值 (线程安全)"""
+
+    def __init__(self):
+        self.runs = 0
+        self.last = None
+        self.phase_totals = {}
+        self.counter_totals = {}
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, run):
+        with self._lock:
+            self.runs += 1
+            self.last = run
+            for name, seconds in run.phases.items():
+                self.phase_totals[name] = self.phase_totals.get(name, 0.0) + seconds
+            for name, value in run.counters.items():
+                self.counter_totals[name] = self.counter_totals.get(name, 0) + value
+            if run.event_latency is not None:
+                self.latency_count += 1
+                self.latency_sum += run.event_latency
+                self.latency_max = max(self.latency_max, run.event_latency)
+
+    def as_dict(self, output_path):
+        with self._lock:
+            return {
+                'version': STATS_FORMAT_VERSION,
+                'output': output_path,
+                'runs': self.runs,
+                'last_run': self.last.as_dict() if self.last is not None else None,
+                'totals': {
+                    'phases': {name: round(seconds, 6) for name, seconds in self.phase_totals.items()},
+                    'counters': dict(self.counter_totals),
+                },
+                'event_latency_seconds': {
+                    'count': self.latency_count,
+                    'sum': round(self.latency_sum, 6),
+                    'max': round(self.latency_max, 6),
+                },
+            }
+
+    def to_prometheus(self, output_path):
+        """按 Prometheus 文本格式输出 (最近一次运行为 gauge，累计值为 counter)，以 output 标签区分项目"""
+        data = self.as_dict(output_path)
+        label = 'output="{}"'.format(output_path.replace('\\', '\\\\').replace('"', '\\"'))
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {_METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {_METRIC_PREFIX}_{name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{_METRIC_PREFIX}_{name}{suffix}{{{','.join((label,) + labels)}}} {value}")
+
+        last = data['last_run'] or {'phases': {}, 'counters': {}, 'started': 0, 'event_latency_seconds': None}
+        metric('runs_total', 'counter', 'Completed aggregations.', [('', (), data['runs'])])
+        metric('last_run_timestamp_seconds', 'gauge', 'Start time of the last aggregation.',
+               [('', (), last['started'])])
+        metric('phase_seconds', 'gauge', 'Wall time of each phase in the last aggregation.',
+               [('', (f'phase="{name}"',), seconds) for name, seconds in last['phases'].items()])
+        metric('phase_seconds_total', 'counter', 'Wall time of each phase, summed over all aggregations.',
+               [('', (f'phase="{name}"',), seconds) for name, seconds in data['totals']['phases'].items()])
+        for name in sorted(set(data['totals']['counters']) | set(last['counters'])):
+            metric(f'last_run_{name}', 'gauge', f'{name} in the last aggregation.',
+                   [('', (), last['counters'].get(name, 0))])
+            metric(f'{name}_total', 'counter', f'{name}, summed over all aggregations.',
+                   [('', (), data['totals']['counters'].get(name, 0))])
+        latency = data['event_latency_seconds']
+        metric('event_latency_seconds', 'summary', 'Time from the first file event to the rebuilt output.',
+               [('_sum', (), latency['sum']), ('_count', (), latency['count'])])
+        if last['event_latency_seconds'] is not None:
+            metric('last_event_latency_seconds', 'gauge', 'Event-to-output latency of the last rebuild.',
+                   [('', (), last['event_latency_seconds'])])
+        return '\n'.join(lines) + '\n'
+
+    def export(self, output_path, stats_format):
+        """
+        原子地写出统计文件 (Prometheus textfile collector 只会读到完整的文件)
+
+        返回:
+            str: 统计文件路径
+        """
+        path = stats_path_for(output_path, stats_format)
+        if stats_format == STATS_PROMETHEUS:
+            text = self.to_prometheus(output_path)
+        else:
+            text = json.dumps(self.as_dict(output_path), indent=2, ensure_ascii=False) + '\n'
+        write_atomic(path, [text])
+        return path
+
+
+class Profiler:
+    """
+    用 cProfile 记录聚合运行，结果合并后写成 pstats 文件 (可用 snakeviz、python -m pstats 查看)
+
+    cProfile 只能记录启用它的线程，因此每次运行 (包括监控模式下调度器线程上的重建) 各用一个
+    Profile，结束后合并到一起。同一时间只能有一个 Profile 处于启用状态，多个重建线程的运行因此被串行执行。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._stats = None
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+
+    def run(self, fn, *args, **kwargs):
+        import cProfile
+        import pstats
+        profile = cProfile.Profile()
+        try:
+            with self._run_lock:
+                return profile.runcall(fn, *args, **kwargs)
+        finally:
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+
+    def dump(self):
+        """把合并后的结果写入 path；没有任何运行时什么也不做"""
+        with self._lock:
+            if self._stats is None:
+                return
+            self._stats.dump_stats(self.path)
+        logger.info(f"性能分析数据已写入 {self.path} (python -m pstats {self.path})")
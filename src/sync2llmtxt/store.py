@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import threading
+
+
+class SegmentStore:
+    """
+    只追加写入的片段存储文件 (UTF-8 字节)，片段按 (offset, length) 寻址。
+
+    聚合模型把渲染好的片段写到这里而不是留在内存中，写出文档时再按顺序读回，
+    因此内存占用与代码总量无关。path 为 None 时使用匿名临时文件 (关闭后自动删除)。
+    """
+
+    def __init__(self, path=None, temp_dir=None):
+        self.path = os.fspath(path) if path is not None else None
+        if self.path is None:
+            self._file = tempfile.TemporaryFile(prefix='sync2llmtxt-', suffix='.segments', dir=temp_dir)
+        else:
+            self._file = open(self.path, 'a+b')
+        self._file.seek(0, os.SEEK_END)
+        self.size = self._file.tell()
+        self._lock = threading.Lock()
+
+    def append(self, data):
+        """追加一段字节，返回其 (offset, length)"""
+        with self._lock:
+            offset = self.size
+            self._file.seek(offset)
+            self._file.write(data)
+            self.size = offset + len(data)
+        return offset, len(data)
+
+    def read(self, offset, length):
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(length)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -4,16 +4,17 @@
 import time
 import os
 import sys
-import glob
 import logging
-from watchdog.events import FileSystemEventHandler
-from watchdog.observers import Observer
-import throttle
 import argparse
-import yaml
-from gitignore_parser import parse_gitignore
-from pathlib import Path
-from .directory_tree import generate_directory_structure
+from .ignore import GitignoreCache
+from .writer import OutputWriter
+from .shards import SHARD_MODES
+from .jsonl import OUTPUT_FORMATS, COMPRESSIONS
+from .gitindex import DISCOVERY_SOURCES
+from .stats import STATS_FORMATS, Profiler
+from .project import Project, ProjectConfig
+# The watcher stack (watchdog), the daemon, yaml and gitignore_parser are imported where they are used,
+# so that one-shot runs (git hooks, editor save actions) don't pay for them at startup
 
 # --- 配置区 ---
 # (Configuration remains the same as your last version)
@@ -63,6 +64,35 @@ IGNORE_PATTERNS = [
 DEBOUNCE_TIME = 2.0
 # 6. 运行模式
 ENABLE_AUTOMATIC_MONITORING = True
+# 7. 内容缓存目录 (可选，None 表示不启用；只重新读取 stat 签名变化的文件)
+CACHE_DIR = None
+# 8. 并行读取文件的线程数 (网络/FUSE 挂载目录上可调大；输出顺序与顺序读取相同)
+READ_WORKERS = 4
+# 9. 轮询间隔 (秒)。None 表示使用文件系统事件；NFS/SMB/FUSE 等收不到事件的挂载目录请设置为数字
+POLL_INTERVAL = None
+# 10. token 预算 (None 表示不限制)。超出时按修改时间从新到旧收入文件内容，其余列为省略
+TOKEN_BUDGET = None
+# 11. 分片输出 (None 表示输出单个文件)。'size' 按大小、'dir' 按顶层目录把文件内容拆分到
+#     output.000.txt、output.001.txt……，OUTPUT_DOCUMENT_PATH 本身作为索引；只重写内容变化的分片
+SHARD_BY = None
+# 12. 按大小分片时每个分片的目标大小 (MB)
+SHARD_SIZE_MB = 1.0
+# 13. 输出格式：'text' 为单一文本文档；'jsonl' 为每个文件一条 JSON 记录，并附带
+#     <输出路径>.index.json (路径 -> 字节偏移和长度)，便于下游脚本随机读取
+OUTPUT_FORMAT = 'text'
+# 14. jsonl 输出的压缩方式 (None、'gzip' 或 'zstd'，zstd 需要 zstandard 库)；每条记录单独成帧
+OUTPUT_COMPRESSION = None
+# 15. 文件来源：'walk' 遍历目录；'git-index' 直接读取 .git/index 中被跟踪的文件 (不遍历工作区，不需要 git 命令)
+DISCOVERY_SOURCE = 'walk'
+# 16. 使用 git-index 时是否合并未跟踪且未被忽略的文件 (需要再遍历一次工作区)
+INCLUDE_UNTRACKED = False
+# 17. 内容相同的文件只输出一次，之后的副本输出为 '--- File: x (identical to y) ---' 引用
+DEDUPLICATE_FILES = True
+# 18. 调试日志文件 (None 表示不写日志文件，只在控制台输出 INFO 及以上级别)。设置后以 DEBUG 级别覆盖写入该文件
+LOG_FILE = None
+# 19. 统计导出 (None 表示不导出)。'json' 在输出文件旁写出 <输出路径>.stats.json，'prometheus' 写出 <输出路径>.prom
+#     (node_exporter textfile 格式)；包括各阶段耗时、遍历/剪掉的目录和文件数、读写字节数、缓存命中和事件到输出的延迟
+STATS_FORMAT = None
 # --- /配置区 ---
 
 # --- Logging Setup ---
@@ -72,6 +102,7 @@ logger = logging.getLogger(__name__)
 # 新增：配置文件加载函数
 def load_config(config_path):
     try:
+        import yaml
         with open(config_path, 'r', encoding='utf-8') as f:
             config = yaml.safe_load(f)
         return config
@@ -81,38 +112,26 @@ def load_config(config_path):
 
 # 新增：gitignore解析器（全局变量）
 gitignore_matcher = None
+# 逐目录懒加载的 .gitignore / .git/info/exclude 缓存（全局变量）
+gitignore_cache = None
 
 def setup_gitignore_parser(root_dir):
     gitignore_path = os.path.join(root_dir, '.gitignore')
     if os.path.exists(gitignore_path):
         try:
+            from gitignore_parser import parse_gitignore
             return parse_gitignore(gitignore_path)
         except Exception as e:
             logger.warning(f"解析 .gitignore 失败: {e}")
     return None
 
 def setup_logging():
-    """Configures logging to file and console."""
-    log_filename = 'sync_script.log'
-    log_level_file = logging.DEBUG # Capture everything in the file
+    """Configures console logging (INFO and above)."""
     log_level_console = logging.INFO # Show INFO and above on console
 
     # Create logger
     _logger = logging.getLogger('') # Get root logger
-    _logger.setLevel(log_level_file) # Set overall level to lowest (DEBUG)
-
-    # File Handler (DEBUG level)
-    try:
-        file_handler = logging.FileHandler(log_filename, mode='w', encoding='utf-8') # Overwrite log each run
-        file_handler.setLevel(log_level_file)
-        file_formatter = logging.Formatter('%(asctime)s [%(levelname)-8s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-        file_handler.setFormatter(file_formatter)
-        _logger.addHandler(file_handler)
-    except Exception as e:
-        print(f"FATAL: Could not configure file logging to {log_filename}: {e}", file=sys.stderr)
-        # Fallback to console logging only if file logging fails
-        logging.basicConfig(level=log_level_console, format='[%(levelname)-8s] %(message)s')
-        return
+    _logger.setLevel(log_level_console) # DEBUG records are only built when a log file is configured
 
     # Console Handler (INFO level)
     console_handler = logging.StreamHandler(sys.stdout)
@@ -121,253 +140,133 @@ def setup_logging():
     console_handler.setFormatter(console_formatter)
     _logger.addHandler(console_handler)
 
+def setup_file_logging(log_filename):
+    """Adds a DEBUG level log file (LOG_FILE / --log-file); without one, no file is created."""
+    log_level_file = logging.DEBUG # Capture everything in the file
+    _logger = logging.getLogger('')
+    try:
+        file_handler = logging.FileHandler(log_filename, mode='w', encoding='utf-8') # Overwrite log each run
+    except Exception as e:
+        logger.error(f"无法写入日志文件 '{log_filename}': {e}")
+        return
+    file_handler.setLevel(log_level_file)
+    file_formatter = logging.Formatter('%(asctime)s [%(levelname)-8s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    file_handler.setFormatter(file_formatter)
+    _logger.addHandler(file_handler)
+    _logger.setLevel(log_level_file) # Set overall level to lowest (DEBUG)
     logger.info(f"Logging initialized. DEBUG level logs going to '{log_filename}'.")
 
 
-def should_ignore(path):
-    """检查路径是否应该被忽略 (用于文件内容聚合和目录结构生成)"""
-    normalized_path = os.path.normpath(path)
-    filename = os.path.basename(normalized_path)
+# 当前全局配置对应的项目（模型、忽略规则、缓存等状态都保存在 Project 实例中）
+_project = None
+# 输出写入器（记录上次写入内容的哈希，内容未变化时不改动输出文件）
+output_writer = OutputWriter()
+# --profile 对应的 cProfile 记录器（全局变量，None 表示不记录）
+profiler = None
+
+def global_project_config():
+    """由配置区的全局变量构建 ProjectConfig"""
+    return ProjectConfig(MONITORED_CODE_DIR, OUTPUT_DOCUMENT_PATH, CODE_FILE_PATTERNS, IGNORE_PATTERNS,
+                         enable_monitoring=ENABLE_AUTOMATIC_MONITORING, debounce_time=DEBOUNCE_TIME,
+                         cache_dir=CACHE_DIR, read_workers=READ_WORKERS, poll_interval=POLL_INTERVAL,
+                         token_budget=TOKEN_BUDGET, shard_by=SHARD_BY, shard_size_mb=SHARD_SIZE_MB,
+                         output_format=OUTPUT_FORMAT, output_compression=OUTPUT_COMPRESSION,
+                         source=DISCOVERY_SOURCE, include_untracked=INCLUDE_UNTRACKED,
+                         deduplicate=DEDUPLICATE_FILES, stats_format=STATS_FORMAT)
+
+def get_project():
+    """
+    返回当前全局配置对应的 Project (单项目模式)。
+
+    监控目录、文件类型、忽略模式、缓存目录或 gitignore 规则变化时重建项目状态，
+    其余配置 (输出路径、输出格式等) 直接替换。
+    """
+    global _project
+    config = global_project_config()
+    project = _project
+    if (project is None
+            or project.config.source_key() != config.source_key()
+            or project.ignore_matcher.gitignore_matcher is not gitignore_matcher
+            or (gitignore_cache is not None and project.gitignore_cache is not gitignore_cache)):
+        project = Project(config, output_writer, gitignore_matcher, gitignore_cache)
+        _project = project
+    else:
+        project.config = config
+    project.profiler = profiler
+    return project
 
-    # If the path itself is the monitored directory, never ignore it.
-    if normalized_path == os.path.normpath(MONITORED_CODE_DIR):
-        return False
+def get_file_pattern_matcher():
+    """返回与当前 CODE_FILE_PATTERNS 对应的预编译匹配器"""
+    return get_project().file_matcher
 
-    # 获取相对于监控目录的路径，用于更可靠的检查
-    try:
-        relative_path = os.path.relpath(normalized_path, MONITORED_CODE_DIR)
-    except ValueError:
-        # 如果路径不在监控目录下（例如奇怪的符号链接），可能直接忽略或基于绝对路径判断
-        # For tree generation, paths must be within the root, so this case might indicate an issue,
-        # but the path checks below should still handle it if the pattern matches.
-        relative_path = None
-
-    # 绝对路径的各部分
-    parts = normalized_path.split(os.sep)
-
-    # 优先用 gitignore_matcher
-    if gitignore_matcher and gitignore_matcher(path):
-        return True
-
-    for pattern in IGNORE_PATTERNS:
-        reason = ""
-        is_wildcard_suffix = pattern.startswith('*') and not os.sep in pattern
-        contains_separator = os.sep in pattern or '/' in pattern # Check both separators for robustness
-
-        # Case 1: Wildcard Suffix (e.g., *.log) - Checks only the filename
-        if is_wildcard_suffix:
-            if filename.endswith(pattern[1:]):
-                reason = f"Suffix pattern '{pattern}'"
-                # logger.debug(f"IGNORE: Path='{normalized_path}' Reason='{reason}'") # Keep logging out of should_ignore for cleaner structure generation
-                return True
-        # Case 2: Pattern contains separator (e.g., shared/generated, node_modules)
-        # Checks if the normalized path *contains* the pattern as a distinct path segment.
-        elif contains_separator:
-            # 规范化模式中的分隔符，以匹配当前操作系统
-            normalized_pattern = os.path.normpath(pattern)
-            # Add separators around pattern to ensure matching full directory/path segments
-            pattern_check_absolute = f"{os.sep}{normalized_pattern}{os.sep}"
-            # Add separators around path
-            path_check_absolute = f"{os.sep}{normalized_path}{os.sep}"
-
-            if pattern_check_absolute in path_check_absolute:
-                reason = f"Path segment pattern '{normalized_pattern}' in absolute path"
-                # logger.debug(f"IGNORE: Path='{normalized_path}' Reason='{reason}'")
-                return True
-
-            # Check if the relative path starts with the pattern (important for things like 'shared/generated')
-            if relative_path is not None:
-                pattern_start = f"{normalized_pattern}{os.sep}"
-                if relative_path.startswith(pattern_start):
-                     reason = f"Relative path start pattern '{normalized_pattern}'"
-                     # logger.debug(f"IGNORE: Path='{normalized_path}' Reason='{reason}'")
-                     return True
-                # Also check for exact relative path match
-                if relative_path == normalized_pattern:
-                    reason = f"Relative path exact match pattern '{normalized_pattern}'"
-                    # logger.debug(f"IGNORE: Path='{normalized_path}' Reason='{reason}'")
-                    return True
-
-
-        # Case 3: Simple name (no wildcard, no separator, e.g., .git)
-        # Checks if any part of the absolute path matches the simple name.
-        elif not '*' in pattern:
-            if pattern in parts:
-                reason = f"Simple name part '{pattern}'"
-                # logger.debug(f"IGNORE: Path='{normalized_path}' Reason='{reason}'")
-                return True
-
-    # If no pattern matched
-    return False
-
-
-@throttle.wrap(20, 1)  # 20秒内只允许1次
-def aggregate_code_to_document(is_manual_run=False, max_file_size_warn=1*1024*1024, since_timestamp=None):
-    """聚合指定目录和类型的文件内容到目标文档，并添加目录结构"""
-    logger.info(f"开始聚合代码到 {OUTPUT_DOCUMENT_PATH}...")
-    all_code_content = []
-    included_files_log = []
-    error_files_log = []
-    total_size_bytes = 0
-
-    source_path = Path(MONITORED_CODE_DIR)
-    files_to_process = []
-    for pattern in CODE_FILE_PATTERNS:
-        files_to_process.extend(source_path.rglob(pattern))
-    unique_files = sorted(list(set(files_to_process)), key=lambda p: str(p))
-    logger.info(f"找到 {len(unique_files)} 个唯一文件路径。开始过滤和处理文件内容...")
-
-    processed_count = 0
-    ignored_count = 0
-    included_count = 0
-
-    for file_path in unique_files:
-        processed_count += 1
-        if not file_path.is_file():
-            continue
-        if should_ignore(str(file_path)):
-            logger.debug(f"Ignoring file based on pattern: '{file_path}'")
-            ignored_count += 1
-            continue
-        if since_timestamp is not None:
-            mtime = file_path.stat().st_mtime
-            if mtime < since_timestamp:
-                logger.debug(f"文件 '{file_path}' 修改时间早于 since-days，跳过。")
-                ignored_count += 1
-                continue
-        relative_path = str(file_path.relative_to(MONITORED_CODE_DIR))
-        try:
-            file_size = file_path.stat().st_size
-            if file_size > max_file_size_warn:
-                logger.warning(f"跳过大文件: '{relative_path}' (大小: {file_size / (1024*1024):.2f} MB > {max_file_size_warn / (1024*1024):.2f} MB)")
-                included_files_log.append(relative_path + f" (Too Large: {file_size / (1024*1024):.2f} MB)")
-                ignored_count += 1
-                continue
-            if file_size == 0:
-                logger.info(f"文件 '{relative_path}' 为空，跳过内容。")
-                included_files_log.append(relative_path + " (Empty)")
-                included_count += 1
-                continue
-            with file_path.open('r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            included_files_log.append(relative_path)
-            all_code_content.append(f"\n--- File: {relative_path} ---\n\n{content}\n")
-            total_size_bytes += file_size
-            included_count += 1
-        except Exception as read_err:
-            logger.error(f"无法读取文件 '{file_path}': {read_err}")
-            error_files_log.append(relative_path + f" (Read Error: {read_err})")
-
-    logger.info(f"文件内容处理完成。总路径: {processed_count}, 已忽略: {ignored_count}, 尝试包含: {included_count}, 读取错误: {len(error_files_log)}.")
-
-    # --- 准备最终内容 ---
-    mode_text = "Manual Run" if is_manual_run or not ENABLE_AUTOMATIC_MONITORING else "Auto Update"
-    final_content = f"--- Project Code Context ({mode_text} @ {time.strftime('%Y-%m-%d %H:%M:%S')}) ---\n\n"
-
-    # --- 文件列表 ---
-    if not included_files_log and not error_files_log:
-        final_content += "*** No matching code files found or all were ignored. ***\n"
-        logger.warning("未找到任何可包含的文件。")
-    else:
-        final_content += f"Included Files ({len(included_files_log)}):\n"
-        all_listed_files = sorted(included_files_log + error_files_log)
-        for fname in all_listed_files:
-            status = ""
-            if " (Empty)" in fname: status = " (Empty)"
-            elif " (OS Error" in fname: status = " (OS Error)"
-            elif " (Read Error)" in fname: status = " (Read Error)"
-            elif " (Unknown Error)" in fname: status = " (Unknown Error)"
-            display_name = fname.split(" (")[0]
-            final_content += f"- {display_name}{status}\n"
-        final_content += "\n---\n\n"
-
-    # --- 代码内容 ---
-    final_content += "".join(all_code_content)
-
-    # --- 添加目录结构 ---
-    logger.info("Generating directory structure...")
-    try:
-        dir_structure = generate_directory_structure(MONITORED_CODE_DIR, should_ignore_fn=should_ignore)
-        final_content += "\n\n---\n\n" # Separator before structure
-        final_content += "--- Directory Structure (Ignoring Patterns) ---\n\n"
-        final_content += dir_structure
-        final_content += "\n\n--- End of Document ---"
-        logger.info("Directory structure generated and added.")
-    except Exception as e:
-        logger.error(f"Error generating directory structure: {e}")
-        final_content += "\n\n---\n\n"
-        final_content += "--- Directory Structure ---\n\n"
-        final_content += "*** Failed to generate directory structure ***"
-        final_content += "\n\n--- End of Document ---"
+def get_ignore_matcher():
+    """返回与当前配置对应的 IgnoreMatcher"""
+    return get_project().ignore_matcher
 
+def should_ignore(path):
+    """检查路径是否应该被忽略 (用于文件内容聚合和目录结构生成)"""
+    return get_project().should_ignore(path)
 
-    # --- 写入文件 ---
-    logger.info(f"准备写入文档，包含 {len(included_files_log)} 个文件的内容，总源文件大小约 {total_size_bytes / (1024):.2f} KB。")
-    write_successful = False
-    try:
-        output_dir = os.path.dirname(OUTPUT_DOCUMENT_PATH)
-        if not os.path.exists(output_dir):
-             logger.info(f"输出目录不存在，尝试创建: {output_dir}")
-             os.makedirs(output_dir)
-        logger.info(f"尝试写入文件到: {OUTPUT_DOCUMENT_PATH}")
-        with open(OUTPUT_DOCUMENT_PATH, 'w', encoding='utf-8') as f:
-            bytes_written = f.write(final_content)
-        logger.info(f"文件写入操作调用完成 (报告写入 {bytes_written} 个字符)。")
-        write_successful = True
-        logger.info(f"代码和目录结构已聚合更新到 {OUTPUT_DOCUMENT_PATH}")
-    except Exception as e:
-        logger.error(f"写入输出文件时发生异常 {OUTPUT_DOCUMENT_PATH}: {e}")
+def get_aggregation_model():
+    """返回当前监控目录对应的 AggregationModel (监控模式下跨多次重建复用)"""
+    return get_project().model
 
-    # --- 写入后立即检查文件 ---
-    logger.debug("POST-WRITE CHECK: 脚本执行后，立即验证文件...")
-    try:
-        time.sleep(0.5) # Short delay for filesystem
-        if os.path.exists(OUTPUT_DOCUMENT_PATH):
-            final_size = os.path.getsize(OUTPUT_DOCUMENT_PATH)
-            logger.debug(f"POST-WRITE CHECK: File '{OUTPUT_DOCUMENT_PATH}' EXISTS. Size: {final_size} bytes.")
-        else:
-            logger.error(f"POST-WRITE CHECK: File '{OUTPUT_DOCUMENT_PATH}' 在写入操作后未能找到！")
-            if write_successful:
-                 logger.error("POST-WRITE CHECK: 这表明脚本认为写入成功，但文件系统没有文件。检查路径、权限或可能的外部干扰。")
+def get_directory_tree():
+    """返回当前监控目录对应的 DirectoryTreeModel (监控模式下只按新建/删除/移动事件增量更新)"""
+    return get_project().tree
 
-    except Exception as e:
-        logger.error(f"POST-WRITE CHECK: 检查文件时发生错误: {e}")
+def get_segment_cache():
+    """返回 CACHE_DIR 对应的 SegmentCache，未配置时返回 None"""
+    return get_project().segment_cache
 
 
-# --- CodeChangeHandler (仅在自动模式下使用) ---
-class CodeChangeHandler(FileSystemEventHandler):
-     def on_any_event(self, event):
-         # Only process events for files, and only if monitoring is enabled
-         if not ENABLE_AUTOMATIC_MONITORING or event.is_directory:
-             return
+def aggregate_code_to_document(is_manual_run=False, max_file_size_warn=1*1024*1024, since_timestamp=None, incremental=False, cancel_event=None):
+    """
+    聚合指定目录和类型的文件内容到目标文档，并添加目录结构 (见 Project.aggregate)
 
-         # 只处理文件被修改或新建的事件
-         if event.event_type not in ('modified', 'created', 'deleted'):
-             logger.debug(f"Event type '{event.event_type}' ignored for path: '{event.src_path}'")
-             return
+    incremental=True 时 (监控模式的事件触发) 沿用模型已有的过滤参数，
+    只刷新通过 mark_changed 记录的路径；模型尚未建立或已过期时退回完整遍历。
+    cancel_event 被设置时在写入前放弃本次重建 (抛出 RebuildCancelled)。
+    """
+    get_project().aggregate(is_manual_run, max_file_size_warn, since_timestamp, incremental, cancel_event)
 
-         normalized_path = os.path.normpath(event.src_path)
 
-         logger.debug(f"Event received: Type='{event.event_type}', Path='{normalized_path}', IsDir={event.is_directory}")
+def rebuild_changed_paths(changed_paths, cancel_event=None):
+    """调度器回调：把一批变化的文件路径交给聚合模型，然后增量重建文档"""
+    get_project().rebuild_changed_paths(changed_paths, cancel_event)
 
-         # Use should_ignore to filter out ignored files/paths BEFORE checking file patterns
-         if should_ignore(normalized_path):
-              logger.debug(f"Ignoring event for path based on ignore patterns: '{normalized_path}'")
-              return
 
-         filename = os.path.basename(normalized_path)
-         matches_pattern = False
-         for pattern in CODE_FILE_PATTERNS:
-              # Simple direct match or wildcard match (like *.py)
-              if pattern == filename or (pattern.startswith('*') and filename.endswith(pattern[1:])):
-                  matches_pattern = True
-                  break
+def run_daemon(config, args):
+    """多项目守护进程模式：所有项目共享一个 Observer 和一个重建线程池，直到 Ctrl+C"""
+    from .daemon import ProjectDaemon, load_project_configs, DEFAULT_REBUILD_WORKERS, DEFAULT_TOTAL_WATCHES
+    base_config = global_project_config()
+    base_config.max_file_size_mb = args.max_size
+    base_config.since_days = args.since_days
+    try:
+        configs = load_project_configs(config['PROJECTS'], base_config)
+        for project_config in configs:
+            project_config.validate()
+    except ValueError as e:
+        logger.critical(f"PROJECTS 配置无效: {e}")
+        sys.exit(1)
 
-         if matches_pattern:
-              logger.debug(f"Relevant event detected for '{normalized_path}'. Triggering aggregation function...")
-              aggregate_code_to_document(is_manual_run=False)
-         else:
-             logger.debug(f"Event path '{normalized_path}' does not match code file patterns.")
+    logger.info(f"--- 多项目守护进程: {len(configs)} 个项目 ---")
+    for project_config in configs:
+        logger.info(f"  {os.path.abspath(project_config.root_dir)} -> {os.path.abspath(project_config.output_path)}")
+    daemon = ProjectDaemon(configs, config.get('REBUILD_WORKERS', DEFAULT_REBUILD_WORKERS),
+                           config.get('MAX_WATCHES', DEFAULT_TOTAL_WATCHES))
+    for project in daemon.projects:
+        project.profiler = profiler
+    daemon.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("检测到 Ctrl+C，正在停止守护进程...")
+    daemon.stop()
+    if profiler is not None:
+        profiler.dump()
+    logging.shutdown()
 
 
 def main():
@@ -375,10 +274,12 @@ def main():
     # 全局变量引用
     global MONITORED_CODE_DIR, OUTPUT_DOCUMENT_PATH, CODE_FILE_PATTERNS
     global IGNORE_PATTERNS, ENABLE_AUTOMATIC_MONITORING, DEBOUNCE_TIME
-    global gitignore_matcher
+    global CACHE_DIR, READ_WORKERS, POLL_INTERVAL, TOKEN_BUDGET, SHARD_BY, SHARD_SIZE_MB
+    global OUTPUT_FORMAT, OUTPUT_COMPRESSION, DISCOVERY_SOURCE, INCLUDE_UNTRACKED, DEDUPLICATE_FILES, LOG_FILE
+    global STATS_FORMAT, gitignore_cache, profiler
     
     # --- Setup Logging FIRST ---
-    setup_logging() # Initialize logging to file and console
+    setup_logging() # Initialize console logging; the log file (if any) is added once the config is loaded
 
     # --- Argument Parsing ---
     parser = argparse.ArgumentParser(description="聚合指定目录下的代码文件到单一文本文件，便于大模型处理。")
@@ -387,9 +288,24 @@ def main():
     parser.add_argument('-c', '--config', type=str, default=None, help='配置文件路径 (YAML)')
     parser.add_argument('--max-size', type=float, default=1.0, help='最大单文件体积（MB），超过则跳过，默认1MB')
     parser.add_argument('--since-days', type=int, default=None, help='只聚合最近N天内修改的文件')
+    parser.add_argument('--cache-dir', type=str, default=None, help='内容缓存目录，再次运行时只读取变化过的文件')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help=f'并行读取文件的线程数，默认{READ_WORKERS}')
+    parser.add_argument('--poll-interval', type=float, default=None, help='用轮询代替文件系统事件 (适用于 NFS/SMB/FUSE)，每N秒检查一次')
+    parser.add_argument('--token-budget', type=int, default=None, help='文件内容的估算 token 上限，优先收入最近修改的文件')
+    parser.add_argument('--shard-by', choices=SHARD_MODES, default=None, help='分片输出：size 按大小，dir 按顶层目录；只重写变化的分片')
+    parser.add_argument('--shard-size', type=float, default=None, help=f'按大小分片时每个分片的目标大小（MB），默认{SHARD_SIZE_MB}MB')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=None, help='输出格式：text (默认) 或 jsonl (每个文件一条记录，附带偏移索引)')
+    parser.add_argument('--compress', choices=COMPRESSIONS, default=None, help='jsonl 输出按记录压缩：gzip 或 zstd')
+    parser.add_argument('--source', choices=DISCOVERY_SOURCES, default=None, help='文件来源：walk 遍历目录 (默认)，git-index 读取 .git/index 中被跟踪的文件')
+    parser.add_argument('--include-untracked', action='store_true', default=None, help='git-index 模式下合并未跟踪且未被忽略的文件')
+    parser.add_argument('--no-dedup', dest='deduplicate', action='store_false', default=None, help='完整输出内容相同的每个文件 (默认只输出一次)')
+    parser.add_argument('--stats', choices=STATS_FORMATS, default=None, help='每次聚合后在输出文件旁写出统计：json (<输出>.stats.json) 或 prometheus (<输出>.prom)')
+    parser.add_argument('--profile', type=str, default=None, help='用 cProfile 记录每次聚合，退出时把合并的结果写入该文件 (pstats 格式)')
+    parser.add_argument('--log-file', type=str, default=None, help='把 DEBUG 级别的日志写入该文件 (默认不写日志文件)')
     args = parser.parse_args()
 
     # 加载配置文件（如有）
+    config = None
     if args.config:
         config = load_config(args.config)
         if config:
@@ -399,10 +315,58 @@ def main():
             IGNORE_PATTERNS = config.get('IGNORE_PATTERNS', IGNORE_PATTERNS)
             ENABLE_AUTOMATIC_MONITORING = config.get('ENABLE_AUTOMATIC_MONITORING', ENABLE_AUTOMATIC_MONITORING)
             DEBOUNCE_TIME = config.get('DEBOUNCE_TIME', DEBOUNCE_TIME)
+            CACHE_DIR = config.get('CACHE_DIR', CACHE_DIR)
+            READ_WORKERS = config.get('READ_WORKERS', READ_WORKERS)
+            POLL_INTERVAL = config.get('POLL_INTERVAL', POLL_INTERVAL)
+            TOKEN_BUDGET = config.get('TOKEN_BUDGET', TOKEN_BUDGET)
+            SHARD_BY = config.get('SHARD_BY', SHARD_BY)
+            SHARD_SIZE_MB = config.get('SHARD_SIZE_MB', SHARD_SIZE_MB)
+            OUTPUT_FORMAT = config.get('OUTPUT_FORMAT', OUTPUT_FORMAT)
+            OUTPUT_COMPRESSION = config.get('OUTPUT_COMPRESSION', OUTPUT_COMPRESSION)
+            DISCOVERY_SOURCE = config.get('DISCOVERY_SOURCE', DISCOVERY_SOURCE)
+            INCLUDE_UNTRACKED = config.get('INCLUDE_UNTRACKED', INCLUDE_UNTRACKED)
+            DEDUPLICATE_FILES = config.get('DEDUPLICATE_FILES', DEDUPLICATE_FILES)
+            LOG_FILE = config.get('LOG_FILE', LOG_FILE)
+            STATS_FORMAT = config.get('STATS_FORMAT', STATS_FORMAT)
 
     # 命令行参数覆盖
     MONITORED_CODE_DIR = os.path.abspath(args.src)
     OUTPUT_DOCUMENT_PATH = os.path.abspath(args.out)
+    if args.cache_dir:
+        CACHE_DIR = args.cache_dir
+    if args.jobs is not None:
+        READ_WORKERS = args.jobs
+    if args.poll_interval is not None:
+        POLL_INTERVAL = args.poll_interval
+    if args.token_budget is not None:
+        TOKEN_BUDGET = args.token_budget
+    if args.shard_by is not None:
+        SHARD_BY = args.shard_by
+    if args.shard_size is not None:
+        SHARD_SIZE_MB = args.shard_size
+    if args.format is not None:
+        OUTPUT_FORMAT = args.format
+    if args.compress is not None:
+        OUTPUT_COMPRESSION = args.compress
+    if args.source is not None:
+        DISCOVERY_SOURCE = args.source
+    if args.include_untracked is not None:
+        INCLUDE_UNTRACKED = args.include_untracked
+    if args.deduplicate is not None:
+        DEDUPLICATE_FILES = args.deduplicate
+    if args.stats is not None:
+        STATS_FORMAT = args.stats
+    if args.profile:
+        profiler = Profiler(os.path.abspath(args.profile))
+    if args.log_file:
+        LOG_FILE = args.log_file
+    if LOG_FILE:
+        setup_file_logging(LOG_FILE)
+
+    # 配置文件中给出 PROJECTS 列表时进入多项目守护进程模式，顶层配置作为各项目的默认值
+    if config and config.get('PROJECTS'):
+        run_daemon(config, args)
+        return
 
     # --- Initial Setup & Validation ---
     try:
@@ -412,8 +376,8 @@ def main():
         logger.critical(f"配置的路径无效: {e}") # Use CRITICAL for fatal errors
         sys.exit(1)
 
-    # 初始化 gitignore 解析器
-    gitignore_matcher = setup_gitignore_parser(MONITORED_CODE_DIR)
+    # 初始化 gitignore 缓存（根目录及各子目录的 .gitignore 在遍历时按需加载）
+    gitignore_cache = GitignoreCache(MONITORED_CODE_DIR)
 
     logger.info("--- 代码和目录结构打包脚本 ---")
     logger.info(f"模式: {'自动监控' if ENABLE_AUTOMATIC_MONITORING else '手动运行'}")
@@ -424,6 +388,28 @@ def main():
     logger.debug(f"忽略模式列表: {', '.join(IGNORE_PATTERNS)}") # Full list in debug log
     if ENABLE_AUTOMATIC_MONITORING:
         logger.info(f"防抖时间: {DEBOUNCE_TIME} 秒")
+        if POLL_INTERVAL:
+            logger.info(f"轮询间隔: {POLL_INTERVAL} 秒")
+    if CACHE_DIR:
+        logger.info(f"内容缓存目录: {os.path.abspath(CACHE_DIR)}")
+    logger.info(f"读取线程数: {max(1, int(READ_WORKERS))}")
+    if TOKEN_BUDGET is not None:
+        logger.info(f"token 预算: {TOKEN_BUDGET}")
+    try:
+        global_project_config().validate()
+    except ValueError as e:
+        logger.critical(str(e))
+        sys.exit(1)
+    if DISCOVERY_SOURCE != 'walk':
+        logger.info(f"文件来源: {DISCOVERY_SOURCE}" + (" (合并未跟踪的文件)" if INCLUDE_UNTRACKED else ""))
+    if SHARD_BY:
+        logger.info(f"分片输出: {SHARD_BY}" + (f"，每片约 {SHARD_SIZE_MB} MB" if SHARD_BY == 'size' else ""))
+    if STATS_FORMAT:
+        logger.info(f"统计导出: {STATS_FORMAT}")
+    if OUTPUT_FORMAT == 'jsonl':
+        logger.info("输出格式: jsonl" + (f" ({OUTPUT_COMPRESSION} 压缩)" if OUTPUT_COMPRESSION else ""))
+    elif OUTPUT_COMPRESSION:
+        logger.warning("压缩只适用于 jsonl 输出，已忽略。")
     logger.info("-------------------------")
 
     if not os.path.isdir(MONITORED_CODE_DIR):
@@ -443,15 +429,21 @@ def main():
     if ENABLE_AUTOMATIC_MONITORING:
         logger.info("自动监控模式已启用...")
         try:
-            event_handler = CodeChangeHandler()
-            observer = Observer()
-            # Watchdog's ignore patterns are less flexible than our should_ignore.
-            # We will rely on should_ignore within the handler, but telling watchdog
-            # to ignore common large directories like node_modules can improve performance.
-            # However, implementing watchdog ignores needs careful consideration to not conflict
-            # with our pattern matching. For simplicity and robustness, we'll let watchdog notify
-            # for ignored paths and filter them *within* our handler using should_ignore.
-            observer.schedule(event_handler, MONITORED_CODE_DIR, recursive=True)
+            from .scheduler import RebuildScheduler
+            from .watcher import IgnoreAwareWatcher, CodeChangeHandler, create_observer
+            from .poller import PollingWatcher
+            # 事件只登记路径，重建在后台线程上于最后一个事件 DEBOUNCE_TIME 秒后执行
+            scheduler = RebuildScheduler(rebuild_changed_paths, DEBOUNCE_TIME)
+            event_handler = CodeChangeHandler(get_project(), scheduler)
+            if POLL_INTERVAL:
+                # 网络文件系统收不到 inotify 事件：按 stat 快照轮询，只重新扫描 mtime 变化的目录
+                observer = PollingWatcher(event_handler, MONITORED_CODE_DIR, should_ignore, POLL_INTERVAL)
+            else:
+                observer = create_observer()
+                # 只为未被忽略的目录注册 watch (node_modules、.venv 等不占用 inotify watch)，
+                # 忽略规则与 should_ignore 相同；handler 内部仍会再用 should_ignore 过滤事件
+                watcher = IgnoreAwareWatcher(observer, event_handler, MONITORED_CODE_DIR, should_ignore)
+                watcher.schedule()
             logger.info("监控器设置成功。")
         except Exception as e:
              logger.critical(f"无法启动监控器: {e}")
@@ -459,6 +451,7 @@ def main():
              sys.exit(1)
 
         logger.info("监控已启动。按 Ctrl+C 停止脚本。")
+        scheduler.start()
         observer.start()
         try:
             while True:
@@ -467,13 +460,21 @@ def main():
             observer.stop()
             logger.info("检测到 Ctrl+C，正在停止监控...")
         observer.join()
+        scheduler.stop()
         logger.info("监控已成功停止。")
+        # 监控期间的增量更新只保存在内存中，退出前写回内容缓存
+        segment_cache = get_segment_cache()
+        if segment_cache is not None:
+            segment_cache.save(get_aggregation_model())
+        if profiler is not None:
+            profiler.dump()
         logger.info("脚本退出 (自动模式)。")
     else:
+        if profiler is not None:
+            profiler.dump()
         logger.info("脚本执行完毕 (手动模式)。")
-        # Give logs a moment to flush before exiting
+        # logging.shutdown() flushes and closes all handlers before exiting
         logging.shutdown()
-        time.sleep(0.1)
         sys.exit(0)
 
 # --- 主执行块 (__main__) ---
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import string
+
+_WHITESPACE = b' \t\r\n\x0b\x0c'
+_NON_SYMBOL_BYTES = _WHITESPACE + (string.ascii_letters + string.digits + '_').encode('ascii')
+
+
+def estimate_tokens(data):
+    """
+    估算一段 UTF-8 文本 (bytes) 的 token 数，近似 GPT 系列的 BPE 分词，宁多勿少
+
+    只使用 bytes.translate / bytes.count (C 实现，每秒数百 MB)：
+    每个标点或非 ASCII 字节记 1 个 token，字母数字每 4 个字节记 1 个，
+    每个换行 (连同其后的缩进) 记 1 个。
+    """
+    symbols = len(data.translate(None, _NON_SYMBOL_BYTES))
+    word_bytes = len(data.translate(None, _WHITESPACE)) - symbols
+    return symbols + word_bytes // 4 + data.count(b'\n')
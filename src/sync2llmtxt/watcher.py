@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import logging
+from watchdog.events import (
+    FileSystemEventHandler, DirCreatedEvent, DirDeletedEvent, FileCreatedEvent, FileDeletedEvent,
+)
+from watchdog.observers import Observer
+
+logger = logging.getLogger(__name__)
+
+# 没有 inotify 时 (macOS、Windows 等) watchdog watch 的数量上限：每个 watch 占用一个线程
+DEFAULT_MAX_WATCHES = 64
+
+
+def create_observer():
+    """
+    创建 watchdog Observer。Linux 上使用 PrunedInotifyObserver：整个目录树只占用一个 inotify 实例，
+    被忽略的目录不注册 watch；其他平台开启完整的移动事件 (如果支持)，
+    以便识别跨 watch (或从监控目录外) 移入的目录并为其补上监控
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            from .inotify import PrunedInotifyObserver
+            return PrunedInotifyObserver()
+        except Exception as e:
+            # e.g. a watchdog release whose inotify internals differ: fall back to the plain observer
+            logger.debug(f"Pruned inotify observer unavailable: {e}")
+    try:
+        return Observer(generate_full_events=True)
+    except TypeError:
+        return Observer()
+
+
+class IgnoreAwareWatcher(FileSystemEventHandler):
+    """
+    只为未被忽略的目录注册监控的 watchdog 事件处理器，事件原样转发给 handler。
+
+    observer 支持 schedule_pruned() (Linux 上 create_observer() 返回的 PrunedInotifyObserver) 时，
+    整个目录树只注册一个 watch：一个 inotify 实例中每个未被忽略的目录各有一个非递归 watch，
+    被忽略的目录 (及其子目录) 不论目录数量多少都不会被监控。
+
+    其他 observer 上按以下规则组合多个 watch：
+
+    - 不含被忽略目录的子树用一个递归 watch 覆盖
+    - 含有被忽略目录的目录只做非递归监控，再逐个处理其未被忽略的子目录
+    - 根目录的 .git/info 单独做非递归监控，以便感知 .git/info/exclude 的变化
+
+    因此 node_modules、.venv 等目录不会占用任何 inotify watch。计划中的 watch 数量超过
+    max_watches 时，从最深处开始把目录合并为递归 watch。
+    目录的新建、删除、移动以及忽略规则 (.gitignore) 的变化会随事件调整 watch。
+    """
+
+    def __init__(self, observer, handler, root_dir, should_ignore_fn, max_watches=DEFAULT_MAX_WATCHES):
+        super().__init__()
+        self.observer = observer
+        self.handler = handler
+        self.root_dir = os.path.normpath(os.fspath(root_dir))
+        self.should_ignore_fn = should_ignore_fn
+        self.max_watches = max_watches
+        self.git_info_dir = os.path.join(self.root_dir, '.git', 'info')
+        self.exclude_path = os.path.join(self.git_info_dir, 'exclude')
+        self.watches = {}  # (path, recursive) -> ObservedWatch
+
+    def _scan(self, top):
+        """
+        遍历 top 下所有未被忽略的目录 (不跟随符号链接，与 watchdog 的递归监控一致)
+
+        返回:
+            dict: 目录 -> [未被忽略的子目录列表, 子树中是否不含被忽略的目录]
+        """
+        info = {}
+        order = []
+        stack = [top]
+        while stack:
+            dir_path = stack.pop()
+            children = []
+            clean = True
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        try:
+                            if not entry.is_dir(follow_symlinks=False):
+                                continue
+                        except OSError:
+                            continue
+                        if self.should_ignore_fn(entry.path):
+                            clean = False
+                        else:
+                            children.append(entry.path)
+            except OSError as e:
+                logger.debug(f"Cannot scan directory '{dir_path}' for watches: {e}")
+            info[dir_path] = [children, clean]
+            order.append(dir_path)
+            stack.extend(children)
+        # Parents are scanned before their children, so fold cleanliness bottom-up
+        for dir_path in reversed(order):
+            entry = info[dir_path]
+            if entry[1] and not all(info[child][1] for child in entry[0]):
+                entry[1] = False
+        return info
+
+    def _plan(self, info, max_depth):
+        """返回 ([(目录, 是否递归)], 是否因 max_depth 把含被忽略目录的子树合并成了递归 watch)"""
+        plan = []
+        truncated = False
+        stack = [(self.root_dir, 0)]
+        while stack:
+            dir_path, depth = stack.pop()
+            children, clean = info[dir_path]
+            if clean:
+                plan.append((dir_path, True))
+            elif depth >= max_depth:
+                plan.append((dir_path, True))
+                truncated = True
+            else:
+                plan.append((dir_path, False))
+                stack.extend((child, depth + 1) for child in children)
+        return plan, truncated
+
+    @property
+    def pruned(self):
+        """observer 能否在一个 watch 中跳过被忽略的目录"""
+        return hasattr(self.observer, 'schedule_pruned')
+
+    def _schedule_pruned(self):
+        key = (self.root_dir, True)
+        watch = self.watches.get(key)
+        if watch is not None:
+            self.observer.rescan(watch)
+            return
+        try:
+            self.watches[key] = self.observer.schedule_pruned(self, self.root_dir, self.should_ignore_fn,
+                                                              extra_dirs=(self.git_info_dir,))
+        except OSError as e:
+            logger.warning(f"无法监控目录 '{self.root_dir}': {e}")
+            return
+        logger.info(f"已注册监控: 一个 inotify 实例覆盖 '{self.root_dir}' 下所有未被忽略的目录。")
+
+    def schedule(self):
+        """按当前忽略规则计算需要的 watch，与已注册的 watch 比较后增删"""
+        if self.pruned:
+            self._schedule_pruned()
+            return
+        info = self._scan(self.root_dir)
+        plan, truncated = self._plan(info, 0)
+        max_depth = 1
+        while truncated:
+            candidate, candidate_truncated = self._plan(info, max_depth)
+            if len(candidate) > self.max_watches:
+                logger.info(f"监控目录过多，深度 {max_depth} 以下含被忽略目录的子树将整体递归监控。")
+                break
+            plan, truncated = candidate, candidate_truncated
+            max_depth += 1
+        if os.path.isdir(self.git_info_dir):
+            plan.append((self.git_info_dir, False))
+
+        wanted = set(plan)
+        # Add the new watches before dropping the old ones so no event is lost in between
+        for key in sorted(wanted - set(self.watches)):
+            path, recursive = key
+            try:
+                self.watches[key] = self.observer.schedule(self, path, recursive=recursive)
+            except OSError as e:
+                logger.warning(f"无法监控目录 '{path}': {e}")
+        for key in set(self.watches) - wanted:
+            self._unschedule(key)
+        logger.info(f"已注册 {len(self.watches)} 个监控 (递归: {sum(1 for _, r in self.watches if r)})，"
+                    f"覆盖 {len(info)} 个未被忽略的目录。")
+
+    def _unschedule(self, key):
+        watch = self.watches.pop(key)
+        try:
+            self.observer.unschedule(watch)
+        except KeyError:
+            pass # The emitter already went away with its directory
+
+    def _recursive_watch_for(self, path):
+        """返回覆盖 path 的递归 watch 的键，没有时返回 None"""
+        for key in self.watches:
+            watched, recursive = key
+            if recursive and (path + os.sep).startswith(watched + os.sep):
+                return key
+        return None
+
+    def dispatch(self, event):
+        moved_in = False
+        if event.event_type == 'moved' and not (event.src_path and event.dest_path):
+            # Only one side of the move is inside a watch: report it as a deletion/creation
+            if event.src_path:
+                event = (DirDeletedEvent if event.is_directory else FileDeletedEvent)(event.src_path)
+            else:
+                moved_in = event.is_directory
+                event = (DirCreatedEvent if event.is_directory else FileCreatedEvent)(event.dest_path)
+        self.handler.dispatch(event)
+        if event.event_type not in ('created', 'deleted', 'moved', 'modified'):
+            return
+        try:
+            self._update_watches(event, moved_in)
+        except Exception as e:
+            logger.error(f"更新监控目录失败: {e}", exc_info=True)
+
+    def _update_watches(self, event, moved_in=False):
+        paths = [os.path.normpath(event.src_path)]
+        if event.event_type == 'moved' and getattr(event, 'dest_path', None):
+            paths.append(os.path.normpath(event.dest_path))
+
+        # Ignore rules changed: directories may have become (un)ignored anywhere below
+        if any(os.path.basename(path) == '.gitignore' or path == self.exclude_path for path in paths):
+            self.schedule()
+            return
+        if not event.is_directory or event.event_type == 'modified':
+            return
+        if self.pruned:
+            # New and moved-in directories are handled by the inotify instance itself; directories
+            # moved out of the tree would otherwise stay watched under their old paths
+            if event.event_type in ('deleted', 'moved') and self.watches:
+                self.observer.rescan(self.watches[(self.root_dir, True)], paths[0])
+            return
+
+        removed = paths[0] if event.event_type in ('deleted', 'moved') else None
+        added = paths[-1] if event.event_type in ('created', 'moved') else None
+        if removed is not None:
+            for key in [k for k in self.watches if (k[0] + os.sep).startswith(removed + os.sep)]:
+                self._unschedule(key)
+        if added is None or not os.path.isdir(added):
+            return
+
+        if self.should_ignore_fn(added):
+            # e.g. 'npm install' inside a recursively watched subtree: split that subtree
+            if self._recursive_watch_for(added) is not None:
+                logger.debug(f"Ignored directory '{added}' appeared inside a recursive watch; rescheduling.")
+                self.schedule()
+        elif moved_in and self._recursive_watch_for(added) is not None:
+            # watchdog only adds watches for directories created in place; re-register the
+            # covering watch so the moved-in subtree is walked and watched as well
+            self._unschedule(self._recursive_watch_for(added))
+            self.schedule()
+        elif self._recursive_watch_for(added) is None:
+            # Parent is only watched non-recursively; cover the new subtree
+            info = self._scan(added)
+            if info[added][1] and len(self.watches) < self.max_watches:
+                key = (added, True)
+                try:
+                    self.watches[key] = self.observer.schedule(self, added, recursive=True)
+                except OSError as e:
+                    logger.warning(f"无法监控目录 '{added}': {e}")
+            else:
+                self.schedule()
+
+
+# --- CodeChangeHandler (仅在自动模式下使用) ---
+class CodeChangeHandler(FileSystemEventHandler):
+     def __init__(self, project, scheduler=None):
+         """scheduler 为 None 时在事件线程上同步重建 (仅用于调试和测试)"""
+         super().__init__()
+         self.project = project
+         self.scheduler = scheduler
+
+     def on_any_event(self, event):
+         project = self.project
+         # Only process events if monitoring is enabled
+         if not project.config.enable_monitoring:
+             return
+
+         # 只处理新建、修改、删除和移动事件
+         if event.event_type not in ('modified', 'created', 'deleted', 'moved'):
+             logger.debug(f"Event type '{event.event_type}' ignored for path: '{event.src_path}'")
+             return
+
+         # Directory mtime changes accompany every file event in them; nothing to do
+         if event.is_directory and event.event_type == 'modified':
+             return
+
+         paths = [event.src_path]
+         if event.event_type == 'moved' and getattr(event, 'dest_path', None):
+             paths.append(event.dest_path)
+
+         relevant = False
+         changed_paths = []
+         for path in paths:
+             normalized_path = os.path.normpath(path)
+             kind = project.classify_path(normalized_path, event.is_directory, event.event_type)
+             if kind == 'stale':
+                 project.model.mark_stale()
+                 relevant = True
+             elif kind == 'changed':
+                 changed_paths.append(normalized_path)
+                 relevant = True
+         if not relevant:
+             return
+         project.note_event()
+         # 只有被记录的路径会被重新读取；重建在调度器的后台线程上防抖执行
+         if self.scheduler is not None:
+             self.scheduler.submit(changed_paths)
+         else:
+             project.rebuild_changed_paths(changed_paths)
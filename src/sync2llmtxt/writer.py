@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Read once at import time (os.umask can only be queried by setting it)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def write_atomic(output_path, chunks):
+    """
+    把 chunks (str) 流式写入输出目录中的临时文件，完成后用 os.replace 替换 output_path。
+
+    读者只会看到旧文件或完整的新文件；写入过程中出现异常 (包括取消) 时删除临时文件，
+    原文件保持不变。
+
+    返回:
+        int: 写入的字符数
+    """
+    chars_written, _ = OutputWriter().write(output_path, chunks, skip_unchanged=False)
+    return chars_written
+
+
+def digest_of_file(path):
+    """计算已有文件全部内容的 SHA-256，文件不存在时返回 None"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for data in iter(lambda: f.read(_READ_CHUNK_SIZE), b''):
+                digest.update(data)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def body_digest_of_file(path):
+    """计算已有输出文件除首行 (带时间戳的标题) 之外内容的 SHA-256，文件不存在时返回 None"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+            f.readline()
+            while True:
+                data = f.read(_READ_CHUNK_SIZE)
+                if not data:
+                    break
+                digest.update(data.encode('utf-8', errors='surrogateescape'))
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+class OutputWriter:
+    """
+    输出文件写入器。
+
+    边写临时文件边计算除首行时间戳外的内容哈希；与上次写入 (或现有文件) 的哈希相同时
+    丢弃临时文件、不动输出文件，避免同步盘 (Google Drive 等) 重新上传整个文件。
+    """
+
+    def __init__(self):
+        self._last_written = {}  # output path -> (body digest, size, mtime_ns)
+        self._lock = threading.Lock()
+        # Byte counts are kept per thread: one writer is shared by the rebuild threads of several projects
+        self._local = threading.local()
+
+    def bytes_written_in_thread(self):
+        """当前线程通过本写入器写入临时文件的总字节数 (包括内容未变化、最终被丢弃的写入)"""
+        return getattr(self._local, 'bytes_written', 0)
+
+    def _count_bytes(self, size):
+        self._local.bytes_written = self.bytes_written_in_thread() + size
+
+    def _previous_digest(self, output_path, digest_of_existing=body_digest_of_file):
+        try:
+            st = os.stat(output_path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            last = self._last_written.get(output_path)
+        if last is not None and last[1:] == (st.st_size, st.st_mtime_ns):
+            return last[0]
+        # Unknown or modified by someone else since our last write: hash what is on disk
+        return digest_of_existing(output_path)
+
+    def _remember(self, output_path, digest):
+        try:
+            st = os.stat(output_path)
+        except OSError:
+            return
+        with self._lock:
+            self._last_written[output_path] = (digest, st.st_size, st.st_mtime_ns)
+
+    def write(self, output_path, chunks, skip_unchanged=True):
+        """
+        原子地写入 output_path
+
+        返回:
+            tuple: (写入的字符数, 输出文件是否被替换)
+        """
+        output_dir = os.path.dirname(output_path) or '.'
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(output_path)}.", suffix='.tmp', dir=output_dir)
+        chars_written = 0
+        digest = hashlib.sha256()
+        in_first_line = True
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for chunk in chunks:
+                    chars_written += f.write(chunk)
+                    if in_first_line:
+                        newline_index = chunk.find('\n')
+                        if newline_index < 0:
+                            continue
+                        in_first_line = False
+                        chunk = chunk[newline_index + 1:]
+                    digest.update(chunk.encode('utf-8', errors='surrogateescape'))
+            self._count_bytes(os.path.getsize(tmp_path))
+        except BaseException:
+            _remove_quietly(tmp_path)
+            raise
+        return chars_written, self._replace(tmp_path, output_path, digest.hexdigest(), skip_unchanged, body_digest_of_file)
+
+    def write_bytes(self, output_path, chunks, skip_unchanged=True):
+        """
+        原子地写入二进制内容 (bytes chunks)；比较的是整个文件的哈希
+
+        返回:
+            tuple: (写入的字节数, 输出文件是否被替换)
+        """
+        output_dir = os.path.dirname(output_path) or '.'
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(output_path)}.", suffix='.tmp', dir=output_dir)
+        bytes_written = 0
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    bytes_written += len(chunk)
+                    digest.update(chunk)
+            self._count_bytes(bytes_written)
+        except BaseException:
+            _remove_quietly(tmp_path)
+            raise
+        return bytes_written, self._replace(tmp_path, output_path, digest.hexdigest(), skip_unchanged, digest_of_file)
+
+    def _replace(self, tmp_path, output_path, body_digest, skip_unchanged, digest_of_existing):
+        """用写好的临时文件替换 output_path；内容与现有文件相同时删除临时文件，返回是否替换"""
+        try:
+            if skip_unchanged and body_digest == self._previous_digest(output_path, digest_of_existing):
+                os.remove(tmp_path)
+                return False
+
+            # mkstemp creates the file 0600; keep the mode of the file we replace
+            if os.path.exists(output_path):
+                shutil.copymode(output_path, tmp_path)
+            else:
+                os.chmod(tmp_path, 0o666 & ~_UMASK)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            _remove_quietly(tmp_path)
+            raise
+        self._remember(output_path, body_digest)
+        return True
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
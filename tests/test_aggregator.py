@@ -0,0 +1,36 @@
+import threading
+from sync2llmtxt import Aggregator, Project, ProjectConfig
+
+def test_aggregator_segments_match_written_document(sample_tree, tmp_path):
+    # sample_tree is tmp_path itself, so keep the written output out of the tree
+    out = tmp_path / 'out' / 'out.txt'
+    ignores = ['node_modules', '.git', 'out']
+    Project(ProjectConfig(str(sample_tree), str(out), ['*.py', '*.md'], ignores, enable_monitoring=False)).aggregate()
+    with Aggregator.for_directory(sample_tree, ['*.py', '*.md'], ignores) as aggregator:
+        segments = list(aggregator.iter_segments())
+        assert [kind for kind, _, _ in segments] == ['header', 'file', 'file', 'tree']
+        assert [path for kind, path, _ in segments if kind == 'file'] == ['docs/readme.md', 'main.py']
+        text = ''.join(aggregator.iter_document())
+    # Identical apart from the timestamp in the first line
+    assert text.split('\n', 1)[1] == out.read_text().split('\n', 1)[1]
+
+def test_aggregators_run_concurrently_on_different_roots(tmp_path):
+    roots = []
+    for i in range(4):
+        root = tmp_path / f'r{i}'
+        root.mkdir()
+        for j in range(20):
+            (root / f'm{j:02d}.py').write_text(f'root = {i}\n' * (j + 1))
+        roots.append(root)
+    results = {}
+    def run(index):
+        with Aggregator.for_directory(roots[index], read_workers=2) as aggregator:
+            results[index] = ''.join(aggregator.iter_document())
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i in range(4):
+        assert results[i].count('--- File: ') == 20
+        assert f'root = {i}\n' in results[i] and f'root = {(i + 1) % 4}\n' not in results[i]
@@ -0,0 +1,27 @@
+from benchmarks.synthetic import TreeShape, generate_tree
+from benchmarks.run import run_benchmarks, check_thresholds, PHASES
+
+
+def test_generate_tree_shape(tmp_path):
+    shape = TreeShape(files=60, depth=2, fanout=3, node_modules_files=25, gitignore_ratio=1.0,
+                      binary_ratio=0.2, oversized_ratio=0.1, file_size=256)
+    counts = generate_tree(tmp_path / 'first', shape)
+    assert counts['text'] + counts['binary'] + counts['oversized'] == 61
+    assert counts['node_modules'] == 25 and counts['gitignore'] > 0
+    assert (tmp_path / 'first' / 'node_modules').is_dir()
+    # Same seed, same tree
+    assert generate_tree(tmp_path / 'second', shape) == counts
+
+
+def test_run_benchmarks_and_thresholds(tmp_path):
+    counts = generate_tree(tmp_path, TreeShape(files=40, depth=2, fanout=2, node_modules_files=10,
+                                               gitignore_ratio=1.0, binary_ratio=0.1, oversized_ratio=0.1))
+    results = run_benchmarks(tmp_path, repeat=1, read_workers=2)
+    # node_modules and the gitignored generated/ directories are left out
+    assert results['files'] == counts['text'] + counts['binary'] + counts['oversized']
+    assert set(results['phases']) == set(PHASES)
+    assert check_thresholds(results, {'max_us_per_file': {'read': 1e9}}) == []
+    failures = check_thresholds(results, {'max_seconds': {'read': 0}, 'max_regression': 1.5},
+                                baseline={'phases': {'aggregate': 10.0}})
+    assert any(f.startswith('read:') for f in failures)
+    assert not any(f.startswith('aggregate:') for f in failures)
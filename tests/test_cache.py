@@ -0,0 +1,31 @@
+import os
+import time
+from sync2llmtxt import AggregationModel, SegmentCache
+
+def test_segment_cache_round_trip(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    old = time.time() - 60
+    for name, text in (('a.py', 'a = 1'), ('b.py', '')):
+        (src / name).write_text(text)
+        os.utime(src / name, (old, old))
+    files = [str(src / 'a.py'), str(src / 'b.py')]
+    cache = SegmentCache(tmp_path / 'cache')
+    model = AggregationModel(src)
+    model.sync(files)
+    cache.save(model)
+
+    restored = AggregationModel(src)
+    assert cache.load(restored) == 2
+    counts = restored.sync(files)
+    assert counts['read'] == 0 and counts['unchanged'] == 2
+    assert restored.read_segment(restored.segments['a.py']) == model.read_segment(model.segments['a.py'])
+
+def test_segment_cache_ignores_other_settings(tmp_path):
+    (tmp_path / 'a.py').write_text('a = 1')
+    os.utime(tmp_path / 'a.py', (time.time() - 60,) * 2)
+    cache = SegmentCache(tmp_path / 'cache')
+    model = AggregationModel(tmp_path)
+    model.sync([str(tmp_path / 'a.py')])
+    cache.save(model)
+    assert cache.load(AggregationModel(tmp_path, max_file_size_warn=10)) == 0
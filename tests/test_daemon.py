@@ -0,0 +1,52 @@
+import time
+import threading
+from sync2llmtxt import ProjectConfig, ProjectDaemon, RebuildPool
+
+def test_rebuild_pool_runs_projects_on_shared_workers():
+    running = set()
+    overlaps = []
+    done = []
+    lock = threading.Lock()
+    def make_rebuild(name):
+        def rebuild(paths, cancel_event):
+            with lock:
+                if name in running:
+                    overlaps.append(name)
+                running.add(name)
+            time.sleep(0.05)
+            with lock:
+                running.discard(name)
+                done.append((name, frozenset(paths)))
+        return rebuild
+    pool = RebuildPool(2)
+    targets = [pool.register(make_rebuild(f'p{i}'), 0.02) for i in range(5)]
+    pool.start()
+    try:
+        for i, target in enumerate(targets):
+            target.submit([f'{i}.py'])
+        deadline = time.time() + 3
+        while len(done) < 5 and time.time() < deadline:
+            time.sleep(0.01)
+        assert sorted(done) == [(f'p{i}', frozenset([f'{i}.py'])) for i in range(5)]
+        assert not overlaps
+        assert pool.workers == 2
+    finally:
+        pool.stop()
+
+def test_project_daemon_builds_every_project(tmp_path):
+    configs = []
+    for name in ('a', 'b'):
+        root = tmp_path / name
+        root.mkdir()
+        (root / f'{name}.py').write_text(f'{name} = 1')
+        configs.append(ProjectConfig(str(root), str(tmp_path / 'out' / f'{name}.txt'), ['*.py'], [],
+                                     enable_monitoring=False, debounce_time=0))
+    daemon = ProjectDaemon(configs, rebuild_workers=1).start()
+    try:
+        deadline = time.time() + 3
+        while not all((tmp_path / 'out' / f'{n}.txt').exists() for n in 'ab') and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        daemon.stop()
+    assert '--- File: a.py ---' in (tmp_path / 'out' / 'a.txt').read_text()
+    assert '--- File: b.py ---' in (tmp_path / 'out' / 'b.txt').read_text()
@@ -0,0 +1,58 @@
+import json
+import os
+
+from sync2llmtxt import AggregationModel, OutputWriter, write_jsonl
+from sync2llmtxt.document import iter_document
+
+def _model(root):
+    (root / 'pkg_a').mkdir()
+    (root / 'pkg_b').mkdir()
+    files = []
+    for i, name in enumerate(('pkg_a/client.py', 'pkg_b/client.py', 'unique.py')):
+        path = root / name
+        path.write_text('x = 1\n' * 20 if 'client' in name else 'y = 2\n')
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+        files.append(str(path))
+    model = AggregationModel(root)
+    model.sync(files)
+    return model
+
+def test_identical_files_are_emitted_once(tmp_path):
+    model = _model(tmp_path)
+    document = ''.join(iter_document(model, 'Manual Run', str(tmp_path), deduplicate=True))
+    assert document.count('x = 1\n') == 20
+    assert '\n--- File: pkg_b/client.py (identical to pkg_a/client.py) ---\n' in document
+    assert '- pkg_b/client.py (identical to pkg_a/client.py)\n' in document
+    assert f"~{model.segments['pkg_a/client.py'].tokens + model.segments['unique.py'].tokens:,}" in document
+    # Without deduplication every copy keeps its content
+    assert ''.join(iter_document(model, 'Manual Run', str(tmp_path))).count('x = 1\n') == 40
+
+def test_duplicates_follow_their_original_under_budget_and_in_jsonl(tmp_path):
+    model = _model(tmp_path)
+    # Room for unique.py only: the original is omitted, so its copy is omitted too
+    budget = model.segments['unique.py'].tokens
+    document = ''.join(iter_document(model, 'Manual Run', str(tmp_path), token_budget=budget, deduplicate=True))
+    assert 'Omitted To Fit Token Budget (2 files' in document
+    assert '--- File: pkg_b/client.py' not in document
+
+    output_path = str(tmp_path / 'out.jsonl')
+    write_jsonl(OutputWriter(), output_path, model, deduplicate=True)
+    records = {r['path']: r for r in map(json.loads, open(output_path, encoding='utf-8'))}
+    assert records['pkg_b/client.py']['identical_to'] == 'pkg_a/client.py'
+    assert records['pkg_b/client.py']['content'] is None
+    assert records['pkg_a/client.py']['identical_to'] is None and records['pkg_a/client.py']['content']
+
+def test_logged_token_total_matches_header(tmp_path, caplog):
+    import logging
+    import re
+    from sync2llmtxt import Project, ProjectConfig
+    root = tmp_path / 'src'
+    root.mkdir()
+    _model(root)
+    output_path = tmp_path / 'out.txt'
+    project = Project(ProjectConfig(str(root), str(output_path), ['*.py'], [], enable_monitoring=False,
+                                    read_workers=1, deduplicate=True))
+    with caplog.at_level(logging.INFO, logger='sync2llmtxt.project'):
+        project.aggregate()
+    header_total = re.search(r'Estimated Tokens \(file contents\): ~([\d,]+)', output_path.read_text(encoding='utf-8'))
+    assert f"估算 {int(header_total.group(1).replace(',', ''))} tokens" in caplog.text
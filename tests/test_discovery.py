@@ -0,0 +1,39 @@
+import os
+from sync2llmtxt import FilePatternMatcher, walk_code_files
+
+def test_file_pattern_matcher():
+    matcher = FilePatternMatcher(['*.py', 'Makefile', 'test_?.txt'])
+    assert matcher('main.py') is True
+    assert matcher('Makefile') is True
+    assert matcher('test_a.txt') is True
+    assert matcher('main.js') is False
+
+def test_walk_code_files_prunes_ignored_dirs(sample_tree):
+    (sample_tree / 'node_modules' / 'lib.py').write_text('x')
+    visited = []
+    def should_ignore_fn(path):
+        visited.append(path)
+        return os.path.basename(path) in ('node_modules', '.git')
+    found = sorted(walk_code_files(sample_tree, FilePatternMatcher(['*.py', '*.md']), should_ignore_fn))
+    assert found == [str(sample_tree / 'docs' / 'readme.md'), str(sample_tree / 'main.py')]
+    assert not any('lib.py' in p for p in visited)
+
+def test_walk_code_files_shares_listings_with_tree(sample_tree):
+    from sync2llmtxt import generate_directory_structure
+    should_ignore_fn = lambda path: os.path.basename(path) in ('node_modules', '.git')
+    listings = {}
+    list(walk_code_files(sample_tree, FilePatternMatcher(['*.py']), should_ignore_fn, listings))
+    assert str(sample_tree) in listings
+    assert not any('node_modules' in p for p in listings)
+    shared = generate_directory_structure(sample_tree, should_ignore_fn, listings)
+    assert shared == generate_directory_structure(sample_tree, should_ignore_fn)
+
+def test_walk_code_files_checks_each_path_once_with_listings(sample_tree):
+    (sample_tree / 'skip.py').write_text('x')
+    calls = []
+    def should_ignore_fn(path):
+        calls.append(path)
+        return os.path.basename(path) in ('node_modules', '.git', 'skip.py')
+    found = sorted(walk_code_files(sample_tree, FilePatternMatcher(['*.py', '*.md']), should_ignore_fn, {}))
+    assert found == [str(sample_tree / 'docs' / 'readme.md'), str(sample_tree / 'main.py')]
+    assert len(calls) == len(set(calls))
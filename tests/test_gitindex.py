@@ -0,0 +1,65 @@
+import struct
+
+from sync2llmtxt import Project, ProjectConfig
+from sync2llmtxt.gitindex import read_git_index
+
+
+def write_index(path, names, version=2, skip_worktree=()):
+    """按 git 的格式写出只含路径和模式的索引 (stat 数据为 0)"""
+    body = b''
+    previous = b''
+    for name in names:
+        encoded = name.encode('utf-8')
+        extended = name in skip_worktree
+        entry = struct.pack('>10I', 0, 0, 0, 0, 0, 0, 0o100644, 0, 0, 0) + b'\0' * 20
+        entry += struct.pack('>H', (0x4000 if extended else 0) | min(len(encoded), 0xfff))
+        if extended:
+            entry += struct.pack('>H', 0x4000)
+        if version == 4:
+            common = 0
+            while common < min(len(previous), len(encoded)) and previous[common] == encoded[common]:
+                common += 1
+            # Prefix lengths below 128 fit in a single varint byte
+            entry += bytes([len(previous) - common]) + encoded[common:] + b'\0'
+        else:
+            entry += encoded
+            entry += b'\0' * (8 - len(entry) % 8)
+        previous = encoded
+        body += entry
+    path.write_bytes(b'DIRC' + struct.pack('>II', version, len(names)) + body + b'\0' * 20)
+
+
+def test_read_git_index_versions(tmp_path):
+    names = ['docs/readme.md', 'src/app.py', 'src/app_test.py', 'sparse/away.py']
+    for version in (2, 3, 4):
+        index = tmp_path / f'index{version}'
+        write_index(index, names, version, skip_worktree={'sparse/away.py'} if version > 2 else ())
+        paths = [entry.path for entry in read_git_index(str(index))]
+        assert paths == (names if version == 2 else names[:3])
+
+
+def test_project_git_index_source(sample_tree):
+    (sample_tree / '.git' / 'index').parent.mkdir(exist_ok=True)
+    write_index(sample_tree / '.git' / 'index', ['docs/readme.md', 'main.py'])
+    (sample_tree / 'untracked.py').write_text('x = 1')
+    config = ProjectConfig(str(sample_tree), str(sample_tree / 'out.txt'), ['*.py', '*.md'], ['node_modules', '.git'],
+                           enable_monitoring=False, source='git-index')
+    project = Project(config)
+    project.refresh()
+    assert project.model.order == ['docs/readme.md', 'main.py']
+    assert 'untracked.py' not in project.tree.render()
+
+    config.include_untracked = True
+    project.refresh()
+    assert project.model.order == ['docs/readme.md', 'main.py', 'untracked.py']
+
+
+def test_git_index_skips_files_deleted_from_worktree(sample_tree):
+    write_index(sample_tree / '.git' / 'index', ['docs/readme.md', 'gone/old.py', 'main.py', 'removed.py'])
+    config = ProjectConfig(str(sample_tree), str(sample_tree / 'out.txt'), ['*.py', '*.md'], ['node_modules', '.git'],
+                           enable_monitoring=False, source='git-index')
+    project = Project(config)
+    project.refresh()
+    tree = project.tree.render()
+    assert project.model.order == ['docs/readme.md', 'main.py']
+    assert 'gone' not in tree and 'removed.py' not in tree and 'main.py' in tree
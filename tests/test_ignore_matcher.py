@@ -0,0 +1,48 @@
+from sync2llmtxt import IgnoreMatcher
+
+def test_ignore_matcher_pattern_kinds(tmp_path):
+    matcher = IgnoreMatcher(tmp_path, ['node_modules', '*.log', 'shared/generated'])
+    assert matcher(str(tmp_path)) is False
+    assert matcher(str(tmp_path / 'node_modules')) is True
+    assert matcher(str(tmp_path / 'pkg' / 'node_modules' / 'a.js')) is True
+    assert matcher(str(tmp_path / 'debug.log')) is True
+    assert matcher(str(tmp_path / 'shared' / 'generated' / 'api.py')) is True
+    assert matcher(str(tmp_path / 'shared' / 'api.py')) is False
+    assert matcher(str(tmp_path / 'generated' / 'api.py')) is False
+
+def test_ignore_matcher_caches_directory_decisions(tmp_path):
+    calls = []
+    def gitignore(path):
+        calls.append(path)
+        return path.endswith('dist')
+    matcher = IgnoreMatcher(tmp_path, [], gitignore)
+    assert matcher(str(tmp_path / 'dist' / 'a.js')) is True
+    assert matcher(str(tmp_path / 'dist' / 'b.js')) is True
+    assert calls == [str(tmp_path / 'dist')]
+
+def test_ignore_matcher_nested_gitignore(tmp_path):
+    from sync2llmtxt import GitignoreCache
+    (tmp_path / 'pkg' / 'dist').mkdir(parents=True)
+    (tmp_path / 'pkg' / '.gitignore').write_text('dist/\n')
+    (tmp_path / '.git' / 'info').mkdir(parents=True)
+    (tmp_path / '.git' / 'info' / 'exclude').write_text('*.tmp\n')
+    matcher = IgnoreMatcher(tmp_path, [], gitignore_cache=GitignoreCache(tmp_path))
+    assert matcher(str(tmp_path / 'pkg' / 'dist' / 'out.js')) is True
+    assert matcher(str(tmp_path / 'pkg' / 'src.js')) is False
+    assert matcher(str(tmp_path / 'dist' / 'out.js')) is False
+    assert matcher(str(tmp_path / 'scratch.tmp')) is True
+
+    (tmp_path / 'pkg' / '.gitignore').write_text('')
+    assert matcher.invalidate_gitignore(str(tmp_path / 'pkg' / '.gitignore')) is True
+    assert matcher(str(tmp_path / 'pkg' / 'dist' / 'out.js')) is False
+    assert matcher.invalidate_gitignore(str(tmp_path / 'pkg' / 'src.js')) is False
+
+def test_ignore_matcher_nested_negation(tmp_path):
+    from sync2llmtxt import GitignoreCache
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / '.gitignore').write_text('*.js\n')
+    (tmp_path / 'pkg' / '.gitignore').write_text('!keep.js\n')
+    matcher = IgnoreMatcher(tmp_path, [], gitignore_cache=GitignoreCache(tmp_path))
+    assert matcher(str(tmp_path / 'pkg' / 'keep.js')) is False
+    assert matcher(str(tmp_path / 'pkg' / 'drop.js')) is True
+    assert matcher(str(tmp_path / 'keep.js')) is True
@@ -0,0 +1,40 @@
+import gzip
+import json
+import mmap
+
+from sync2llmtxt import AggregationModel, OutputWriter, write_jsonl
+
+def _model(root):
+    (root / 'a.py').write_text('print("--- File: fake ---")\n')
+    (root / 'b.py').write_text('')
+    model = AggregationModel(root)
+    model.sync([str(root / 'a.py'), str(root / 'b.py')])
+    return model
+
+def test_jsonl_index_slices_single_record(tmp_path):
+    root = tmp_path / 'proj'
+    root.mkdir()
+    model = _model(root)
+    output_path = str(tmp_path / 'out.jsonl')
+    writer = OutputWriter()
+    assert write_jsonl(writer, output_path, model) == (2, True)
+    index = json.loads((tmp_path / 'out.jsonl.index.json').read_text())
+    offset, length = index['files']['a.py']
+    with open(output_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        record = json.loads(data[offset:offset + length])
+    assert record['content'] == 'print("--- File: fake ---")\n'
+    assert record['status'] == 'included' and record['sha1'] == model.segments['a.py'].digest
+    # Unchanged model: the data file is left alone
+    assert write_jsonl(writer, output_path, model) == (2, False)
+
+def test_jsonl_gzip_records_are_independent_members(tmp_path):
+    root = tmp_path / 'proj'
+    root.mkdir()
+    model = _model(root)
+    output_path = str(tmp_path / 'out.jsonl.gz')
+    write_jsonl(OutputWriter(), output_path, model, compression='gzip')
+    index = json.loads((tmp_path / 'out.jsonl.gz.index.json').read_text())
+    raw = (tmp_path / 'out.jsonl.gz').read_bytes()
+    offset, length = index['files']['b.py']
+    assert json.loads(gzip.decompress(raw[offset:offset + length]))['content'] == ''
+    assert len(gzip.decompress(raw).splitlines()) == 2
@@ -0,0 +1,91 @@
+from sync2llmtxt import AggregationModel, SegmentStore
+
+def test_aggregation_model_sync_reuses_unchanged_files(tmp_path):
+    (tmp_path / 'a.py').write_text('a = 1')
+    (tmp_path / 'b.py').write_text('')
+    model = AggregationModel(tmp_path)
+    files = [str(tmp_path / 'a.py'), str(tmp_path / 'b.py')]
+    assert model.sync(files)['read'] == 2
+    counts = model.sync(files)
+    assert counts['read'] == 0 and counts['unchanged'] == 2
+    assert [s.list_entry for s in model.iter_segments()] == ['a.py', 'b.py (Empty)']
+
+def test_aggregation_model_apply_pending(tmp_path):
+    (tmp_path / 'a.py').write_text('a = 1')
+    (tmp_path / 'b.py').write_text('b = 1')
+    model = AggregationModel(tmp_path)
+    model.sync([str(tmp_path / 'a.py'), str(tmp_path / 'b.py')])
+
+    (tmp_path / 'a.py').write_text('a = 22')
+    (tmp_path / 'b.py').unlink()
+    (tmp_path / 'c.py').write_text('c = 1')
+    for name in ('a.py', 'b.py', 'c.py'):
+        model.mark_changed(str(tmp_path / name))
+    counts = model.apply_pending()
+    assert counts['read'] == 2 and counts['removed'] == 1
+    assert model.order == ['a.py', 'c.py']
+    assert 'a = 22' in model.read_segment(model.segments['a.py'])
+
+def test_aggregation_model_parallel_reads_match_sequential(tmp_path):
+    files = []
+    for i in range(40):
+        path = tmp_path / f'm{i:02d}.py'
+        path.write_text(f'value = {i}\n' * (i + 1))
+        files.append(str(path))
+    sequential = AggregationModel(tmp_path)
+    parallel = AggregationModel(tmp_path, read_workers=4)
+    sequential.sync(files)
+    parallel.sync(files)
+    assert parallel.order == sequential.order
+    assert parallel.store.size == sequential.store.size
+    assert [s.location for s in parallel.iter_segments()] == [s.location for s in sequential.iter_segments()]
+
+def test_aggregation_model_sniffs_binary_and_encodings(tmp_path, monkeypatch):
+    from sync2llmtxt import model as model_module
+    (tmp_path / 'dump.json').write_bytes(b'{"w": "\x00\x01\x02"}' + b'x' * 100000)
+    (tmp_path / 'crlf.py').write_bytes(b'a = 1\r\nb = 2\r\n')
+    (tmp_path / 'wide.txt').write_bytes('\ufeffhé\r\n'.encode('utf-16-le'))
+    (tmp_path / 'big.py').write_text('x = 1\n' * 1000)
+    monkeypatch.setattr(model_module, 'MMAP_THRESHOLD', 1024)
+    model = AggregationModel(tmp_path)
+    model.sync([str(tmp_path / name) for name in ('big.py', 'crlf.py', 'dump.json', 'wide.txt')])
+    assert model.segments['dump.json'].list_entry == 'dump.json (Binary)'
+    assert model.segments['dump.json'].location is None
+    assert model.read_segment(model.segments['crlf.py']) == '\n--- File: crlf.py ---\n\na = 1\nb = 2\n\n'
+    assert model.read_segment(model.segments['wide.txt']) == '\n--- File: wide.txt ---\n\nhé\n\n'
+    assert model.read_segment(model.segments['big.py']).count('x = 1\n') == 1000
+
+def test_file_segment_keeps_stat_fields_from_one_stat(tmp_path):
+    import os
+    (tmp_path / 'a.py').write_text('a = 1')
+    model = AggregationModel(tmp_path)
+    model.sync([str(tmp_path / 'a.py')])
+    segment = model.segments['a.py']
+    st = os.stat(tmp_path / 'a.py')
+    assert (segment.size, segment.mtime_ns, segment.ino) == (st.st_size, st.st_mtime_ns, st.st_ino)
+    assert segment.matches(st) and segment.signature == (st.st_size, st.st_mtime_ns, st.st_ino)
+    assert not hasattr(segment, '__dict__')
+
+def test_compaction_closes_cache_backed_store(tmp_path):
+    (tmp_path / 'a.py').write_text('a = 1')
+    source = SegmentStore(tmp_path / 'segments.txt')
+    model = AggregationModel(tmp_path, store=source)
+    model.sync([str(tmp_path / 'a.py')])
+    model.compact(SegmentStore(tmp_path / 'compacted.txt'))
+    assert source._file.closed
+    assert 'a = 1' in model.read_segment(model.segments['a.py'])
+
+def test_attach_store_closes_replaced_cache_backed_store(tmp_path):
+    old = SegmentStore(tmp_path / 'old.txt')
+    model = AggregationModel(tmp_path, store=old)
+    model.attach_store(SegmentStore(tmp_path / 'new.txt'))
+    assert old._file.closed
+
+def test_decode_text_validates_utf8_in_chunks(monkeypatch):
+    from sync2llmtxt import model as model_module
+    monkeypatch.setattr(model_module, 'UTF8_CHECK_CHUNK', 3)
+    text = 'héllo wörld\n'.encode('utf-8')
+    # Multi-byte characters straddle the 3-byte chunk boundaries
+    assert model_module.decode_text(text, 'utf-8') is text
+    assert model_module.decode_text(text[:-2] + b'\xc3', 'utf-8') == 'héllo wörl'.encode('utf-8')
+    assert not model_module.is_utf8(b'ab\xc3')
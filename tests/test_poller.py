@@ -0,0 +1,41 @@
+import os
+from watchdog.events import FileSystemEventHandler
+from sync2llmtxt import PollingWatcher
+
+class Recorder(FileSystemEventHandler):
+    def __init__(self):
+        self.events = []
+    def on_any_event(self, event):
+        self.events.append((event.event_type, os.path.relpath(event.src_path, self.root)))
+
+def make_poller(root):
+    recorder = Recorder()
+    recorder.root = str(root)
+    should_ignore_fn = lambda path: os.path.basename(path) in ('node_modules', '.git')
+    poller = PollingWatcher(recorder, root, should_ignore_fn, verify_ticks=1000)
+    poller.snapshot()
+    return poller, recorder
+
+def test_polling_watcher_reports_differences(sample_tree):
+    poller, recorder = make_poller(sample_tree)
+    (sample_tree / 'docs' / 'new.md').write_text('new')
+    (sample_tree / 'main.py').unlink()
+    (sample_tree / 'pkg').mkdir()
+    (sample_tree / 'node_modules' / 'lib.js').write_text('x')
+    poller.poll()
+    assert sorted(recorder.events) == [('created', 'docs/new.md'), ('created', 'pkg'), ('deleted', 'main.py')]
+    recorder.events.clear()
+    assert poller.poll() == 0
+
+def test_polling_watcher_skips_unchanged_directories(sample_tree, monkeypatch):
+    poller, recorder = make_poller(sample_tree)
+    for dir_path in poller._dirs:
+        poller._dirs[dir_path] = (os.stat(dir_path).st_mtime_ns, poller._dirs[dir_path][1])
+    scanned = []
+    real_scan = poller._scan_dir
+    monkeypatch.setattr(poller, '_scan_dir', lambda path: scanned.append(path) or real_scan(path))
+    (sample_tree / 'docs' / 'extra.md').write_text('x')
+    poller.poll()
+    # docs changed; the root is this poll's rolling verification slice; .git and node_modules are never listed
+    assert scanned == [str(sample_tree), str(sample_tree / 'docs')]
+    assert recorder.events == [('created', os.path.join('docs', 'extra.md'))]
@@ -0,0 +1,38 @@
+from sync2llmtxt import Project, ProjectConfig
+
+def _config(root, out, **options):
+    return ProjectConfig(str(root), str(out), ['*.py'], ['node_modules'], enable_monitoring=False, **options)
+
+def test_project_aggregates_and_rebuilds_incrementally(sample_tree, tmp_path):
+    out = tmp_path / 'out' / 'context.txt'
+    (sample_tree / 'node_modules' / 'dep.py').write_text('skip = 1')
+    project = Project(_config(sample_tree, out))
+    project.aggregate()
+    content = out.read_text()
+    assert '--- File: main.py ---' in content and 'dep.py' not in content
+
+    (sample_tree / 'extra.py').write_text('y = 2')
+    project.rebuild_changed_paths([str(sample_tree / 'extra.py')])
+    assert '--- File: extra.py ---' in out.read_text()
+    assert project.model.order == ['extra.py', 'main.py']
+
+def test_project_config_updated_and_validate(tmp_path):
+    base = _config(tmp_path, tmp_path / 'out.txt')
+    config = base.updated({'OUTPUT_FORMAT': 'jsonl', 'SHARD_BY': 'size'})
+    assert config.output_format == 'jsonl' and base.output_format == 'text'
+    try:
+        config.validate()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('jsonl with sharding must be rejected')
+
+def test_gitignore_inside_ignored_dir_keeps_rules(sample_tree, tmp_path):
+    project = Project(_config(sample_tree, tmp_path / 'out.txt'))
+    project.aggregate()
+    nested = sample_tree / 'node_modules' / 'dep' / '.gitignore'
+    nested.parent.mkdir()
+    nested.write_text('*\n')
+    assert project.classify_path(str(nested), False, 'created') is None
+    assert project.classify_path(str(sample_tree / 'docs' / '.gitignore'), False, 'created') == 'stale'
+    assert project.classify_path(str(sample_tree / '.git' / 'info' / 'exclude'), False) == 'stale'
@@ -0,0 +1,42 @@
+import time
+import threading
+from sync2llmtxt import RebuildScheduler
+
+def test_rebuild_scheduler_debounces_and_batches():
+    batches = []
+    done = threading.Event()
+    def rebuild(paths, cancel_event):
+        batches.append(set(paths))
+        done.set()
+    scheduler = RebuildScheduler(rebuild, 0.1).start()
+    try:
+        scheduler.submit(['a.py'])
+        scheduler.submit(['b.py'])
+        scheduler.submit(['a.py'])
+        assert done.wait(2)
+        time.sleep(0.2)
+        assert batches == [{'a.py', 'b.py'}]
+    finally:
+        scheduler.stop()
+
+def test_rebuild_scheduler_cancels_running_rebuild():
+    started = threading.Event()
+    finished = []
+    def rebuild(paths, cancel_event):
+        if 'slow.py' in paths:
+            started.set()
+            assert cancel_event.wait(2)
+            finished.append('cancelled')
+            return
+        finished.append(set(paths))
+    scheduler = RebuildScheduler(rebuild, 0.05).start()
+    try:
+        scheduler.submit(['slow.py'])
+        assert started.wait(2)
+        scheduler.submit(['next.py'])
+        deadline = time.time() + 2
+        while len(finished) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert finished == ['cancelled', {'next.py'}]
+    finally:
+        scheduler.stop()
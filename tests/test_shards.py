@@ -0,0 +1,64 @@
+import os
+
+from sync2llmtxt import AggregationModel, OutputWriter, ShardedOutput
+from sync2llmtxt.shards import plan_shards
+
+def _model(root, count):
+    files = []
+    for i in range(count):
+        path = root / 'src' / f'm{i:02d}.py'
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f'value = {i}\n' * 50)
+        files.append(str(path))
+    model = AggregationModel(root)
+    model.sync(files)
+    return model, files
+
+def test_sharded_output_rewrites_only_changed_shard(tmp_path):
+    root = tmp_path / 'proj'
+    out_dir = tmp_path / 'out'
+    root.mkdir()
+    out_dir.mkdir()
+    model, files = _model(root, 30)
+    sharded = ShardedOutput(OutputWriter())
+    output_path = str(out_dir / 'output.txt')
+    rewritten, shard_count, replaced = sharded.write(output_path, model, 'Manual Run', str(root), shard_size=1500)
+    assert shard_count > 2 and rewritten == shard_count and replaced
+    index = (out_dir / 'output.txt').read_text()
+    assert 'src/m00.py -> output.000.txt' in index
+    assert '--- File: src/m00.py ---' in (out_dir / 'output.000.txt').read_text()
+
+    with open(files[-1], 'a') as f:
+        f.write('# edited\n')
+    model.mark_changed(files[-1])
+    model.apply_pending()
+    rewritten, _, replaced = sharded.write(output_path, model, 'Manual Run', str(root), shard_size=1500)
+    assert rewritten == 1 and not replaced
+
+def test_sharded_output_by_directory_removes_stale_shards(tmp_path):
+    root = tmp_path / 'proj'
+    out_dir = tmp_path / 'out'
+    root.mkdir()
+    out_dir.mkdir()
+    (root / 'a').mkdir()
+    (root / 'a' / 'x.py').write_text('x = 1')
+    (root / 'top.py').write_text('t = 1')
+    model = AggregationModel(root)
+    model.sync([str(root / 'a' / 'x.py'), str(root / 'top.py')])
+    (out_dir / 'output.005.txt').write_text('stale')
+    output_path = str(out_dir / 'output.txt')
+    _, shard_count, _ = ShardedOutput(OutputWriter()).write(output_path, model, 'Manual Run', str(root), shard_by='dir')
+    assert shard_count == 2
+    assert sorted(p.name for p in out_dir.iterdir()) == ['output.000.txt', 'output.001.txt', 'output.txt']
+    assert '--- File: top.py ---' in (out_dir / 'output.000.txt').read_text()
+
+def test_plan_shards_by_directory_splits_on_os_sep(tmp_path, monkeypatch):
+    model, _ = _model(tmp_path, 2)
+    (tmp_path / 'top.py').write_text('top = 1\n')
+    model.refresh_file(str(tmp_path / 'top.py'))
+    # Windows-style relative paths: 'src\\m00.py'
+    for file_segment in model.segments.values():
+        file_segment.relative_path = file_segment.relative_path.replace('/', '\\')
+    monkeypatch.setattr(os, 'sep', '\\')
+    shards = plan_shards(model, shard_by='dir')
+    assert [[s.relative_path for s in shard] for shard in shards] == [['top.py'], ['src\\m00.py', 'src\\m01.py']]
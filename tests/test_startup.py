@@ -0,0 +1,35 @@
+import os
+import sys
+import subprocess
+
+import sync2llmtxt
+
+SCRIPT = """
+import sys
+import sync2llmtxt.sync2llmtxt as script
+script.ENABLE_AUTOMATIC_MONITORING = False
+sys.argv = ['sync2llmtxt', '-s', sys.argv[1], '-o', sys.argv[2]] + sys.argv[3:]
+try:
+    script.main()
+except SystemExit:
+    pass
+print(sorted(name for name in ('watchdog', 'yaml', 'concurrent.futures') if name in sys.modules))
+"""
+
+
+def run_manual(sample_tree, work_dir, *args):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(sync2llmtxt.__file__)))
+    result = subprocess.run([sys.executable, '-c', SCRIPT, str(sample_tree), str(work_dir / 'out.txt')] + list(args),
+                            cwd=str(work_dir), env=env, capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def test_manual_run_skips_watcher_stack_and_log_file(sample_tree, tmp_path):
+    work_dir = tmp_path / 'work'
+    work_dir.mkdir()
+    assert run_manual(sample_tree, work_dir, '-j', '1') == '[]'
+    assert 'main.py' in (work_dir / 'out.txt').read_text(encoding='utf-8')
+    assert os.listdir(str(work_dir)) == ['out.txt']
+
+    run_manual(sample_tree, work_dir, '--log-file', str(work_dir / 'debug.log'))
+    assert 'DEBUG' in (work_dir / 'debug.log').read_text(encoding='utf-8')
@@ -0,0 +1,65 @@
+import json
+import time
+
+from watchdog.events import FileModifiedEvent
+from sync2llmtxt import Project, ProjectConfig, CodeChangeHandler, IgnoreAwareWatcher, RebuildScheduler
+from sync2llmtxt.watcher import create_observer
+
+
+def make_project(sample_tree, tmp_path, stats_format):
+    config = ProjectConfig(str(sample_tree), str(tmp_path / 'out' / 'out.txt'), ['*.py', '*.md'],
+                           ['node_modules', '.git', 'out'], enable_monitoring=True, read_workers=1,
+                           stats_format=stats_format)
+    return Project(config)
+
+
+def test_stats_json_export(sample_tree, tmp_path):
+    project = make_project(sample_tree, tmp_path, 'json')
+    project.aggregate()
+    project.aggregate()
+    stats = json.loads((tmp_path / 'out' / 'out.txt.stats.json').read_text(encoding='utf-8'))
+    assert stats['runs'] == 2
+    totals, last = stats['totals']['counters'], stats['last_run']['counters']
+    assert last['files_matched'] == 2 and last['dirs_pruned'] == 3
+    assert last['cache_hits'] == 2 and last['bytes_read'] == 0
+    assert totals['bytes_read'] == len('print(1)') + len('# doc')
+    assert last['bytes_written'] == (tmp_path / 'out' / 'out.txt').stat().st_size
+    assert {'discover', 'should_ignore', 'read', 'write'} <= set(stats['last_run']['phases'])
+
+
+def test_event_latency_in_prometheus_export(sample_tree, tmp_path):
+    project = make_project(sample_tree, tmp_path, 'prometheus')
+    project.aggregate()
+    (sample_tree / 'main.py').write_text('print(2)')
+    CodeChangeHandler(project).dispatch(FileModifiedEvent(str(sample_tree / 'main.py')))
+    assert project.stats.last.incremental and project.stats.last.event_latency is not None
+    text = (tmp_path / 'out' / 'out.txt.prom').read_text(encoding='utf-8')
+    label = f'output="{tmp_path / "out" / "out.txt"}"'
+    assert f'sync2llmtxt_runs_total{{{label}}} 2' in text
+    assert f'sync2llmtxt_event_latency_seconds_count{{{label}}} 1' in text
+    assert f'sync2llmtxt_last_run_files_read{{{label}}} 1' in text
+
+
+def test_stats_export_inside_tree_does_not_retrigger_rebuilds(sample_tree):
+    # The output, its stats file and the temporary files all land in the monitored tree and match *.json / *.txt
+    config = ProjectConfig(str(sample_tree), str(sample_tree / 'out.txt'), ['*.py', '*.json', '*.txt'],
+                           ['node_modules', '.git'], debounce_time=0.2, read_workers=1, stats_format='json')
+    project = Project(config)
+    project.aggregate()
+    assert 'out.txt' not in project.model.order and 'out.txt.stats.json' not in project.tree.render()
+
+    scheduler = RebuildScheduler(project.rebuild_changed_paths, config.debounce_time)
+    observer = create_observer()
+    IgnoreAwareWatcher(observer, CodeChangeHandler(project, scheduler), str(sample_tree),
+                       project.should_ignore).schedule()
+    scheduler.start()
+    observer.start()
+    try:
+        time.sleep(0.3)
+        (sample_tree / 'main.py').write_text('print(2)')
+        time.sleep(1.5)
+    finally:
+        observer.stop()
+        observer.join()
+        scheduler.stop()
+    assert project.stats.runs == 2
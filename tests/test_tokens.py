@@ -0,0 +1,29 @@
+import os
+
+from sync2llmtxt import AggregationModel, estimate_tokens
+from sync2llmtxt.document import iter_document
+
+def test_estimate_tokens_counts_symbols_words_and_lines():
+    assert estimate_tokens(b'') == 0
+    # 'x' and 'value' -> 0 + 1 word tokens, '=' -> 1, newline -> 1
+    assert estimate_tokens(b'value = x\n') == 3
+    assert estimate_tokens('中'.encode('utf-8')) == 3
+
+def test_token_budget_keeps_recent_files_and_lists_omitted(tmp_path):
+    files = []
+    for i, name in enumerate(('old.py', 'mid.py', 'new.py')):
+        path = tmp_path / name
+        path.write_text('x = 1\n' * 20)
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+        files.append(str(path))
+    model = AggregationModel(tmp_path)
+    model.sync(sorted(files))
+    per_file = model.segments['new.py'].tokens
+    assert per_file > 0
+
+    document = ''.join(iter_document(model, 'Manual Run', str(tmp_path), token_budget=2 * per_file))
+    assert f'Estimated Tokens (file contents): ~{2 * per_file:,} of {2 * per_file:,} budget' in document
+    assert 'Included Files (2):' in document
+    assert 'Omitted To Fit Token Budget (1 files' in document
+    assert '--- File: new.py ---' in document and '--- File: mid.py ---' in document
+    assert '--- File: old.py ---' not in document
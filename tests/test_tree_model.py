@@ -0,0 +1,23 @@
+import os
+from sync2llmtxt import DirectoryTreeModel, generate_directory_structure
+
+def test_directory_tree_model_applies_changes(sample_tree):
+    should_ignore_fn = lambda path: os.path.basename(path) in ('node_modules', '.git')
+    tree = DirectoryTreeModel(sample_tree, should_ignore_fn)
+    assert tree.render() == generate_directory_structure(sample_tree, should_ignore_fn)
+
+    (sample_tree / 'docs' / 'guide.md').write_text('# guide')
+    (sample_tree / 'main.py').unlink()
+    (sample_tree / 'pkg' / 'sub').mkdir(parents=True)
+    (sample_tree / 'pkg' / 'sub' / 'x.py').write_text('x')
+    (sample_tree / 'node_modules' / 'lib.js').write_text('x')
+    for path in ('docs/guide.md', 'main.py', 'pkg/sub/x.py', 'node_modules/lib.js'):
+        tree.mark_changed(sample_tree / path)
+    assert tree.render() == generate_directory_structure(sample_tree, should_ignore_fn)
+    assert 'x.py' in tree.render() and 'main.py' not in tree.render()
+
+def test_directory_tree_model_reuses_render_without_changes(sample_tree):
+    tree = DirectoryTreeModel(sample_tree)
+    text = tree.render()
+    (sample_tree / 'main.py').write_text('print(2)')
+    assert tree.render() is text
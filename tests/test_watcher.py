@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+
+import pytest
+from watchdog.events import FileSystemEventHandler, DirCreatedEvent
+from sync2llmtxt import IgnoreAwareWatcher
+from sync2llmtxt.watcher import DEFAULT_MAX_WATCHES, create_observer
+
+class FakeObserver:
+    def schedule(self, handler, path, recursive=False):
+        return (path, recursive)
+    def unschedule(self, watch):
+        pass
+
+def should_ignore_fn(path):
+    return os.path.basename(path) in ('node_modules', '.git')
+
+def test_ignore_aware_watcher_skips_ignored_dirs(sample_tree):
+    (sample_tree / 'docs' / 'api').mkdir()
+    watcher = IgnoreAwareWatcher(FakeObserver(), FileSystemEventHandler(), sample_tree, should_ignore_fn)
+    watcher.schedule()
+    assert sorted(watcher.watches) == [(str(sample_tree), False), (str(sample_tree / 'docs'), True)]
+
+def test_ignore_aware_watcher_splits_on_new_ignored_dir(sample_tree):
+    watcher = IgnoreAwareWatcher(FakeObserver(), FileSystemEventHandler(), sample_tree, should_ignore_fn)
+    watcher.schedule()
+    (sample_tree / 'docs' / 'node_modules').mkdir()
+    watcher.dispatch(DirCreatedEvent(str(sample_tree / 'docs' / 'node_modules')))
+    assert (str(sample_tree / 'docs'), False) in watcher.watches
+    assert not any('node_modules' in path for path, _ in watcher.watches)
+
+
+class RecordingHandler(FileSystemEventHandler):
+    def __init__(self):
+        self.paths = set()
+    def on_any_event(self, event):
+        self.paths.add(event.src_path)
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify only')
+def test_ignore_aware_watcher_never_watches_ignored_dirs_past_the_cap(tmp_path):
+    for i in range(DEFAULT_MAX_WATCHES + 6):
+        (tmp_path / f'pkg{i}' / 'src').mkdir(parents=True)
+        (tmp_path / f'pkg{i}' / 'node_modules' / 'lib').mkdir(parents=True)
+    handler = RecordingHandler()
+    observer = create_observer()
+    watcher = IgnoreAwareWatcher(observer, handler, tmp_path, should_ignore_fn)
+    watcher.schedule()
+    observer.start()
+    try:
+        watched = observer.watched_dirs(watcher.watches[(str(tmp_path), True)])
+        assert len(observer.emitters) == 1 and len(watched) == 1 + 2 * (DEFAULT_MAX_WATCHES + 6)
+        assert not any('node_modules' in path for path in watched)
+
+        (tmp_path / 'pkg3' / 'node_modules' / 'lib' / 'a.js').write_text('x')
+        (tmp_path / 'pkg3' / 'new' / 'node_modules').mkdir(parents=True)
+        (tmp_path / 'pkg3' / 'src' / 'b.js').write_text('x')
+        time.sleep(0.5)
+        (tmp_path / 'pkg3' / 'new' / 'node_modules' / 'c.js').write_text('x')
+        (tmp_path / 'pkg3' / 'new' / 'd.js').write_text('x')
+        time.sleep(0.5)
+    finally:
+        observer.stop()
+        observer.join()
+    assert str(tmp_path / 'pkg3' / 'src' / 'b.js') in handler.paths
+    assert str(tmp_path / 'pkg3' / 'new' / 'd.js') in handler.paths
+    assert not any(os.sep + 'node_modules' + os.sep in path for path in handler.paths)
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify only')
+def test_pruned_emitter_falls_back_to_plain_inotify(tmp_path, monkeypatch):
+    from sync2llmtxt import inotify
+    def broken(*args, **kwargs):
+        raise AttributeError('_wd_for_path')
+    monkeypatch.setattr(inotify, 'PrunedInotify', broken)
+    handler = RecordingHandler()
+    observer = create_observer()
+    IgnoreAwareWatcher(observer, handler, tmp_path, should_ignore_fn).schedule()
+    observer.start()
+    try:
+        (tmp_path / 'a.py').write_text('x')
+        time.sleep(0.5)
+        assert all(emitter.is_alive() for emitter in observer.emitters)
+    finally:
+        observer.stop()
+        observer.join()
+    assert str(tmp_path / 'a.py') in handler.paths
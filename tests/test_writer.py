@@ -0,0 +1,32 @@
+import pytest
+from sync2llmtxt import write_atomic
+
+def test_write_atomic_replaces_output(tmp_path):
+    out_file = tmp_path / 'out.txt'
+    out_file.write_text('old')
+    assert write_atomic(str(out_file), iter(['a', 'b', 'c'])) == 3
+    assert out_file.read_text() == 'abc'
+    assert [p.name for p in tmp_path.iterdir()] == ['out.txt']
+
+def test_write_atomic_keeps_old_output_on_error(tmp_path):
+    out_file = tmp_path / 'out.txt'
+    out_file.write_text('old')
+    def chunks():
+        yield 'partial'
+        raise RuntimeError('boom')
+    with pytest.raises(RuntimeError):
+        write_atomic(str(out_file), chunks())
+    assert out_file.read_text() == 'old'
+    assert [p.name for p in tmp_path.iterdir()] == ['out.txt']
+
+def test_output_writer_skips_unchanged_body(tmp_path):
+    from sync2llmtxt import OutputWriter
+    out_file = tmp_path / 'out.txt'
+    out_file.write_text('--- header @ 1 ---\n\nbody\n')
+    writer = OutputWriter()
+    assert writer.write(str(out_file), ['--- header @ 2 ---\n\n', 'body\n']) == (25, False)
+    assert out_file.read_text() == '--- header @ 1 ---\n\nbody\n'
+    assert writer.write(str(out_file), ['--- header @ 3 ---\n\n', 'new body\n'])[1] is True
+    assert writer.write(str(out_file), ['--- header @ 4 ---\n\n', 'new body\n'])[1] is False
+    assert out_file.read_text() == '--- header @ 3 ---\n\nnew body\n'
+    assert [p.name for p in tmp_path.iterdir()] == ['out.txt']